@@ -1,12 +1,20 @@
 import yaml
 import json
 import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from crewai import Agent, Crew, Task, Process, LLM
 from dotenv import load_dotenv
-from crewai.tools import BaseTool
-from pydantic import Field
-from langchain_community.utilities import GoogleSerperAPIWrapper
+import db
+import llm_stream
+import metrics
+import nutrition
+import meal_solver
+import plan_model
+import prompt_builder
+from food_matrix import load_food_matrix, preference_names
 
 
 load_dotenv()
@@ -24,8 +32,43 @@ TEMPERATURE = config["ai_model"]["temperature"]
 MEAL_PLANS_DIR = config["storage"]["meal_plans_dir"]
 os.makedirs(MEAL_PLANS_DIR, exist_ok=True)
 
-# Setup LLM
-llm = LLM(MODEL_NAME)
+# Generation pool: crew runs are blocking and take minutes, so they never
+# run on the event loop. max_workers caps concurrent crew runs.
+GENERATION_CONFIG = config.get("generation", {})
+GENERATION_MAX_WORKERS = int(os.getenv(
+    "GENERATION_MAX_WORKERS", GENERATION_CONFIG.get("max_workers", 2)))
+GENERATION_EXECUTOR = os.getenv(
+    "GENERATION_EXECUTOR", GENERATION_CONFIG.get("executor", "thread"))
+# Days of one plan are generated and validated concurrently, up to this many
+# crew runs at a time per plan
+GENERATION_DAY_CONCURRENCY = int(os.getenv(
+    "GENERATION_DAY_CONCURRENCY", GENERATION_CONFIG.get("day_concurrency", meal_solver.DAYS)))
+# Every plan on the pool fans its days out, so GENERATION_MAX_WORKERS plans
+# could otherwise run GENERATION_MAX_WORKERS x GENERATION_DAY_CONCURRENCY
+# crew runs (and LLM calls) at once; this caps day runs across all plans of
+# a process (each process of the process executor has its own cap)
+GENERATION_MAX_CREW_RUNS = int(os.getenv(
+    "GENERATION_MAX_CREW_RUNS", GENERATION_CONFIG.get("max_crew_runs", GENERATION_DAY_CONCURRENCY)))
+_crew_run_slots = threading.BoundedSemaphore(GENERATION_MAX_CREW_RUNS)
+
+# Estimated prompt tokens per crew task; long fields are truncated to fit
+PROMPT_CONFIG = config.get("prompts", {})
+DEFAULT_TOKEN_BUDGETS = {"analysis": 1500, "meal_plan": 2500, "validation": 4000}
+PROMPT_TOKEN_BUDGETS = {
+    task: int(os.getenv(
+        f"PROMPT_TOKEN_BUDGET_{task.upper()}",
+        PROMPT_CONFIG.get("token_budgets", {}).get(task, default)))
+    for task, default in DEFAULT_TOKEN_BUDGETS.items()
+}
+
+# The meal-plan stage streams tokens to ``on_delta`` as they are generated
+STREAM_TOKENS = os.getenv(
+    "STREAM_TOKENS", str(GENERATION_CONFIG.get("stream", True))
+).lower() not in ("0", "false", "no")
+
+LLM_CACHE_ENABLED = os.getenv(
+    "LLM_CACHE", str(config.get("llm_cache", {}).get("enabled", True))
+).lower() not in ("0", "false", "no")
 
 # Required Additions for External Integration:
 """
@@ -39,71 +82,8 @@ llm = LLM(MODEL_NAME)
 """
 
 
-# Tools
-search = GoogleSerperAPIWrapper()
-
-class SearchTool(BaseTool):
-    name: str = "Search"
-    description: str = "Useful for search-based queries. Use this to find current information about markets, companies, and trends."
-    search: GoogleSerperAPIWrapper = Field(default_factory=GoogleSerperAPIWrapper)
-
-    def _run(self, query: str) -> str:
-        """Execute the search query and return results"""
-        try:
-            return self.search.run(query)
-        except Exception as e:
-            return f"Error performing search: {str(e)}"
-
-# AI Agents
-input_processor = Agent(
-    role="Dietary Pattern Analyzer",
-    goal="Identify explicit and implicit nutritional constraints from user input",
-    backstory="Specializes in detecting cultural preferences, food intolerances, and hidden dietary patterns",
-    verbose=True,
-    llm=llm,
-    memory=True,
-    tools=[],  # Add food database lookup tool if available
-    system_prompt="Always ask clarifying questions about cooking time preferences"
-)
-
-nutrition_researcher = Agent(
-    role="Precision Nutrition Engineer",
-    goal="Calculate TDEE and create dynamic nutrient targets",
-    backstory="Combines sports nutrition certification with clinical dietetics expertise",
-    verbose=True,
-    llm=llm,  # For precise calculations
-    system_prompt="""Use latest NIH equations for metabolic calculations:
-    - Mifflin-St Jeor for BMR
-    - Harris-Benedict for activity adjustment
-    - Always consider body composition goals"""
-)
-
-diet_planner = Agent(
-    role="Culinary Nutrition Designer",
-    goal="Create quick-prep meals using ONLY approved ingredients in authentic Italian style",
-    backstory="Third-generation Italian chef specializing in 30-minute Mediterranean diets",
-    verbose=True,
-    llm=llm,
-    allow_delegation=False,
-    tools=[],  # Add Spoonacular API tool for recipes
-    system_prompt="""Prioritize these cooking methods:
-    1. One-pan meals 2. Sheet pan dinners 3. Instant pot recipes
-    Maximum 5 ingredients per meal"""
-)
-
-plan_validator = Agent(
-    role="Nutritional Compliance Auditor",
-    goal="Ensure strict adherence to ALL constraints",
-    backstory="Food safety inspector with nutrition certification",
-    verbose=True,
-    llm=llm,
-    tools=[SearchTool()],  # Add nutrition analysis tool
-    system_prompt="Check these in order: 1. Ingredient compliance 2. Prep time 3. Macro targets"
-)
-
-# Enhanced Task Definitions
-analysis_task = Task(
-    description="""Extract critical parameters:
+# Task prompts
+ANALYSIS_PROMPT = """Extract critical parameters:
     User Profile:
     - Age: {age}
     - Weight: {weight}kg
@@ -113,73 +93,280 @@ analysis_task = Task(
     - Cultural Focus: Italian cuisine
     - Max Prep Time: 30 mins/meal
     
+    Precomputed nutrition targets (Mifflin-St Jeor, do not recalculate):
+    {nutrition_targets}
+    
     Output format:
-    - BMR/TDEE calculations
-    - Macronutrient ranges
     - Flagged incompatible foods
-    - Cultural adaptation plan""",
-    agent=input_processor,
-    expected_output="Structured JSON with metabolic data and constraint analysis"
-)
-
-nutrition_task = Task(
-    description="""Create dynamic nutrition protocol:
-    - Protein: 1.6-2.2g/kg based on activity level
-    - Carb cycling for {g}
-    - Mediterranean diet micronutrient focus
-    - 30% caloric deficit/surplus based on goal
-    - Strict Italian food alignment
-    
-    Required output:
-    - Daily targets (energy, macros, fiber)
-    - Meal timing schedule
-    - Supplement recommendations""",
-    agent=nutrition_researcher,
-    expected_output="Table-based nutrition plan with Italian food mappings"
-)
-
-mealplan_task = Task(
-    description="""Generate QUICK PREP Italian meal plan:
-    - 7 days, 3 meals + 2 snacks
+    - Cultural adaptation plan
+    - Meal timing schedule"""
+
+MEAL_PLAN_PROMPT = """Generate QUICK PREP Italian meals for day {day} of a 7-day plan:
+    - 3 meals + 2 snacks
     - Max 30 mins active cooking time per meal
     - Use ONLY: {food_preferences}
+    - Respect this dietary analysis:
+    {analysis}
+    - Hit these daily targets:
+    {nutrition_targets}
+    - Build each meal around exactly these ingredients and servings
+      (already solved to meet the targets, do not change quantities):
+    {ingredient_plan}
     - Authentic regional Italian recipes
+    - Mediterranean diet micronutrient focus
     - Include:
       * Step-by-step quick prep instructions
       * Pan/pot requirements
       * Batch cooking markers
       * Nutritional breakdown per meal
     
-    Format: Markdown with cooking timeline""",
-    agent=diet_planner,
-    expected_output="Time-optimized meal plan with visual cooking guides"
-)
-
-validation_task = Task(
-    description="""Perform strict quality check:
-    1. Macro/micro compliance (±5%)
-    2. Ingredient compliance (ZERO exceptions)
+    Format: Markdown with cooking timeline, without a day heading"""
+
+VALIDATION_PROMPT = """Perform strict quality check of day {day}:
+    {day_plan}
+    
+    1. Macro/micro compliance (±5%) against:
+    {nutrition_targets}
+    2. Ingredient compliance (ZERO exceptions), allowed: {food_preferences}
     3. Cultural authenticity
     4. Prep time constraints
-    5. Meal variety score
     
-    Output: Validation report with improvement checklist""",
-    agent=plan_validator,
-    expected_output="PDF-style audit report with pass/fail markers"
-)
+    Output: Validation report with improvement checklist"""
 
 
-# CrewAI Processing Function
-async def generate_meal_plan(user_inputs):
-    crew = Crew(
-        agents=[input_processor, nutrition_researcher, diet_planner, plan_validator],
-        tasks=[analysis_task, nutrition_task, mealplan_task, validation_task],
-        process=Process.hierarchical,
+# Crews are built on first generation: crewai, langchain and the search
+# client are slow to import and need API keys, and API processes that
+# never generate should not pay for them.
+_crews = None
+_crews_lock = threading.Lock()
+
+
+def get_llm(stream: bool = False):
+    """The agents' LLM, timed and memoized on disk unless disabled (see llm_cache.py)"""
+    from crewai import LLM
+    from llm_cache import CachedLLM
+
+    return CachedLLM.wrap(LLM(MODEL_NAME, stream=stream), cache_enabled=LLM_CACHE_ENABLED)
+
+
+def build_crews(llm=None):
+    """Build the agents and return template crews keyed by pipeline stage"""
+    from crewai import Agent, Crew, Task, Process
+    from search_tool import SearchTool
+
+    llm_stream.install()
+    planner_llm = llm or get_llm(stream=STREAM_TOKENS)
+    llm = llm or get_llm()
+
+    # AI Agents
+    input_processor = Agent(
+        role="Dietary Pattern Analyzer",
+        goal="Identify explicit and implicit nutritional constraints from user input",
+        backstory="Specializes in detecting cultural preferences, food intolerances, and hidden dietary patterns",
         verbose=True,
-        memory=True
+        llm=llm,
+        memory=True,
+        tools=[],  # Add food database lookup tool if available
+        system_prompt="Always ask clarifying questions about cooking time preferences"
     )
-    
-    result = crew.kickoff(user_inputs)
 
-    return result.output
-    
\ No newline at end of file
+    diet_planner = Agent(
+        role="Culinary Nutrition Designer",
+        goal="Create quick-prep meals using ONLY approved ingredients in authentic Italian style",
+        backstory="Third-generation Italian chef specializing in 30-minute Mediterranean diets",
+        verbose=True,
+        llm=planner_llm,
+        allow_delegation=False,
+        tools=[],  # Add Spoonacular API tool for recipes
+        system_prompt="""Prioritize these cooking methods:
+    1. One-pan meals 2. Sheet pan dinners 3. Instant pot recipes
+    Maximum 5 ingredients per meal"""
+    )
+
+    plan_validator = Agent(
+        role="Nutritional Compliance Auditor",
+        goal="Ensure strict adherence to ALL constraints",
+        backstory="Food safety inspector with nutrition certification",
+        verbose=True,
+        llm=llm,
+        tools=[SearchTool()],  # Add nutrition analysis tool
+        system_prompt="Check these in order: 1. Ingredient compliance 2. Prep time 3. Macro targets"
+    )
+
+    # Enhanced Task Definitions
+    analysis_task = Task(
+        description=ANALYSIS_PROMPT,
+        agent=input_processor,
+        expected_output="Structured JSON with constraint analysis"
+    )
+
+    mealplan_task = Task(
+        description=MEAL_PLAN_PROMPT,
+        agent=diet_planner,
+        expected_output="Time-optimized meal plan for one day with visual cooking guides"
+    )
+
+    validation_task = Task(
+        description=VALIDATION_PROMPT,
+        agent=plan_validator,
+        expected_output="PDF-style audit report for the day with pass/fail markers"
+    )
+
+    return {
+        stage: Crew(agents=[task.agent], tasks=[task], process=Process.sequential, verbose=True)
+        for stage, task in (
+            ("analysis", analysis_task),
+            ("meal_plan", mealplan_task),
+            ("validation", validation_task),
+        )
+    }
+
+
+def get_crews():
+    global _crews
+    with _crews_lock:
+        if _crews is None:
+            _crews = build_crews()
+    return _crews
+
+
+# CrewAI Processing Function
+NO_INGREDIENT_PLAN = "None available: choose portions that meet the targets."
+
+
+def solve_ingredients(user_inputs, targets):
+    """Solve servings of the allowed foods for the week's macro targets"""
+    with db.get_pool().connection() as conn:
+        foods = load_food_matrix(conn)
+    allowed = foods.subset(preference_names(user_inputs.get("food_preferences")))
+    return meal_solver.solve_week(allowed, targets)
+
+
+def _kickoff(crew, task: str, inputs, on_text=None):
+    """Run a copy of a template crew within the task's token budget and return its raw output.
+
+    With ``on_text`` the answer is also passed on as it streams in; a
+    completion that did not stream (cached, or a non-streaming LLM) is
+    passed on whole at the end.
+    """
+    inputs = prompt_builder.fit(
+        task, crew.tasks[0].description, inputs, PROMPT_TOKEN_BUDGETS[task])
+    with metrics.span("crew_task_duration_seconds", task=task):
+        if on_text is None:
+            return crew.copy().kickoff(inputs).raw
+        with llm_stream.capture(on_text) as sink:
+            raw = crew.copy().kickoff(inputs).raw
+    if not sink.emitted:
+        on_text(raw)
+    return raw
+
+
+def _kickoff_day(crew, task: str, inputs, on_delta=None):
+    with _crew_run_slots:
+        if on_delta is None:
+            return _kickoff(crew, task, inputs)
+        day = inputs["day"]
+        text = _kickoff(crew, task, inputs, functools.partial(on_delta, day))
+        on_delta(day, None)
+        return text
+
+
+def _kickoff_all(crew, task: str, inputs_list, on_delta=None):
+    """Run a copy of ``crew`` per day's inputs concurrently; outputs in order"""
+    workers = max(1, min(GENERATION_DAY_CONCURRENCY, len(inputs_list)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crew-day") as pool:
+        return list(pool.map(
+            lambda inputs: _kickoff_day(crew, task, inputs, on_delta), inputs_list))
+
+
+def merge_plan(nutrition_targets, days, reports, solution=None):
+    """Assemble per-day plans and validation reports into one document.
+
+    Each day of the solved ``solution`` is listed as an ingredient table
+    ahead of the day's text, for plan_model to index. Headings in the
+    generated text are demoted so they cannot be read as day or section
+    markers.
+    """
+    parts = ["# 7-Day Quick Prep Italian Meal Plan", "## Daily targets", nutrition_targets]
+    for day, text in enumerate(days, 1):
+        parts.append(f"## Day {day}")
+        if solution:
+            parts.append(plan_model.format_ingredients(solution["days"][day - 1]))
+        parts.append(plan_model.demote_headings(text.strip()))
+    parts.append(plan_model.VALIDATION_HEADING)
+    for day, text in enumerate(reports, 1):
+        parts += [f"## Day {day}", plan_model.demote_headings(text.strip())]
+    return "\n\n".join(parts) + "\n"
+
+
+def run_crew(user_inputs, on_stage=None, on_delta=None):
+    """Run the pipeline synchronously and return the final plan text.
+
+    Targets and ingredients are computed once, the dietary analysis runs
+    once, then every day is written and validated as an independent crew
+    run, concurrently, so latency follows the slowest day rather than the
+    whole week. ``on_stage(stage)`` is called as the pipeline enters each
+    stage, and ``on_delta(day, text)`` receives each day's plan text as it
+    is generated, then ``text=None`` once that day is done.
+    """
+    report = on_stage or (lambda stage: None)
+    report("nutrition")
+    # Targets are plain arithmetic, computed here instead of by an agent
+    # (batches compute them for all members up front)
+    targets = user_inputs.get("precomputed_targets") or nutrition.compute_targets(user_inputs)
+    solution = solve_ingredients(user_inputs, targets)
+    # Interpolated into every prompt, so serialized compactly once
+    with db.get_pool().connection() as conn:
+        user_inputs = prompt_builder.compact_inputs(conn, user_inputs)
+    user_inputs["nutrition_targets"] = nutrition.format_targets(targets)
+
+    crews = get_crews()
+    report("analysis")
+    analysis = _kickoff(crews["analysis"], "analysis", user_inputs)
+
+    report("meal_plan")
+    day_inputs = [
+        {
+            **user_inputs,
+            "day": day,
+            "analysis": analysis,
+            "ingredient_plan": (
+                meal_solver.format_day(solution["days"][day - 1]) if solution
+                else NO_INGREDIENT_PLAN
+            ),
+        }
+        for day in range(1, meal_solver.DAYS + 1)
+    ]
+    days = _kickoff_all(crews["meal_plan"], "meal_plan", day_inputs, on_delta)
+
+    report("validation")
+    reports = _kickoff_all(crews["validation"], "validation", [
+        {**inputs, "day_plan": text} for inputs, text in zip(day_inputs, days)
+    ])
+
+    return merge_plan(user_inputs["nutrition_targets"], days, reports, solution)
+
+
+_generation_pool = None
+
+
+def get_generation_pool():
+    global _generation_pool
+    if _generation_pool is None:
+        if GENERATION_EXECUTOR == "process":
+            _generation_pool = ProcessPoolExecutor(max_workers=GENERATION_MAX_WORKERS)
+        else:
+            _generation_pool = ThreadPoolExecutor(
+                max_workers=GENERATION_MAX_WORKERS, thread_name_prefix="crew")
+    return _generation_pool
+
+
+async def generate_meal_plan(user_inputs, on_stage=None, on_delta=None):
+    """Run the crew on the generation pool without blocking the event loop.
+
+    Calls beyond GENERATION_MAX_WORKERS queue inside the executor. With the
+    process executor ``on_stage`` and ``on_delta`` must be picklable.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_generation_pool(), run_crew, user_inputs, on_stage, on_delta)
@@ -1,22 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from security import get_password_hash, verify_password
-from starlette.middleware.sessions import SessionMiddleware
+from security import get_password_hash_async, verify_password_async
+from cache import TTLCache
 import sqlite3
 import os
+import asyncio
+import batches
+import compaction
+import db
+import food_cache
+import food_loader
+import food_search
+import metrics
+import plan_cache
+import plan_drafts
+import plan_model
+import plan_store
+import sessions
+import task_queue
+from db import init_db
 import uuid
 import json
-from datetime import datetime
+import math
+import time
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import logging
-from agents import generate_meal_plan
 import uvicorn
 
 # Configuration
-MEAL_PLANS_DIR = "data/meal_plans"
-os.makedirs(MEAL_PLANS_DIR, exist_ok=True)
+# Queue workers run inside the API process; set to 0 when running worker.py
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "1"))
+# How often task event streams check the task row, and the keep-alive period
+TASK_EVENTS_POLL_INTERVAL = float(os.getenv("TASK_EVENTS_POLL_INTERVAL", "0.5"))
+TASK_EVENTS_KEEPALIVE = 15.0
+# Authenticated user records, so session checks skip the database
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+MEAL_PLANS_PAGE_SIZE = 50
+MEAL_PLANS_MAX_PAGE_SIZE = 200
 
 app = FastAPI()
 
@@ -29,18 +54,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Session middleware configuration
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Session middleware configuration; keys and store are shared by all workers
 app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.urandom(24).hex(),
+    sessions.SessionMiddleware,
+    keyring=sessions.KeyRing(sessions.SESSION_SECRET_KEYS),
+    store=sessions.SESSION_STORE,
     session_cookie="session_cookie",
-    max_age=3600,  # 1 hour expiration
+    max_age=sessions.SESSION_MAX_AGE,
     same_site="Lax",
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe(
+        "http_request_duration_seconds", time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=str(response.status_code),
+    )
+    return response
+
 # Logger setup
 logger = logging.getLogger(__name__)
 
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # Pydantic models
 class UserLogin(BaseModel):
     username: str
@@ -56,57 +99,70 @@ class MealPlanRequest(BaseModel):
     height: int
     goal: str
     food_preferences: dict
+    sex: Optional[str] = None
+    activity_level: Optional[str] = None
+
+class BatchMealPlanRequest(BaseModel):
+    requests: List[MealPlanRequest]
 
 class TaskStatusResponse(BaseModel):
     status: str
     result: Optional[dict]
     error: Optional[str]
+    timings: Optional[dict] = None
 
 # Database initialization
-
+@app.on_event("startup")
 def startup_db():
-    conn = sqlite3.connect("diet_planner.db")
+    init_db()
+
+@app.on_event("startup")
+async def start_embedded_workers():
+    if EMBEDDED_WORKERS > 0:
+        import worker  # pulls in the crew; only needed when generating here
+        app.state.worker_stop = asyncio.Event()
+        app.state.worker_task = asyncio.create_task(
+            worker.run_workers(EMBEDDED_WORKERS, app.state.worker_stop)
+        )
+
+@app.on_event("shutdown")
+async def stop_embedded_workers():
+    if EMBEDDED_WORKERS > 0:
+        # In-flight tasks are abandoned; their leases expire and they are retried
+        app.state.worker_stop.set()
+        app.state.worker_task.cancel()
+
+async def _load_foods():
     try:
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS meal_plans (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS foods (
-                name TEXT NOT NULL,
-                portion TEXT NOT NULL,
-                carbs REAL NOT NULL,
-                protein REAL NOT NULL,
-                fat REAL NOT NULL
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id TEXT PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                status TEXT NOT NULL,
-                result TEXT,
-                error TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        conn.commit()
-    finally:
-        conn.close()
+        for result in await db.run(food_loader.load_all):
+            logger.info(f"Food data load: {result}")
+    except Exception as e:
+        logger.error(f"Food data load failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_food_load():
+    # Runs in the background; unchanged sources are skipped by checksum
+    if food_loader.FOOD_LOAD_ON_STARTUP:
+        app.state.food_load_task = asyncio.create_task(_load_foods())
+
+async def _compaction_loop():
+    while True:
+        await asyncio.sleep(compaction.COMPACTION_INTERVAL)
+        try:
+            removed = await db.run(compaction.compact)
+            logger.info(f"Compaction removed {removed}")
+        except Exception as e:
+            logger.error(f"Compaction failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_compaction():
+    if compaction.COMPACTION_INTERVAL > 0:
+        app.state.compaction_task = asyncio.create_task(_compaction_loop())
+
+@app.on_event("shutdown")
+async def stop_compaction():
+    if compaction.COMPACTION_INTERVAL > 0:
+        app.state.compaction_task.cancel()
 
 # Dependency to get current user
 async def get_current_user(request: Request):
@@ -117,48 +173,39 @@ async def get_current_user(request: Request):
             detail="Not authenticated"
         )
     
-    conn = sqlite3.connect("diet_planner.db")
-    try:
-        c = conn.cursor()
-        c.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
-        user = c.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return {"id": user[0], "username": user[1]}
-    finally:
-        conn.close()
-
-# Helper functions
-def save_meal_plan(content: str) -> str:
-    """Save meal plan to file and return file path"""
-    filename = f"{uuid.uuid4()}-{datetime.now().strftime('%Y%m%d%H%M%S')}.md"
-    filepath = os.path.join(MEAL_PLANS_DIR, filename)
-    
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        return filepath
-    except IOError as e:
-        logger.error(f"Failed to save meal plan: {str(e)}")
-        raise
+    cached = user_cache.get(user_id)
+    if cached:
+        return cached
+
+    user = await db.fetch_one("SELECT id, username FROM users WHERE id = ?", (user_id,))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    record = {"id": user[0], "username": user[1]}
+    user_cache.set(user_id, record)
+    return record
 
 # Routes
 @app.post("/api/login")
 async def login(user_data: UserLogin, request: Request):
-    conn = sqlite3.connect("diet_planner.db")
-    try:
-        c = conn.cursor()
-        c.execute("SELECT id, username, password_hash FROM users WHERE username = ?", 
-                 (user_data.username,))
-        user = c.fetchone()
+    user = await db.fetch_one(
+        "SELECT id, username, password_hash FROM users WHERE username = ?",
+        (user_data.username,)
+    )
+    
+    if not user or not await verify_password_async(user_data.password, user[2]):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        if not user or not verify_password(user_data.password, user[2]):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-            
-        request.session["user_id"] = user[0]
-        return {"message": "Logged in"}
-    finally:
-        conn.close()
+    request.session["user_id"] = user[0]
+    # Refresh the cached record on every login
+    user_cache.set(user[0], {"id": user[0], "username": user[1]})
+    return {"message": "Logged in"}
+
+@app.post("/api/logout")
+async def logout(request: Request):
+    user_id = request.session.pop("user_id", None)
+    if user_id:
+        user_cache.invalidate(user_id)
+    return {"message": "Logged out"}
 
 @app.post("/api/register")
 async def register(user_data: UserRegister):
@@ -168,156 +215,371 @@ async def register(user_data: UserRegister):
             detail="Password must be at least 8 characters"
         )
         
-    conn = sqlite3.connect("diet_planner.db")
+    hashed_pw = await get_password_hash_async(user_data.password)
     try:
-        c = conn.cursor()
-        hashed_pw = get_password_hash(user_data.password)
-        c.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", 
-                 (user_data.username, hashed_pw))
-        conn.commit()
+        await db.execute(
+            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+            (user_data.username, hashed_pw)
+        )
         return {"message": "Registered"}
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Username exists")
-    finally:
-        conn.close()
 
 @app.post("/api/generate-meal-plan", response_model=dict)
 async def create_meal_plan_task(
     request_data: MealPlanRequest,
-    current_user: dict = Depends(get_current_user),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    current_user: dict = Depends(get_current_user)
 ):
     task_id = str(uuid.uuid4())
-    conn = sqlite3.connect("diet_planner.db")
+    params = request_data.dict()
+    plan = await db.run(_complete_from_cache, task_id, current_user["id"], params)
+    if plan:
+        return {"task_id": task_id, "status": "completed"}
+
     try:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO tasks (id, user_id, status)
-            VALUES (?, ?, 'pending')
-        """, (task_id, current_user["id"]))
-        conn.commit()
-    finally:
-        conn.close()
-    
-    background_tasks.add_task(
-        process_meal_plan_task,
-        task_id,
-        current_user["id"],
-        request_data.dict()
-    )
+        await db.run(_enqueue_admitted, task_id, current_user["id"], params)
+    except task_queue.QueueFull as e:
+        raise _queue_full(e)
     return {"task_id": task_id, "status": "pending"}
 
+def _enqueue_admitted(conn, task_id: str, user_id: int, params: dict):
+    task_queue.admit(conn, user_id)
+    task_queue.enqueue(conn, task_id, user_id, params)
+
+def _queue_full(e: task_queue.QueueFull) -> HTTPException:
+    detail = ("Too many meal plans in progress" if e.scope == "user"
+              else "Meal-plan queue is full")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
+
+def _complete_from_cache(conn, task_id: str, user_id: int, params: dict):
+    """Serve an equivalent previously generated plan without queueing"""
+    file_path = plan_cache.lookup(conn, plan_cache.request_key(params))
+    if not file_path:
+        return None
+    plan_id = db.record_meal_plan(conn, user_id, file_path)
+    result = {"plan_id": plan_id, "file_path": file_path}
+    task_queue.enqueue_completed(conn, task_id, user_id, params, result)
+    return result
+
+@app.post("/api/batch-meal-plans", response_model=dict)
+async def create_batch_meal_plans(
+    request_data: BatchMealPlanRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    if not request_data.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(request_data.requests) > batches.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {batches.BATCH_MAX_SIZE} requests"
+        )
+    batch_id = str(uuid.uuid4())
+    try:
+        return await db.run(
+            batches.create_batch, batch_id, current_user["id"],
+            [r.dict() for r in request_data.requests]
+        )
+    except task_queue.QueueFull as e:
+        raise _queue_full(e)
+
+@app.get("/api/batches/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    batch = await db.run(batches.get_batch, batch_id, current_user["id"])
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/queue/stats")
+async def get_queue_stats(current_user: dict = Depends(get_current_user)):
+    return await db.run(task_queue.stats, current_user["id"])
+
+@app.get("/api/plan-cache/stats")
+async def get_plan_cache_stats(current_user: dict = Depends(get_current_user)):
+    return await db.run(plan_cache.stats)
+
 @app.get("/api/tasks/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(
     task_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    conn = sqlite3.connect("diet_planner.db")
-    try:
-        c = conn.cursor()
-        c.execute("""
-            SELECT status, result, error
-            FROM tasks
-            WHERE id = ? AND user_id = ?
-        """, (task_id, current_user["id"]))
-        task = c.fetchone()
+    task = await db.fetch_one("""
+        SELECT status, result, error, timings
+        FROM tasks
+        WHERE id = ? AND user_id = ?
+    """, (task_id, current_user["id"]))
+    
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
         
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-            
+    try:
         return {
             "status": task[0],
             "result": json.loads(task[1]) if task[1] else None,
-            "error": task[2]
+            "error": task[2],
+            "timings": json.loads(task[3]) if task[3] else None
         }
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Invalid task result format")
-    finally:
-        conn.close()
 
-async def process_meal_plan_task(task_id: str, user_id: int, params: dict):
-    conn = sqlite3.connect("diet_planner.db")
+def _task_event(row) -> dict:
+    stage = row[3]
+    return {
+        "status": row[0],
+        "stage": stage,
+        "stage_index": task_queue.STAGES.index(stage) + 1 if stage in task_queue.STAGES else 0,
+        "stage_count": len(task_queue.STAGES),
+        "result": json.loads(row[1]) if row[1] else None,
+        "error": row[2],
+    }
+
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Server-Sent Events stream of a task's status, stage transitions and plan text.
+
+    The row is checked server-side (one primary-key read per interval, no
+    session lookup), so it works with workers in other processes. Plan
+    text streamed by the worker arrives as ``delta`` events (``{"day",
+    "text"}``) whose ids let a reconnecting client resume; ``reset`` means
+    a retry started over and earlier text should be discarded.
+    """
+    query = """
+        SELECT status, result, error, stage, leader_id
+        FROM tasks
+        WHERE id = ? AND user_id = ?
+    """
+    params = (task_id, current_user["id"])
+    row = await db.fetch_one(query, params)
+    if not row:
+        raise HTTPException(status_code=404, detail="Task not found")
+    # Batch followers show the text of the task generating for them
+    draft_id = row[4] or task_id
     try:
-        # Simulate meal plan generation
-        result = await generate_meal_plan(params)
-        file_path = save_meal_plan(result)
-        
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO meal_plans (user_id, date, file_path)
-            VALUES (?, datetime('now'), ?)
-        """, (user_id, file_path))
-        plan_id = c.lastrowid
-        conn.commit()
-        
-        c.execute("""
-            UPDATE tasks 
-            SET status = 'completed',
-                result = ?
-            WHERE id = ?
-        """, (json.dumps({"plan_id": plan_id, "file_path": file_path}), task_id))
-        conn.commit()
-        
-    except Exception as e:
-        logger.error(f"Task failed: {str(e)}")
-        c.execute("""
-            UPDATE tasks 
-            SET status = 'failed',
-                error = ?
-            WHERE id = ?
-        """, (str(e), task_id))
-        conn.commit()
-    finally:
-        conn.close()
+        last_output_id = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        last_output_id = 0
+
+    async def events():
+        nonlocal last_output_id
+        last_event = None
+        last_attempt = None
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            for output_id, attempt, day, text in await db.run(
+                plan_drafts.since, draft_id, last_output_id
+            ):
+                if last_attempt is not None and attempt != last_attempt:
+                    yield "event: reset\ndata: {}\n\n"
+                yield f"id: {output_id}\nevent: delta\ndata: {json.dumps({'day': day, 'text': text})}\n\n"
+                last_output_id, last_attempt, last_sent = output_id, attempt, time.monotonic()
+            row = await db.fetch_one(query, params)
+            if not row:
+                return
+            event = _task_event(row)
+            if event != last_event:
+                yield f"event: status\ndata: {json.dumps(event)}\n\n"
+                last_event, last_sent = event, time.monotonic()
+                if event["status"] in ("completed", "failed"):
+                    return
+            elif time.monotonic() - last_sent > TASK_EVENTS_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(TASK_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/tasks/{task_id}/output")
+async def get_task_output(
+    task_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Plan text streamed so far by a running, retrying or failed task"""
+    task = await db.fetch_one(
+        "SELECT status, leader_id FROM tasks WHERE id = ? AND user_id = ?",
+        (task_id, current_user["id"])
+    )
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    draft = await db.run(plan_drafts.assemble, task[1] or task_id)
+    attempt, days = draft or (None, {})
+    return {
+        "status": task[0],
+        "attempt": attempt,
+        "days": [{"day": day, "text": text} for day, text in days.items()],
+    }
+
+def _list_meal_plans(conn, user_id: int, before: Optional[int], limit: int) -> list:
+    # Newest first, keyset-paginated on (date, id) via idx_meal_plans_user_date
+    if before is None:
+        return conn.execute("""
+            SELECT id, date FROM meal_plans
+            WHERE user_id = ?
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        """, (user_id, limit)).fetchall()
+    return conn.execute("""
+        SELECT id, date FROM meal_plans
+        WHERE user_id = ?
+          AND (date, id) < (SELECT date, id FROM meal_plans WHERE id = ? AND user_id = ?)
+        ORDER BY date DESC, id DESC
+        LIMIT ?
+    """, (user_id, before, user_id, limit)).fetchall()
+
+@app.get("/api/meal-plans")
+async def list_meal_plans(
+    request: Request,
+    before: Optional[int] = None,
+    limit: int = Query(MEAL_PLANS_PAGE_SIZE, ge=1, le=MEAL_PLANS_MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    rows = await db.run(_list_meal_plans, current_user["id"], before, limit + 1)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1][0])
+        headers["Link"] = f'<{request.url.include_query_params(before=rows[-1][0])}>; rel="next"'
+    return JSONResponse([{"id": r[0], "date": r[1]} for r in rows], headers=headers)
+
+async def _get_plan_ref(plan_id: int, user_id: int) -> str:
+    result = await db.fetch_one("""
+        SELECT file_path 
+        FROM meal_plans 
+        WHERE id = ? AND user_id = ?
+    """, (plan_id, user_id))
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return result[0]
 
 @app.get("/api/meal-plans/{id}")
 async def get_meal_plan(
     id: int,
     current_user: dict = Depends(get_current_user)
 ):
-    conn = sqlite3.connect("diet_planner.db")
+    file_path = await _get_plan_ref(id, current_user["id"])
+    
     try:
-        c = conn.cursor()
-        c.execute("""
-            SELECT file_path 
-            FROM meal_plans 
-            WHERE id = ? AND user_id = ?
-        """, (id, current_user["id"]))
-        result = c.fetchone()
-        
-        if not result:
-            raise HTTPException(status_code=404, detail="Plan not found")
-            
-        file_path = result[0]
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return {"content": content}
-        except FileNotFoundError:
-            logger.error(f"Missing plan file: {file_path}")
-            raise HTTPException(status_code=404, detail="Plan content unavailable")
-    finally:
-        conn.close()
+        content = await db.run(plan_store.read, file_path)
+        return {"content": content}
+    except FileNotFoundError:
+        logger.error(f"Missing plan content: {file_path}")
+        raise HTTPException(status_code=404, detail="Plan content unavailable")
 
-@app.get("/api/food-db")
-async def get_food_db():
-    conn = sqlite3.connect("diet_planner.db")
+@app.get("/api/meal-plans/{id}/days")
+async def get_meal_plan_days(
+    id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Per-day and week macro totals of a plan"""
+    file_path = await _get_plan_ref(id, current_user["id"])
     try:
-        c = conn.cursor()
-        c.execute("SELECT name, portion, carbs, protein, fat FROM foods")
-        return [
-            {
-                "name": row[0],
-                "portion": row[1],
-                "carbs": row[2],
-                "protein": row[3],
-                "fat": row[4]
-            }
-            for row in c.fetchall()
-        ]
-    finally:
-        conn.close()
+        return await db.run(plan_model.summary, file_path)
+    except FileNotFoundError:
+        logger.error(f"Missing plan content: {file_path}")
+        raise HTTPException(status_code=404, detail="Plan content unavailable")
+
+@app.get("/api/meal-plans/{id}/days/{day}")
+async def get_meal_plan_day(
+    id: int,
+    day: int,
+    meal: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """One day of a plan (meals, ingredients, totals, text), or one of its meals"""
+    file_path = await _get_plan_ref(id, current_user["id"])
+    try:
+        plan_day = await db.run(plan_model.get_day, file_path, day)
+    except FileNotFoundError:
+        logger.error(f"Missing plan content: {file_path}")
+        raise HTTPException(status_code=404, detail="Plan content unavailable")
+    if plan_day is None:
+        raise HTTPException(status_code=404, detail="Day not found")
+    if meal is None:
+        return plan_day
+    found = plan_model.find_meal(plan_day, meal)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return {"day": day, **found}
+
+@app.get("/api/meal-plans/{id}/content")
+async def stream_meal_plan(
+    id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream the plan as markdown without building the whole document in memory"""
+    file_path = await _get_plan_ref(id, current_user["id"])
+    
+    try:
+        chunks = await db.run(plan_store.open_chunks, file_path)
+    except FileNotFoundError:
+        logger.error(f"Missing plan content: {file_path}")
+        raise HTTPException(status_code=404, detail="Plan content unavailable")
+    return StreamingResponse(chunks, media_type="text/markdown; charset=utf-8")
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*"
+
+@app.get("/api/food-db")
+async def get_food_db(
+    request: Request,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=food_cache.MAX_PAGE_SIZE)
+):
+    catalog = await food_cache.get_catalog()
+    headers = {"Cache-Control": "no-cache"}
+
+    # Full listing: precomputed body, precompressed when the client accepts gzip
+    if category is None and q is None and after is None and limit is None:
+        headers["ETag"] = catalog.etag
+        if _not_modified(request, catalog.etag):
+            return Response(status_code=304, headers=headers)
+        headers["Vary"] = "Accept-Encoding"
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(catalog.gzip_body, media_type="application/json", headers=headers)
+        return Response(catalog.body, media_type="application/json", headers=headers)
+
+    if after is not None and limit is None:
+        limit = food_cache.DEFAULT_PAGE_SIZE
+    headers["ETag"] = catalog.etag_for(str(request.url.query))
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    items, next_cursor = catalog.page(category, q, after, limit)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+        headers["Link"] = f'<{request.url.include_query_params(after=next_cursor)}>; rel="next"'
+    return JSONResponse(items, headers=headers)
+
+@app.get("/api/foods/search")
+async def search_foods(
+    q: str = Query(..., min_length=1, max_length=100),
+    category: Optional[str] = None,
+    limit: int = Query(food_search.DEFAULT_LIMIT, ge=1, le=food_search.MAX_LIMIT)
+):
+    return await db.run(food_search.search, q, limit, category)
 
 if __name__ == "__main__":
+    # Single-process development server; see serve.py for multiple workers
     uvicorn.run(app, host="localhost", port=5000)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""Batch meal-plan generation for cohorts.
+
+Nutrition targets for every member are computed in one vectorized pass.
+Members with equivalent constraints (same food preferences and goal class,
+targets equal after rounding to ``ENERGY_STEP`` / ``MACRO_STEP``) form a
+group, and each group runs the crew once: a leader task is queued with the
+group's targets precomputed, and the other members wait on it as follower
+tasks (see task_queue). Groups whose plan is already cached complete
+immediately. The batch is refused (task_queue.QueueFull) when its leader
+tasks do not fit in the queue. Every member keeps its own task id, so the
+per-task status and event endpoints work unchanged.
+
+Functions take a connection first so they run through ``db.run``.
+"""
+import json
+import os
+import uuid
+
+import db
+import nutrition
+import plan_cache
+import task_queue
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+ENERGY_STEP = 50.0  # kcal
+MACRO_STEP = 5.0  # g
+
+TARGET_STEPS = {
+    "bmr": ENERGY_STEP,
+    "tdee": ENERGY_STEP,
+    "energy": ENERGY_STEP,
+    "protein": MACRO_STEP,
+    "protein_min": MACRO_STEP,
+    "protein_max": MACRO_STEP,
+    "carbs": MACRO_STEP,
+    "fat": MACRO_STEP,
+    "fiber": MACRO_STEP,
+}
+
+
+def _rounded_targets(batch: dict, i: int) -> dict:
+    """Targets of member ``i`` snapped to the grouping grid"""
+    targets = {"goal": batch["goal"][i]}
+    for key, step in TARGET_STEPS.items():
+        targets[key] = round(float(batch[key][i]) / step) * step
+    return targets
+
+
+def group_key(params: dict, targets: dict) -> str:
+    """Members with equal keys share one generated plan"""
+    return json.dumps(
+        {
+            "food_preferences": plan_cache.canonicalize(
+                {"food_preferences": params.get("food_preferences") or {}}
+            ),
+            "targets": targets,
+        },
+        sort_keys=True, separators=(",", ":"),
+    )
+
+
+def create_batch(conn, batch_id: str, user_id: int, requests: list) -> dict:
+    """Queue one task per request, generating once per equivalence group"""
+    batch = nutrition.compute_targets_batch(
+        [r["age"] for r in requests],
+        [r["weight"] for r in requests],
+        [r["height"] for r in requests],
+        [r.get("goal", "") for r in requests],
+        [r.get("sex") for r in requests],
+        [r.get("activity_level") for r in requests],
+    )
+    groups = {}
+    for i, params in enumerate(requests):
+        targets = _rounded_targets(batch, i)
+        groups.setdefault(group_key(params, targets), (targets, []))[1].append(i)
+
+    planned = []
+    for targets, members in groups.values():
+        leader_params = {**requests[members[0]], "precomputed_targets": targets}
+        file_path = plan_cache.lookup(conn, plan_cache.request_key(leader_params))
+        planned.append((members, leader_params, file_path))
+    # One task per uncached group joins the queue; the per-user limit does
+    # not apply to cohorts, fair scheduling keeps them from starving others
+    task_queue.admit(conn, user_id, sum(1 for p in planned if not p[2]), per_user=False)
+
+    conn.execute(
+        "INSERT INTO batches (id, user_id, size, groups) VALUES (?, ?, ?, ?)",
+        (batch_id, user_id, len(requests), len(groups)),
+    )
+    task_ids = [str(uuid.uuid4()) for _ in requests]
+    cached = 0
+    for members, leader_params, file_path in planned:
+        leader = members[0]
+        for i in members:
+            if file_path:
+                plan_id = db.record_meal_plan(conn, user_id, file_path)
+                task_queue.enqueue_completed(
+                    conn, task_ids[i], user_id, requests[i],
+                    {"plan_id": plan_id, "file_path": file_path}, batch_id, i,
+                )
+            elif i == leader:
+                task_queue.enqueue(conn, task_ids[i], user_id, leader_params,
+                                   batch_id=batch_id, batch_index=i)
+            else:
+                task_queue.enqueue_follower(conn, task_ids[i], user_id, requests[i],
+                                            task_ids[leader], batch_id, i)
+        if file_path:
+            cached += 1
+    return {
+        "batch_id": batch_id,
+        "size": len(requests),
+        "groups": len(groups),
+        "cached_groups": cached,
+        "task_ids": task_ids,
+    }
+
+
+def complete_followers(conn, leader_id: str, file_path: str):
+    """Give the members waiting on ``leader_id`` its plan, each as their own meal plan"""
+    for follower_id, follower_user_id in task_queue.followers(conn, leader_id):
+        plan_id = db.record_meal_plan(conn, follower_user_id, file_path)
+        task_queue.complete_follower(
+            conn, follower_id, {"plan_id": plan_id, "file_path": file_path}
+        )
+
+
+def get_batch(conn, batch_id: str, user_id: int):
+    """Per-item statuses and status counts, or None if not the user's batch"""
+    row = conn.execute(
+        "SELECT size, groups, created_at FROM batches WHERE id = ? AND user_id = ?",
+        (batch_id, user_id),
+    ).fetchone()
+    if not row:
+        return None
+    items = []
+    counts = {}
+    for task_id, status, stage, result, error, index, leader_id in conn.execute("""
+        SELECT id, status, stage, result, error, batch_index, leader_id
+        FROM tasks WHERE batch_id = ? ORDER BY batch_index
+    """, (batch_id,)):
+        counts[status] = counts.get(status, 0) + 1
+        items.append({
+            "index": index,
+            "task_id": task_id,
+            "status": status,
+            "stage": stage,
+            "leader_id": leader_id,
+            "result": json.loads(result) if result else None,
+            "error": error,
+        })
+    return {
+        "batch_id": batch_id,
+        "size": row[0],
+        "groups": row[1],
+        "created_at": row[2],
+        "counts": counts,
+        "done": counts.get("completed", 0) + counts.get("failed", 0) == row[0],
+        "items": items,
+    }
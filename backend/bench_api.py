@@ -0,0 +1,274 @@
+"""Load test of the HTTP API with a deterministic stand-in for the LLM.
+
+Boots app.py under uvicorn on a local port with its embedded workers, and
+replaces the crew with a fake that computes real targets and ingredients
+but sleeps ``--llm-latency`` seconds per LLM stage instead of calling a
+model. Virtual users register and log in, then loop over generate -> poll
+-> fetch plan, with food-db reads in between. Latency percentiles and
+throughput are reported per endpoint.
+
+    python bench_api.py --users 20 --rounds 5 --llm-latency 0.2
+    python bench_api.py --save baseline.json
+    python bench_api.py --compare baseline.json --tolerance 0.25
+
+``--compare`` exits non-zero when an endpoint's p95 latency regressed by
+more than ``--tolerance`` against a saved run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FOOD_DATABASE = os.path.join(BACKEND_DIR, "..", "food_database.json")
+BENCH_DIR = tempfile.mkdtemp(prefix="dietai-bench-api-")
+os.environ["DIET_PLANNER_DB"] = os.path.join(BENCH_DIR, "bench.db")
+os.environ["GENERATION_EXECUTOR"] = "thread"  # the fake crew is patched in-process
+os.environ.setdefault("WORKER_POLL_INTERVAL", "0.05")
+
+BENCH_CONFIG = """\
+ai_model: {provider: openai, model_name: bench-fake, temperature: 0}
+storage: {meal_plans_dir: data/meal_plans}
+llm_cache: {enabled: false}
+"""
+
+GOALS = ("lose weight", "maintain", "build muscle")
+PREFERENCES = (
+    {"proteins": ["Pollo (Chicken Breast)", "Uova (Eggs)"], "carbs": ["Riso Integrale (Brown Rice)"]},
+    {},
+)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    """Latency samples per endpoint label"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def request(self, client, label: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples.setdefault(label, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        result = {}
+        for label, values in sorted(self.samples.items()):
+            values = sorted(values)
+            result[label] = {
+                "count": len(values),
+                "errors": self.errors.get(label, 0),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+        return result
+
+
+def install_fake_crew(latency: float):
+    """Swap agents.run_crew for a deterministic, model-free pipeline"""
+    import agents
+    import meal_solver
+    import nutrition
+
+    def fake_run_crew(user_inputs, on_stage=None, on_delta=None):
+        report = on_stage or (lambda stage: None)
+        report("nutrition")
+        targets = user_inputs.get("precomputed_targets") or nutrition.compute_targets(user_inputs)
+        solution = agents.solve_ingredients(user_inputs, targets)
+        days = (
+            [meal_solver.format_day(day) for day in solution["days"]] if solution
+            else [agents.NO_INGREDIENT_PLAN] * meal_solver.DAYS
+        )
+        # Days run concurrently, so each LLM stage costs about one call
+        for stage in ("analysis", "meal_plan", "validation"):
+            report(stage)
+            time.sleep(latency)
+            if stage == "meal_plan" and on_delta:
+                for day, text in enumerate(days, 1):
+                    on_delta(day, text)
+                    on_delta(day, None)
+        return agents.merge_plan(nutrition.format_targets(targets), days, ["PASS"] * len(days),
+                                 solution)
+
+    agents.run_crew = fake_run_crew
+
+
+def seed_foods():
+    import db
+
+    db.init_db()
+    db.populate_db([FOOD_DATABASE])
+
+
+def start_server(port: int):
+    import uvicorn
+    import app
+
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def profile(rng: random.Random, profiles: int) -> dict:
+    """One of ``profiles`` distinct request payloads (repeats hit the plan cache)"""
+    n = rng.randrange(profiles)
+    return {
+        "age": 20 + n % 45,
+        "weight": 55.0 + (n * 7) % 50,
+        "height": 155 + (n * 3) % 40,
+        "goal": GOALS[n % len(GOALS)],
+        "food_preferences": PREFERENCES[n % len(PREFERENCES)],
+    }
+
+
+async def virtual_user(base_url: str, user: int, args, recorder: Recorder):
+    import httpx
+
+    rng = random.Random(args.seed * 100003 + user)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        credentials = {"username": f"bench{user}", "password": "bench-password"}
+        await recorder.request(client, "POST /api/register", "POST", "/api/register", json=credentials)
+        await recorder.request(client, "POST /api/login", "POST", "/api/login", json=credentials)
+
+        for _ in range(args.rounds):
+            for _ in range(args.reads):
+                await recorder.request(client, "GET /api/food-db", "GET", "/api/food-db")
+                await recorder.request(client, "GET /api/food-db?q", "GET", "/api/food-db",
+                                       params={"q": "pol", "limit": 20})
+
+            response = await recorder.request(
+                client, "POST /api/generate-meal-plan", "POST", "/api/generate-meal-plan",
+                json=profile(rng, args.profiles),
+            )
+            if response.status_code != 200:
+                continue
+            task_id = response.json()["task_id"]
+            started = time.perf_counter()
+            while True:
+                response = await recorder.request(
+                    client, "GET /api/tasks/{id}", "GET", f"/api/tasks/{task_id}"
+                )
+                task = response.json() if response.status_code == 200 else {}
+                if response.status_code != 200 or task["status"] in ("completed", "failed"):
+                    break
+                await asyncio.sleep(args.poll_interval)
+            recorder.samples.setdefault("generation (end to end)", []).append(
+                time.perf_counter() - started
+            )
+            if task.get("status") == "completed":
+                plan_id = task["result"]["plan_id"]
+                await recorder.request(client, "GET /api/meal-plans/{id}", "GET",
+                                       f"/api/meal-plans/{plan_id}")
+
+
+async def run_load(base_url: str, args) -> dict:
+    recorder = Recorder()
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(user):
+        async with sem:
+            await virtual_user(base_url, user, args, recorder)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(u) for u in range(args.users)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "endpoints": recorder.report(elapsed)}
+
+
+def print_report(result: dict, args):
+    print(f"users={args.users} concurrency={args.concurrency} rounds={args.rounds} "
+          f"llm_latency={args.llm_latency}s workers={os.environ['EMBEDDED_WORKERS']} "
+          f"elapsed={result['elapsed']:.1f}s")
+    print(f"{'endpoint':32} {'count':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, s in result["endpoints"].items():
+        print(f"{label:32} {s['count']:6d} {s['errors']:4d} {s['rps']:8.1f} "
+              f"{s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f}")
+
+
+def regressions(result: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for label, stats in result["endpoints"].items():
+        before = baseline["endpoints"].get(label)
+        if before and stats["p95_ms"] > before["p95_ms"] * (1.0 + tolerance):
+            found.append(f"{label}: p95 {before['p95_ms']:.1f}ms -> {stats['p95_ms']:.1f}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users active at once")
+    parser.add_argument("--rounds", type=int, default=3, help="generations per user")
+    parser.add_argument("--reads", type=int, default=5, help="food-db reads per round")
+    parser.add_argument("--profiles", type=int, default=10, help="distinct request payloads")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per LLM stage")
+    parser.add_argument("--workers", type=int, default=4, help="embedded worker loops")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--compare", help="fail on p95 regressions against a saved JSON run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    save = os.path.abspath(args.save) if args.save else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    os.environ["EMBEDDED_WORKERS"] = str(args.workers)
+    os.environ.setdefault("GENERATION_MAX_WORKERS", str(args.workers))
+    os.chdir(BENCH_DIR)
+    with open("config.yaml", "w") as f:
+        f.write(BENCH_CONFIG)
+
+    seed_foods()
+    install_fake_crew(args.llm_latency)
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    print_report(result, args)
+    if save:
+        with open(save, "w") as f:
+            json.dump(result, f, indent=2)
+    if compare:
+        with open(compare, "r") as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
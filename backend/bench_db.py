@@ -0,0 +1,100 @@
+"""Compare request throughput of the old per-request sqlite3.connect pattern
+against the pooled, thread-offloaded access layer in db.py.
+
+Each simulated request mirrors a route handler: a session user lookup
+followed by either a task status read or a task write.
+
+    python bench_db.py --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+BENCH_DIR = tempfile.mkdtemp(prefix="dietai-bench-")
+os.environ["DIET_PLANNER_DB"] = os.path.join(BENCH_DIR, "bench.db")
+
+import db  # noqa: E402  (DB path must be set before import)
+
+WRITE_EVERY = 5  # one in five requests writes, like create/process task
+
+
+def seed(users: int):
+    db.init_db()
+    with db.get_pool().connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+            [(f"user{i}", "x") for i in range(users)],
+        )
+
+
+# Baseline: what every handler in app.py did before the shared layer
+async def legacy_request(i: int, users: int):
+    user_id = i % users + 1
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute("SELECT id, username FROM users WHERE id = ?", (user_id,))
+        c.fetchone()
+    finally:
+        conn.close()
+
+    conn = sqlite3.connect(db.DB_PATH)
+    try:
+        c = conn.cursor()
+        if i % WRITE_EVERY == 0:
+            c.execute("INSERT INTO tasks (id, user_id, status) VALUES (?, ?, 'pending')",
+                      (str(uuid.uuid4()), user_id))
+            conn.commit()
+        else:
+            c.execute("SELECT status, result, error FROM tasks WHERE id = ? AND user_id = ?",
+                      (str(i), user_id))
+            c.fetchone()
+    finally:
+        conn.close()
+
+
+async def pooled_request(i: int, users: int):
+    user_id = i % users + 1
+    await db.fetch_one("SELECT id, username FROM users WHERE id = ?", (user_id,))
+    if i % WRITE_EVERY == 0:
+        await db.execute("INSERT INTO tasks (id, user_id, status) VALUES (?, ?, 'pending')",
+                         (str(uuid.uuid4()), user_id))
+    else:
+        await db.fetch_one("SELECT status, result, error FROM tasks WHERE id = ? AND user_id = ?",
+                           (str(i), user_id))
+
+
+async def drive(handler, requests: int, concurrency: int, users: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await handler(i, users)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    seed(args.users)
+    before = asyncio.run(drive(legacy_request, args.requests, args.concurrency, args.users))
+    after = asyncio.run(drive(pooled_request, args.requests, args.concurrency, args.users))
+
+    print(f"requests={args.requests} concurrency={args.concurrency} pool={db.DB_POOL_SIZE}")
+    print(f"before (connect per request): {before:10.1f} req/s")
+    print(f"after  (pooled, WAL, offload): {after:10.1f} req/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
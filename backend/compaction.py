@@ -0,0 +1,158 @@
+"""Retention compaction for task history and stored plans.
+
+* Completed and failed tasks older than ``TASK_RETENTION_DAYS`` are deleted,
+  ``COMPACTION_BATCH_SIZE`` rows per transaction so the write lock is held
+  briefly. With ``TASK_ARCHIVE=1`` a slim copy (no params or result) is kept
+  in ``tasks_archive`` first. Their streamed drafts (``task_output``) are
+  deleted with them.
+* Batches whose tasks are all gone are deleted.
+* Structured plan indexes (``plan_days``) of plans no meal plan or cache
+  entry references any more are deleted.
+* Expired server-side sessions are deleted.
+* Plan blobs and loose plan files referenced by no meal plan or cache entry
+  are deleted once older than ``ORPHAN_GRACE_SECONDS``, which leaves time
+  for a plan being saved to get its meal_plans row.
+
+The API runs ``compact`` every ``COMPACTION_INTERVAL`` seconds (0 disables);
+it can also be run by hand:
+
+    python compaction.py [--dry-run]
+"""
+import argparse
+import json
+import os
+import time
+
+import plan_store
+import sessions
+
+TASK_RETENTION_DAYS = float(os.getenv("TASK_RETENTION_DAYS", "30"))
+TASK_ARCHIVE = os.getenv("TASK_ARCHIVE", "0") == "1"
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "1000"))
+COMPACTION_INTERVAL = float(os.getenv("COMPACTION_INTERVAL", "3600"))
+ORPHAN_GRACE_SECONDS = 3600
+
+_EXPIRED_TASKS = """
+    SELECT id FROM tasks
+    WHERE status IN ('completed', 'failed')
+      AND (updated_at < ? OR (updated_at IS NULL AND created_at < datetime(?, 'unixepoch')))
+    LIMIT ?
+"""
+
+
+def _purge_tasks(conn, cutoff: float, dry_run: bool) -> int:
+    purged = 0
+    while True:
+        ids = [row[0] for row in conn.execute(
+            _EXPIRED_TASKS, (cutoff, cutoff, COMPACTION_BATCH_SIZE)
+        )]
+        if not ids or dry_run:
+            return purged + len(ids)
+        marks = ",".join("?" * len(ids))
+        if TASK_ARCHIVE:
+            conn.execute(f"""
+                INSERT OR IGNORE INTO tasks_archive
+                    (id, user_id, status, error, attempts, batch_id, timings, created_at, updated_at)
+                SELECT id, user_id, status, error, attempts, batch_id, timings, created_at, updated_at
+                FROM tasks WHERE id IN ({marks})
+            """, ids)
+        conn.execute(f"DELETE FROM task_output WHERE task_id IN ({marks})", ids)
+        conn.execute(f"DELETE FROM tasks WHERE id IN ({marks})", ids)
+        conn.commit()
+        purged += len(ids)
+
+
+def _purge_batches(conn, dry_run: bool) -> int:
+    sql = "FROM batches WHERE NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.batch_id = batches.id)"
+    if dry_run:
+        return conn.execute(f"SELECT COUNT(*) {sql}").fetchone()[0]
+    count = conn.execute(f"DELETE {sql}").rowcount
+    conn.commit()
+    return count
+
+
+def _purge_sessions(conn, dry_run: bool) -> int:
+    if dry_run:
+        return conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at <= ?", (time.time(),)
+        ).fetchone()[0]
+    count = sessions.purge_expired(conn)
+    conn.commit()
+    return count
+
+
+def _referenced(conn, ref: str) -> bool:
+    return conn.execute("""
+        SELECT EXISTS (SELECT 1 FROM meal_plans WHERE file_path = ?)
+            OR EXISTS (SELECT 1 FROM plan_cache WHERE file_path = ?)
+    """, (ref, ref)).fetchone()[0] == 1
+
+
+def _purge_blobs(conn, dry_run: bool) -> int:
+    sql = """
+        FROM plan_blobs
+        WHERE created_at < ?
+          AND NOT EXISTS (SELECT 1 FROM meal_plans WHERE file_path = ? || plan_blobs.digest)
+          AND NOT EXISTS (SELECT 1 FROM plan_cache WHERE file_path = ? || plan_blobs.digest)
+    """
+    params = (time.time() - ORPHAN_GRACE_SECONDS, plan_store.BLOB_PREFIX, plan_store.BLOB_PREFIX)
+    if dry_run:
+        return conn.execute(f"SELECT COUNT(*) {sql}", params).fetchone()[0]
+    count = conn.execute(f"DELETE {sql}", params).rowcount
+    conn.commit()
+    return count
+
+
+def _purge_plan_structures(conn, dry_run: bool) -> int:
+    sql = """
+        FROM plan_summaries
+        WHERE NOT EXISTS (SELECT 1 FROM meal_plans WHERE file_path = plan_summaries.ref)
+          AND NOT EXISTS (SELECT 1 FROM plan_cache WHERE file_path = plan_summaries.ref)
+    """
+    if dry_run:
+        return conn.execute(f"SELECT COUNT(*) {sql}").fetchone()[0]
+    conn.execute(f"DELETE FROM plan_days WHERE ref IN (SELECT ref {sql})")
+    count = conn.execute(f"DELETE {sql}").rowcount
+    conn.commit()
+    return count
+
+
+def _purge_files(conn, dry_run: bool) -> int:
+    if not os.path.isdir(plan_store.MEAL_PLANS_DIR):
+        return 0
+    purged = 0
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    for entry in os.scandir(plan_store.MEAL_PLANS_DIR):
+        if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+            continue
+        if _referenced(conn, entry.path):
+            continue
+        if not dry_run:
+            os.remove(entry.path)
+        purged += 1
+    return purged
+
+
+def compact(conn, dry_run: bool = False) -> dict:
+    """Run every retention step; returns what was (or would be) removed"""
+    cutoff = time.time() - TASK_RETENTION_DAYS * 86400
+    return {
+        "tasks": _purge_tasks(conn, cutoff, dry_run),
+        "batches": _purge_batches(conn, dry_run),
+        "sessions": _purge_sessions(conn, dry_run),
+        "plan_blobs": _purge_blobs(conn, dry_run),
+        "plan_files": _purge_files(conn, dry_run),
+        "plan_structures": _purge_plan_structures(conn, dry_run),
+    }
+
+
+if __name__ == "__main__":
+    import db
+
+    parser = argparse.ArgumentParser(description="Task and plan retention compaction")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be removed")
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_pool().connection() as conn:
+        print(json.dumps(compact(conn, dry_run=args.dry_run), indent=2))
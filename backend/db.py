@@ -1,9 +1,185 @@
 import sqlite3
-import json
+import os
+import queue
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-def init_db():
-    conn = sqlite3.connect("diet_planner.db")
+import metrics
+
+# Configuration
+DB_PATH = os.getenv("DIET_PLANNER_DB", "diet_planner.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = 30  # seconds a writer waits on a locked database
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections opened in WAL mode.
+
+    At most ``size`` connections exist at once; callers block until one is
+    released. Each connection keeps its own prepared-statement cache, so
+    handlers should use constant SQL strings with ``?`` parameters.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT * 1000}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error."""
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# One thread per pooled connection: queries never wait on the event loop
+# and the executor can never oversubscribe the pool.
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+    return _pool
+
+
+def _call_with_connection(fn, args, submitted):
+    acquired = None
+    outcome = "error"
     try:
+        with get_pool().connection() as conn:
+            acquired = time.perf_counter()
+            result = fn(conn, *args)
+        outcome = "ok"
+        return result
+    finally:
+        if acquired is not None:
+            metrics.observe("db_pool_wait_seconds", acquired - submitted)
+            metrics.observe("db_query_duration_seconds", time.perf_counter() - acquired,
+                            operation=fn.__name__.lstrip("_"), outcome=outcome)
+
+
+async def run(fn, *args):
+    """Run ``fn(conn, *args)`` on the DB executor with a pooled connection."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, _call_with_connection, fn, args, time.perf_counter())
+
+
+def _fetch_one(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetch_all(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).lastrowid
+
+
+async def fetch_one(sql: str, params: tuple = ()):
+    return await run(_fetch_one, sql, params)
+
+
+async def fetch_all(sql: str, params: tuple = ()):
+    return await run(_fetch_all, sql, params)
+
+
+async def execute(sql: str, params: tuple = ()) -> int:
+    """Execute a write statement in its own transaction and return lastrowid"""
+    return await run(_execute, sql, params)
+
+
+# Queue columns on tasks, added in place so existing databases upgrade on startup
+TASK_QUEUE_COLUMNS = {
+    "params": "TEXT",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "max_attempts": "INTEGER NOT NULL DEFAULT 3",
+    "available_at": "REAL",
+    "lease_owner": "TEXT",
+    "lease_expires_at": "REAL",
+    "heartbeat_at": "REAL",
+    "updated_at": "REAL",
+    "stage": "TEXT",
+    "stage_started_at": "REAL",
+    "timings": "TEXT",
+    "batch_id": "TEXT",
+    "batch_index": "INTEGER",
+    "leader_id": "TEXT",
+}
+
+
+FOOD_COLUMNS = {
+    "category": "TEXT",
+}
+
+# Food ids are referenced from prompts, paging cursors and the search index,
+# so they are an explicit key rather than the implicit rowid (which VACUUM
+# may renumber) and are never reused
+FOODS_SCHEMA = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    portion TEXT NOT NULL,
+    carbs REAL NOT NULL,
+    protein REAL NOT NULL,
+    fat REAL NOT NULL,
+    category TEXT
+"""
+
+
+def _ensure_columns(conn, table: str, columns: dict):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def init_db():
+    with get_pool().connection() as conn:
         c = conn.cursor()
         c.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -21,44 +197,240 @@ def init_db():
                 FOREIGN KEY(user_id) REFERENCES users(id)
             )
         """)
+        c.execute(f"CREATE TABLE IF NOT EXISTS foods ({FOODS_SCHEMA})")
         c.execute("""
-            CREATE TABLE IF NOT EXISTS foods (
-                name TEXT NOT NULL,
-                portion TEXT NOT NULL,
-                carbs REAL NOT NULL,
-                protein REAL NOT NULL,
-                fat REAL NOT NULL
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY(user_id) REFERENCES users(id)
             )
         """)
+        _ensure_columns(conn, "tasks", TASK_QUEUE_COLUMNS)
+        # History listings and retention compaction
+        c.execute("CREATE INDEX IF NOT EXISTS idx_meal_plans_user_date ON meal_plans (user_id, date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_meal_plans_file ON meal_plans (file_path)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_retention ON tasks (status, updated_at)")
         c.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
+            CREATE TABLE IF NOT EXISTS tasks_archive (
                 id TEXT PRIMARY KEY,
                 user_id INTEGER NOT NULL,
                 status TEXT NOT NULL,
-                result TEXT,
                 error TEXT,
+                attempts INTEGER,
+                batch_id TEXT,
+                timings TEXT,
+                created_at TEXT,
+                updated_at REAL
+            )
+        """)
+        # Streamed plan text of tasks still generating (see plan_drafts.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS task_output (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL,
+                attempt INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_task_output_task ON task_output (task_id, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_batch ON tasks (batch_id, batch_index)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_leader ON tasks (leader_id)")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                groups INTEGER NOT NULL,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY(user_id) REFERENCES users(id)
             )
         """)
-        conn.commit()
-    finally:
-        conn.close()
-
-
-def populate_db():
-    conn = sqlite3.connect("diet_planner.db")
-    c = conn.cursor()
-    # Insert data from food_database.json
-    with open("../food_database.json", "r") as f:
-        foods = json.load(f)
-        #print(foods)
-        for macro_food, data in foods.items():
-            for food in data:
-                print(food)
-                c.execute("INSERT INTO foods (name, portion, carbs, protein, fat) VALUES (?, ?, ?, ?, ?)", (food["name"], food["portion"], food["carbs"], food["protein"], food["fat"]))
-    conn.commit()
-    conn.close()
+        # Tasks queued by the old in-process BackgroundTasks have no params to
+        # retry with and would otherwise stay pending forever
+        c.execute("""
+            UPDATE tasks
+            SET status = 'failed', error = 'Interrupted by server restart'
+            WHERE status = 'pending' AND params IS NULL
+        """)
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_queue
+            ON tasks (status, available_at)
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS plan_cache (
+                key TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS plan_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_plan_cache_file ON plan_cache (file_path)")
+        c.execute("INSERT OR IGNORE INTO plan_cache_stats (name) VALUES ('hits'), ('misses')")
+        # Compressed, content-addressed plan bodies (see plan_store.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS plan_blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        _ensure_columns(conn, "foods", FOOD_COLUMNS)
+        # Version counter bumped on every change to foods, used to invalidate
+        # in-process caches of the table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute("INSERT OR IGNORE INTO table_versions (name) VALUES ('foods')")
+        _ensure_food_ids(c)
+        # (name, portion) identifies a food so repeated loads upsert instead of
+        # duplicating; earlier loads may have left copies that must go first
+        has_key = c.execute("""
+            SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_foods_name_portion'
+        """).fetchone()
+        if not has_key:
+            c.execute("""
+                DELETE FROM foods WHERE id NOT IN (
+                    SELECT MAX(id) FROM foods GROUP BY name, portion
+                )
+            """)
+            c.execute("CREATE UNIQUE INDEX idx_foods_name_portion ON foods (name, portion)")
+        # Prefix lookups for autocomplete (LIKE 'abc%' uses a NOCASE index)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_foods_name_nocase ON foods (name COLLATE NOCASE)")
+        # Structured plans: per-day meals and totals by plan reference (plan_model.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS plan_summaries (
+                ref TEXT PRIMARY KEY,
+                days INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS plan_days (
+                ref TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                carbs REAL,
+                protein REAL,
+                fat REAL,
+                energy REAL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (ref, day)
+            )
+        """)
+        # Server-side sessions (SESSION_STORE=sqlite, see sessions.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+        # Checksums of bulk-loaded datasets (see food_loader.py)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS data_sources (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                loaded_at REAL NOT NULL
+            )
+        """)
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS foods_version_{event.lower()}
+                AFTER {event} ON foods
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = 'foods';
+                END
+            """)
+        _ensure_food_search_index(c)
+
+
+def _ensure_food_ids(c):
+    """Rebuild a foods table created without an id column; rows keep their rowid as id"""
+    if "id" in {row[1] for row in c.execute("PRAGMA table_info(foods)")}:
+        return
+    # The search index, indexes and triggers of the old table are recreated by init_db
+    c.execute("DROP TABLE IF EXISTS foods_fts")
+    c.execute(f"CREATE TABLE foods_migrated ({FOODS_SCHEMA})")
+    c.execute("""
+        INSERT INTO foods_migrated (id, name, portion, carbs, protein, fat, category)
+        SELECT rowid, name, portion, carbs, protein, fat, category FROM foods
+    """)
+    c.execute("DROP TABLE foods")
+    c.execute("ALTER TABLE foods_migrated RENAME TO foods")
+    c.execute("UPDATE table_versions SET version = version + 1 WHERE name = 'foods'")
+
+
+def _ensure_food_search_index(c):
+    """Trigram FTS5 index over food names and categories (see food_search.py)"""
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'foods_fts'").fetchone():
+        return
+    try:
+        c.execute("""
+            CREATE VIRTUAL TABLE foods_fts USING fts5(
+                name, category, content='foods', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite without FTS5 or older than 3.34; search falls back to LIKE
+        return
+    c.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+    c.execute("""
+        CREATE TRIGGER foods_fts_insert AFTER INSERT ON foods BEGIN
+            INSERT INTO foods_fts (rowid, name, category)
+            VALUES (new.id, new.name, new.category);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER foods_fts_delete AFTER DELETE ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, name, category)
+            VALUES ('delete', old.id, old.name, old.category);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER foods_fts_update AFTER UPDATE OF name, category ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, name, category)
+            VALUES ('delete', old.id, old.name, old.category);
+            INSERT INTO foods_fts (rowid, name, category)
+            VALUES (new.id, new.name, new.category);
+        END
+    """)
+
+
+def record_meal_plan(conn, user_id: int, file_path: str) -> int:
+    """Insert a meal_plans row for a stored plan reference and return its id"""
+    c = conn.execute("""
+        INSERT INTO meal_plans (user_id, date, file_path)
+        VALUES (?, datetime('now'), ?)
+    """, (user_id, file_path))
+    return c.lastrowid
+
+
+def populate_db(paths=None, force: bool = False) -> list:
+    """Load the food datasets into foods (see food_loader.py)"""
+    import food_loader
+
+    with get_pool().connection() as conn:
+        return food_loader.load_all(conn, paths, force)
 
 if __name__ == "__main__":
     init_db()
@@ -67,4 +439,4 @@ if __name__ == "__main__":
 #     conn.commit()
 #     plan_id = c.lastrowid
 #     conn.close()
-#     return jsonify({"id": plan_id, "plan": meal_plan}), 201
\ No newline at end of file
+#     return jsonify({"id": plan_id, "plan": meal_plan}), 201
@@ -0,0 +1,98 @@
+"""In-process cache of the ``foods`` table for /api/food-db.
+
+Triggers on ``foods`` bump a version counter in ``table_versions``; each
+request reads that single integer and the catalog is only reloaded when it
+changed. The full listing is serialized and gzip-compressed once per
+version, and filtered or paginated requests are answered from in-memory
+indexes instead of re-querying SQLite.
+"""
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+
+import db
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def food_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "name": row[1],
+        "category": row[2],
+        "portion": row[3],
+        "carbs": row[4],
+        "protein": row[5],
+        "fat": row[6],
+    }
+
+
+class FoodCatalog:
+    def __init__(self, version: int, rows: list):
+        self.version = version
+        self.rows = rows  # ordered by id, the keyset pagination cursor
+        self.ids = [r[0] for r in rows]
+        self.folded_names = [r[1].casefold() for r in rows]
+        self.by_category = {}
+        for pos, row in enumerate(rows):
+            self.by_category.setdefault((row[2] or "").casefold(), []).append(pos)
+        self.body = json.dumps([food_dict(r) for r in rows]).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        self.etag = f'"foods-{version}"'
+
+    def etag_for(self, query: str) -> str:
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        return f'"foods-{self.version}-{digest}"'
+
+    def page(self, category=None, name=None, after=None, limit=None):
+        """Return (items, next_cursor) matching the filters, keyset-paginated by id"""
+        if category is not None:
+            positions = self.by_category.get(category.casefold(), [])
+            ids = [self.ids[p] for p in positions]
+        else:
+            positions = range(len(self.rows))
+            ids = self.ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        needle = name.casefold() if name else None
+
+        items = []
+        for pos in positions[start:]:
+            if needle and needle not in self.folded_names[pos]:
+                continue
+            if limit is not None and len(items) == limit:
+                return items, items[-1]["id"]
+            items.append(food_dict(self.rows[pos]))
+        return items, None
+
+
+def _load_catalog(conn) -> FoodCatalog:
+    # Read the version and the rows from one snapshot
+    conn.execute("BEGIN")
+    version = _current_version(conn)
+    rows = conn.execute("""
+        SELECT id, name, category, portion, carbs, protein, fat
+        FROM foods ORDER BY id
+    """).fetchall()
+    return FoodCatalog(version, rows)
+
+
+def _current_version(conn) -> int:
+    row = conn.execute("SELECT version FROM table_versions WHERE name = 'foods'").fetchone()
+    return row[0] if row else 0
+
+
+_catalog = None
+_reload_lock = asyncio.Lock()
+
+
+async def get_catalog() -> FoodCatalog:
+    global _catalog
+    version = await db.run(_current_version)
+    if _catalog is None or _catalog.version != version:
+        async with _reload_lock:
+            if _catalog is None or _catalog.version != version:
+                _catalog = await db.run(_load_catalog)
+    return _catalog
@@ -0,0 +1,223 @@
+"""Streaming, idempotent bulk loader for the ``foods`` table.
+
+Accepted sources, read incrementally so memory stays flat for large files:
+
+* ``.json`` - ``{"category": [food, ...], ...}`` (food_database.json) or a
+  top-level array of foods with a ``category`` field
+* ``.jsonl`` / ``.ndjson`` - one food object per line
+* ``.csv`` - header with name, portion, carbs, protein, fat[, category]
+
+Rows are upserted on the unique (name, portion) key in transactions of
+``FOOD_LOAD_BATCH_SIZE`` rows; rows whose values did not change are not
+rewritten. Each source's SHA-256 is recorded in ``data_sources`` and an
+unchanged file is skipped. ``FOOD_DATA_PATHS`` (comma-separated) is loaded
+at API startup; by hand:
+
+    python food_loader.py [paths ...] [--force]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+
+FOOD_DATA_PATHS = [
+    p for p in os.getenv("FOOD_DATA_PATHS", "../food_database.json").split(",") if p
+]
+FOOD_LOAD_ON_STARTUP = os.getenv("FOOD_LOAD_ON_STARTUP", "1") == "1"
+FOOD_LOAD_BATCH_SIZE = int(os.getenv("FOOD_LOAD_BATCH_SIZE", "5000"))
+READ_CHUNK_SIZE = 1024 * 1024
+
+_UPSERT = """
+    INSERT INTO foods (name, portion, category, carbs, protein, fat)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name, portion) DO UPDATE SET
+        category = excluded.category,
+        carbs = excluded.carbs,
+        protein = excluded.protein,
+        fat = excluded.fat
+    WHERE foods.category IS NOT excluded.category
+       OR foods.carbs != excluded.carbs
+       OR foods.protein != excluded.protein
+       OR foods.fat != excluded.fat
+"""
+
+
+class _JsonStream:
+    """Pulls JSON values one at a time from a file read in chunks"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self):
+        """Yield the elements of the array starting at the cursor"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def _iter_json(f):
+    stream = _JsonStream(f)
+    if stream.peek() == "[":
+        for food in stream.array():
+            yield food.get("category"), food
+        return
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        category = stream.value()
+        stream.expect(":")
+        for food in stream.array():
+            yield category, food
+        if stream.expect(",}") == "}":
+            return
+
+
+def _iter_jsonl(f):
+    for line in f:
+        if line.strip():
+            food = json.loads(line)
+            yield food.get("category"), food
+
+
+def _iter_csv(f):
+    for food in csv.DictReader(f):
+        yield food.get("category") or None, food
+
+
+def iter_foods(path: str):
+    """Yield ``(name, portion, category, carbs, protein, fat)`` rows from a source"""
+    ext = os.path.splitext(path)[1].lower()
+    reader = {".csv": _iter_csv, ".jsonl": _iter_jsonl, ".ndjson": _iter_jsonl}.get(ext, _iter_json)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for category, food in reader(f):
+            yield (
+                food["name"].strip(),
+                food["portion"].strip(),
+                category,
+                float(food["carbs"]),
+                float(food["protein"]),
+                float(food["fat"]),
+            )
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load(conn, path: str, force: bool = False) -> dict:
+    """Upsert one source into foods unless its checksum is already recorded"""
+    start = time.perf_counter()
+    source = os.path.abspath(path)
+    checksum = file_checksum(path)
+    row = conn.execute("SELECT sha256 FROM data_sources WHERE path = ?", (source,)).fetchone()
+    if row and row[0] == checksum and not force:
+        return {"path": path, "skipped": True}
+
+    rows = changed = 0
+    batch = []
+    for food in iter_foods(path):
+        batch.append(food)
+        if len(batch) == FOOD_LOAD_BATCH_SIZE:
+            changed += conn.executemany(_UPSERT, batch).rowcount
+            conn.commit()
+            rows += len(batch)
+            batch = []
+    if batch:
+        changed += conn.executemany(_UPSERT, batch).rowcount
+        rows += len(batch)
+    conn.execute("""
+        INSERT INTO data_sources (path, sha256, rows, loaded_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            sha256 = excluded.sha256, rows = excluded.rows, loaded_at = excluded.loaded_at
+    """, (source, checksum, rows, time.time()))
+    conn.commit()
+    return {
+        "path": path,
+        "skipped": False,
+        "rows": rows,
+        "upserted": changed,
+        "unchanged": rows - changed,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def load_all(conn, paths=None, force: bool = False) -> list:
+    """Load every configured source that exists"""
+    return [
+        load(conn, path, force)
+        for path in (paths or FOOD_DATA_PATHS)
+        if os.path.exists(path)
+    ]
+
+
+if __name__ == "__main__":
+    import db
+
+    parser = argparse.ArgumentParser(description="Bulk-load nutrition datasets into foods")
+    parser.add_argument("paths", nargs="*", help="JSON, JSON Lines or CSV files (default FOOD_DATA_PATHS)")
+    parser.add_argument("--force", action="store_true", help="reload even if the checksum is unchanged")
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_pool().connection() as conn:
+        for result in load_all(conn, args.paths or None, args.force):
+            print(json.dumps(result))
@@ -0,0 +1,65 @@
+"""In-memory array representation of the ``foods`` table.
+
+Macros per portion are held in one C-contiguous ``(n, 3)`` float array
+(carbs, protein, fat columns) alongside parallel name/portion lists, so
+solvers and validators can work on the whole food database with NumPy
+instead of row-by-row dicts.
+"""
+import numpy as np
+
+MACROS = ("carbs", "protein", "fat")
+KCAL_PER_G = np.array([4.0, 4.0, 9.0])
+
+
+class FoodMatrix:
+    def __init__(self, names, portions, macros):
+        self.names = list(names)
+        self.portions = list(portions)
+        self.macros = np.ascontiguousarray(macros, dtype=np.float64).reshape(-1, len(MACROS))
+        self._index = {name.casefold(): i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ``(name, portion, carbs, protein, fat)`` rows"""
+        rows = list(rows)
+        return cls(
+            [r[0] for r in rows],
+            [r[1] for r in rows],
+            np.array([r[2:5] for r in rows], dtype=np.float64).reshape(-1, len(MACROS)),
+        )
+
+    @property
+    def kcal(self) -> np.ndarray:
+        """Energy per portion, derived from the macros"""
+        return self.macros @ KCAL_PER_G
+
+    def index_of(self, name: str):
+        return self._index.get(name.strip().casefold())
+
+    def subset(self, names) -> "FoodMatrix":
+        """Matrix restricted to the given food names (unknown names are skipped)"""
+        idx = sorted({i for i in (self.index_of(n) for n in names) if i is not None})
+        return FoodMatrix(
+            [self.names[i] for i in idx],
+            [self.portions[i] for i in idx],
+            self.macros[idx],
+        )
+
+
+def load_food_matrix(conn) -> FoodMatrix:
+    rows = conn.execute("SELECT name, portion, carbs, protein, fat FROM foods").fetchall()
+    return FoodMatrix.from_rows(rows)
+
+
+def preference_names(food_preferences) -> list:
+    """Flatten a food_preferences payload ({category: [names]}) to names"""
+    if isinstance(food_preferences, str):
+        return [food_preferences]
+    if isinstance(food_preferences, dict):
+        return [n for v in food_preferences.values() for n in preference_names(v)]
+    if isinstance(food_preferences, (list, tuple, set)):
+        return [n for v in food_preferences for n in preference_names(v)]
+    return []
@@ -0,0 +1,136 @@
+"""Autocomplete search over food names and categories.
+
+Results come from up to three phases, each only filling what the previous
+left of ``limit``:
+
+1. names starting with the query, from the NOCASE index on ``foods.name``
+2. the query as a substring of a name or category, from ``foods_fts`` (an
+   FTS5 index with the trigram tokenizer, kept in sync by triggers; see
+   db.init_db); name hits rank before category hits, then word starts,
+   earlier matches and shorter names
+3. when nothing matched so far, foods whose words share enough trigrams
+   with the query's (``FUZZY_THRESHOLD``, as in pg_trgm), so typos such as
+   "zuchini" or "polo" still find zucchina and pollo
+
+Candidates are taken from the index in id order and ranked in Python:
+BM25 ordering has to score every match, which costs tens of milliseconds
+for common trigrams on large tables. Without FTS5 the substring phase is a
+LIKE scan and there is no typo tolerance.
+"""
+import re
+
+import food_cache
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+CANDIDATES = 200  # substring matches fetched before ranking
+FUZZY_CANDIDATES = 300
+FUZZY_THRESHOLD = 0.3
+
+_COLUMNS = "f.id, f.name, f.category, f.portion, f.carbs, f.protein, f.fat"
+_PREFIX = f"""
+    SELECT {_COLUMNS} FROM foods f
+    WHERE f.name LIKE ? ESCAPE '\\' AND (? IS NULL OR f.category = ?)
+    LIMIT ?
+"""
+_MATCH = f"""
+    SELECT {_COLUMNS}
+    FROM foods_fts JOIN foods f ON f.id = foods_fts.rowid
+    WHERE foods_fts MATCH ? AND (? IS NULL OR f.category = ?)
+    LIMIT ?
+"""
+_LIKE = f"""
+    SELECT {_COLUMNS} FROM foods f
+    WHERE (f.name LIKE ? ESCAPE '\\' OR f.category LIKE ? ESCAPE '\\')
+      AND (? IS NULL OR f.category = ?)
+    LIMIT ?
+"""
+
+_WORD = re.compile(r"[^\W_]+")
+
+_fts_available = False
+
+
+def _has_fts(conn) -> bool:
+    # Only a positive answer is kept: the index may be created after startup
+    global _fts_available
+    if not _fts_available:
+        _fts_available = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'foods_fts'"
+        ).fetchone() is not None
+    return _fts_available
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _word_trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, name: str) -> float:
+    """Mean over query words of the best trigram Jaccard with a word of name"""
+    name_grams = [_word_trigrams(w) for w in _WORD.findall(name.casefold())]
+    query_words = _WORD.findall(query.casefold())
+    if not name_grams or not query_words:
+        return 0.0
+    total = 0.0
+    for word in query_words:
+        grams = _word_trigrams(word)
+        total += max(len(grams & other) / len(grams | other) for other in name_grams)
+    return total / len(query_words)
+
+
+def _substring_rank(text: str):
+    def key(row):
+        name = row[1].casefold()
+        pos = name.find(text)
+        if pos < 0:  # category match
+            return (1, 1, 0, len(name))
+        return (0, pos > 0 and name[pos - 1].isalnum(), pos, len(name))
+    return key
+
+
+def _fuzzy(conn, text: str, limit: int, category) -> list:
+    grams = set()
+    for word in _WORD.findall(text):
+        grams |= {word[i:i + 3] for i in range(len(word) - 2)}
+    if not grams:
+        return []
+    expr = " OR ".join(_phrase(g) for g in sorted(grams))
+    scored = []
+    for row in conn.execute(_MATCH, (expr, category, category, FUZZY_CANDIDATES)):
+        score = similarity(text, row[1])
+        if score >= FUZZY_THRESHOLD:
+            scored.append((-score, len(row[1]), row))
+    scored.sort(key=lambda s: s[:2])
+    return [row for _, _, row in scored[:limit]]
+
+
+def search(conn, query: str, limit: int = DEFAULT_LIMIT, category=None) -> list:
+    """Best-matching foods for a partial or misspelled name, as food dicts"""
+    text = " ".join(query.casefold().split())
+    if not text:
+        return []
+    pattern = _escape_like(text)
+    rows = conn.execute(_PREFIX, (pattern + "%", category, category, limit)).fetchall()
+
+    if len(rows) < limit and len(text) >= 3:
+        if _has_fts(conn):
+            found = conn.execute(_MATCH, (_phrase(text), category, category, CANDIDATES))
+        else:
+            like = "%" + pattern + "%"
+            found = conn.execute(_LIKE, (like, like, category, category, CANDIDATES))
+        seen = {r[0] for r in rows}
+        rows += sorted((r for r in found if r[0] not in seen), key=_substring_rank(text))
+        rows = rows[:limit]
+
+    if not rows and len(text) >= 3 and _has_fts(conn):
+        rows = _fuzzy(conn, text, limit, category)
+    return [food_cache.food_dict(r) for r in rows]
@@ -0,0 +1,239 @@
+"""Disk-backed memoization of LLM completions for the crew agents.
+
+``CachedLLM`` wraps the LLM built in agents.py and answers repeated prompts
+(same model, temperature and full message list) from an SQLite file, so
+sub-steps that recur across users and retries return in milliseconds.
+Calls that use tools or function calling are never cached, and with
+``LLM_CACHE_SKIP_NONZERO_TEMPERATURE=1`` neither are sampled (temperature
+> 0) completions. Least recently used entries are evicted beyond
+``LLM_CACHE_MAX_ENTRIES`` / ``LLM_CACHE_MAX_BYTES``. The wrapper also
+times every call into the ``llm_call_duration_seconds`` metric, so it is
+applied with caching disabled too (``cache_enabled=False``).
+
+    python llm_cache.py stats|clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from crewai import BaseLLM
+
+import metrics
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_SKIP_NONZERO_TEMPERATURE = os.getenv("LLM_CACHE_SKIP_NONZERO_TEMPERATURE", "0") == "1"
+EVICT_EVERY = 100  # stores between eviction passes
+
+
+class ResponseStore:
+    """SQLite file of prompt-key -> completion, one connection per thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache (last_used_at)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._conn()
+        row = conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if row:
+            conn.execute(
+                "UPDATE llm_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            return row[0]
+        return None
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        self._conn().execute("""
+            INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (key, model, response, len(response.encode("utf-8")), now, now))
+        with self._lock:
+            self._stores += 1
+            due = self._stores % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        conn = self._conn()
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        if count <= LLM_CACHE_MAX_ENTRIES and total <= LLM_CACHE_MAX_BYTES:
+            return
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used_at"):
+            if count <= LLM_CACHE_MAX_ENTRIES and total <= LLM_CACHE_MAX_BYTES:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        conn.execute("BEGIN")
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        conn.execute("COMMIT")
+
+    def stats(self) -> dict:
+        """Persistent totals from the file plus this process's counters"""
+        entries, total, lifetime_hits = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM llm_cache"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "lifetime_hits": lifetime_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "max_entries": LLM_CACHE_MAX_ENTRIES,
+            "max_bytes": LLM_CACHE_MAX_BYTES,
+        }
+
+
+_store = None
+
+
+def get_store() -> ResponseStore:
+    global _store
+    if _store is None:
+        _store = ResponseStore(LLM_CACHE_PATH)
+    return _store
+
+
+def prompt_key(model: str, temperature, messages) -> str:
+    """Hash of everything that determines a completion"""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True, default=str, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedLLM(BaseLLM):
+    """LLM wrapper that memoizes plain-text completions on disk"""
+
+    inner: Any = None
+    cache_enabled: bool = True
+
+    @classmethod
+    def wrap(cls, llm, cache_enabled: bool = True) -> "CachedLLM":
+        return cls(model=llm.model, temperature=llm.temperature, inner=llm,
+                   cache_enabled=cache_enabled)
+
+    def _cache_key(self, messages, tools, available_functions, response_model):
+        # Agents set stop words on the LLM they were given; pass them through
+        self.inner.stop = self.stop
+        if tools or available_functions or response_model is not None:
+            return None
+        if LLM_CACHE_SKIP_NONZERO_TEMPERATURE and self.temperature:
+            return None
+        return prompt_key(self.model, self.temperature, [messages, self.stop])
+
+    def _lookup(self, messages, tools, available_functions, kwargs):
+        """Return (key, cached response, cache outcome label)"""
+        if not self.cache_enabled:
+            self.inner.stop = self.stop
+            return None, None, "disabled"
+        store = get_store()
+        key = self._cache_key(messages, tools, available_functions, kwargs.get("response_model"))
+        if key is None:
+            store.record_bypass()
+            return None, None, "bypass"
+        cached = store.get(key)
+        return key, cached, "hit" if cached is not None else "miss"
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        start = time.perf_counter()
+        key, cached, outcome = self._lookup(messages, tools, available_functions, kwargs)
+        if cached is not None:
+            metrics.observe("llm_call_duration_seconds", time.perf_counter() - start,
+                            model=self.model, cache=outcome, outcome="ok")
+            return cached
+
+        with metrics.span("llm_call_duration_seconds", model=self.model, cache=outcome):
+            response = self.inner.call(messages, tools=tools, callbacks=callbacks,
+                                       available_functions=available_functions, **kwargs)
+        if key is not None and isinstance(response, str):
+            get_store().put(key, self.model, response)
+        return response
+
+    async def acall(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        start = time.perf_counter()
+        key, cached, outcome = self._lookup(messages, tools, available_functions, kwargs)
+        if cached is not None:
+            metrics.observe("llm_call_duration_seconds", time.perf_counter() - start,
+                            model=self.model, cache=outcome, outcome="ok")
+            return cached
+
+        with metrics.span("llm_call_duration_seconds", model=self.model, cache=outcome):
+            response = await self.inner.acall(messages, tools=tools, callbacks=callbacks,
+                                              available_functions=available_functions, **kwargs)
+        if key is not None and isinstance(response, str):
+            get_store().put(key, self.model, response)
+        return response
+
+    def supports_function_calling(self) -> bool:
+        return self.inner.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM response cache maintenance")
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.command == "clear":
+        store._conn().execute("DELETE FROM llm_cache")
+    print(json.dumps(store.stats(), indent=2))
@@ -0,0 +1,72 @@
+"""Forwards streamed LLM tokens to the crew run that requested them.
+
+crewai publishes every streamed chunk on its global event bus and runs
+chunk handlers synchronously in the thread making the LLM call, which is an
+executor thread started from the kickoff's context. ``capture`` attaches a
+callback to that context, so concurrent crew runs (one per plan day) each
+receive only their own tokens. Agents answer in the ReAct format, so text
+before ``Final Answer:`` (the agent's thoughts) is held back and only the
+answer itself is forwarded.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+FINAL_ANSWER = "Final Answer:"
+
+_sink = ContextVar("llm_stream_sink", default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Subscribe to crewai's stream chunk events (once per process)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def _on_chunk(source, event):
+            sink = _sink.get()
+            if sink is not None and event.chunk:
+                sink.feed(event.chunk)
+
+        _installed = True
+
+
+class AnswerSink:
+    """Passes on the text following ``Final Answer:`` as it arrives"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.emitted = False
+        self._head = ""
+        self._answering = False
+
+    def feed(self, chunk: str):
+        if not self._answering:
+            self._head += chunk
+            start = self._head.find(FINAL_ANSWER)
+            if start < 0:
+                return
+            self._answering = True
+            chunk = self._head[start + len(FINAL_ANSWER):]
+            self._head = ""
+        if not self.emitted:
+            chunk = chunk.lstrip()
+        if chunk:
+            self.emitted = True
+            self.callback(chunk)
+
+
+@contextmanager
+def capture(callback):
+    """Send the answer tokens of LLM calls made within this context to ``callback``"""
+    sink = AnswerSink(callback)
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _sink.reset(token)
@@ -0,0 +1,167 @@
+"""Macro-target meal composition solver.
+
+Picks ingredients from the user's allowed foods for 7 days x 5 meal slots
+and solves for servings (multiples of each food's DB portion) so daily
+carbs/protein/fat land on the nutrition targets. The LLM then only has to
+write recipes around an ingredient list that is already correct.
+
+Solving is done for the whole week at once: a boolean selection mask picks
+a few foods per meal (rotating for variety), a projected-gradient least
+squares fit finds continuous servings for every meal simultaneously, and a
+greedy per-day pass repairs the error introduced by rounding servings to
+``SERVING_STEP``.
+"""
+import numpy as np
+
+from food_matrix import KCAL_PER_G, MACROS, FoodMatrix
+
+# (slot name, share of daily energy, max ingredients)
+MEAL_SLOTS = (
+    ("Breakfast", 0.25, 3),
+    ("Morning snack", 0.10, 2),
+    ("Lunch", 0.30, 4),
+    ("Afternoon snack", 0.10, 2),
+    ("Dinner", 0.25, 4),
+)
+DAYS = 7
+SERVING_STEP = 0.25
+MAX_SERVINGS = 4.0
+VARIETY_PENALTY = 0.15
+SOLVER_ITERATIONS = 500
+REFINE_ITERATIONS = 60
+
+# Which macro each successive pick in a meal should cover; -1 = low-kcal side
+PICK_ORDER = (1, 0, 2, -1)
+
+
+def _select(matrix: FoodMatrix, n_days: int) -> np.ndarray:
+    """Boolean (meals, foods) mask of the ingredients used in each meal"""
+    n = len(matrix)
+    kcal = matrix.macros * KCAL_PER_G
+    energy = kcal.sum(axis=1)
+    frac = np.divide(kcal, energy[:, None], out=np.zeros_like(kcal), where=energy[:, None] > 0)
+    lightness = 1.0 - energy / max(energy.max(), 1e-9)
+
+    usage = np.zeros(n)
+    mask = np.zeros((n_days * len(MEAL_SLOTS), n), dtype=bool)
+    for row in range(mask.shape[0]):
+        _, _, max_items = MEAL_SLOTS[row % len(MEAL_SLOTS)]
+        # Snacks lead with carbs (fruit), meals with protein
+        order = PICK_ORDER if max_items > 2 else (0, 1)
+        for macro in order[:min(max_items, n)]:
+            score = (lightness if macro < 0 else frac[:, macro]) - VARIETY_PENALTY * usage
+            score[mask[row]] = -np.inf
+            pick = int(np.argmax(score))
+            mask[row, pick] = True
+            usage[pick] += 1
+    return mask
+
+
+def _fit(a_norm: np.ndarray, shares: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Projected-gradient least squares for all meals at once.
+
+    Minimizes ||X @ a_norm - shares * 1||^2 with X >= 0, X <= MAX_SERVINGS
+    and X zero outside ``mask``. ``a_norm`` is macros per portion divided by
+    the daily target, so every macro counts in relative terms.
+    """
+    target = np.repeat(shares[:, None], a_norm.shape[1], axis=1)
+    lipschitz = 2.0 * np.linalg.norm(a_norm, 2) ** 2
+    step = 1.0 / max(lipschitz, 1e-9)
+    x = mask.astype(np.float64)
+    for _ in range(SOLVER_ITERATIONS):
+        grad = 2.0 * (x @ a_norm - target) @ a_norm.T
+        x = np.clip(x - step * grad, 0.0, MAX_SERVINGS) * mask
+    return x
+
+
+def _refine_day(x: np.ndarray, a_norm: np.ndarray, mask: np.ndarray):
+    """Greedy +/- SERVING_STEP moves that reduce the day's total error"""
+    for _ in range(REFINE_ITERATIONS):
+        error = x.sum(axis=0) @ a_norm - 1.0
+        best, best_norm = None, np.linalg.norm(error)
+        for food in np.flatnonzero(mask.any(axis=0)):
+            rows = np.flatnonzero(mask[:, food])
+            for delta in (SERVING_STEP, -SERVING_STEP):
+                if delta > 0:
+                    room = rows[x[rows, food] + delta <= MAX_SERVINGS]
+                    row = room[np.argmin(x[room, food])] if room.size else None
+                else:
+                    room = rows[x[rows, food] + delta >= 0]
+                    row = room[np.argmax(x[room, food])] if room.size else None
+                if row is None:
+                    continue
+                norm = np.linalg.norm(error + delta * a_norm[food])
+                if norm < best_norm - 1e-9:
+                    best, best_norm = (row, food, delta), norm
+        if best is None:
+            return
+        row, food, delta = best
+        x[row, food] += delta
+
+
+def _totals(macros: np.ndarray) -> dict:
+    totals = {m: round(float(v), 1) for m, v in zip(MACROS, macros)}
+    totals["energy"] = round(float(macros @ KCAL_PER_G), 0)
+    return totals
+
+
+def solve_week(matrix: FoodMatrix, targets: dict, days: int = DAYS):
+    """Compose ``days`` days of meals from ``matrix`` hitting ``targets``.
+
+    ``targets`` holds daily grams for carbs/protein/fat (as returned by
+    nutrition.compute_targets). Returns None if there are no foods to use.
+    """
+    if len(matrix) == 0:
+        return None
+    daily = np.array([max(float(targets[m]), 1e-6) for m in MACROS])
+    a_norm = matrix.macros / daily
+    shares = np.tile([share for _, share, _ in MEAL_SLOTS], days)
+
+    mask = _select(matrix, days)
+    x = _fit(a_norm, shares, mask)
+    x = np.round(x / SERVING_STEP) * SERVING_STEP
+    n_slots = len(MEAL_SLOTS)
+    for d in range(days):
+        rows = slice(d * n_slots, (d + 1) * n_slots)
+        day_x = x[rows]
+        _refine_day(day_x, a_norm, mask[rows])
+        x[rows] = day_x
+
+    meal_macros = x @ matrix.macros
+    plan_days = []
+    for d in range(days):
+        meals = []
+        for s, (slot, _, _) in enumerate(MEAL_SLOTS):
+            row = d * n_slots + s
+            items = [
+                {
+                    "name": matrix.names[f],
+                    "portion": matrix.portions[f],
+                    "servings": float(x[row, f]),
+                    **{m: round(float(v), 1) for m, v in zip(MACROS, x[row, f] * matrix.macros[f])},
+                }
+                for f in np.flatnonzero(x[row] > 0)
+            ]
+            meals.append({"slot": slot, "items": items, "totals": _totals(meal_macros[row])})
+        day_macros = meal_macros[d * n_slots:(d + 1) * n_slots].sum(axis=0)
+        plan_days.append({
+            "day": d + 1,
+            "meals": meals,
+            "totals": _totals(day_macros),
+            "deviation": {
+                m: round(float(v), 3) for m, v in zip(MACROS, day_macros / daily - 1.0)
+            },
+        })
+    return {"targets": {m: float(targets[m]) for m in MACROS}, "days": plan_days}
+
+
+def format_day(day: dict) -> str:
+    """Compact ingredient list of one solved day"""
+    t = day["totals"]
+    lines = [f"Day {day['day']} (C {t['carbs']:.0f}g / P {t['protein']:.0f}g / F {t['fat']:.0f}g):"]
+    for meal in day["meals"]:
+        items = ", ".join(
+            f"{i['name']} {i['servings']:g} x {i['portion']}" for i in meal["items"]
+        )
+        lines.append(f"  {meal['slot']}: {items}")
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""Process-local timing histograms in Prometheus text format.
+
+``span(name, **labels)`` times a block into histogram ``name`` (with an
+``outcome`` label of ok/error) and ``observe`` records a duration directly
+(or another value for histograms with their own buckets, such as token
+counts).
+``render()`` returns every histogram in the text exposition format served
+on /metrics; standalone workers can expose theirs with ``serve(port)``.
+
+Metrics are kept per process. Set ``METRICS=0`` to turn recording off.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans range from sub-millisecond queries to multi-minute crews
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+           5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+NAMED_BUCKETS = {
+    "prompt_tokens": TOKEN_BUCKETS,
+}
+
+HELP = {
+    "http_request_duration_seconds": "HTTP request latency by route template",
+    "db_query_duration_seconds": "Time a db.run operation held a pooled connection",
+    "db_pool_wait_seconds": "Time a db.run operation waited for a thread and connection",
+    "llm_call_duration_seconds": "LLM completion latency by cache outcome",
+    "tool_call_duration_seconds": "Agent tool call latency",
+    "search_backend_duration_seconds": "Search backend latency (cache misses only)",
+    "crew_task_duration_seconds": "Latency of one crew task run",
+    "pipeline_stage_duration_seconds": "Time a task spent in each pipeline stage",
+    "plan_store_duration_seconds": "Plan storage operation latency",
+    "prompt_tokens": "Estimated prompt size of a crew task after budgeting",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label set"""
+
+    def __init__(self, name: str, buckets=BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self._series = {}  # label pairs -> [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: dict):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {HELP.get(self.name, self.name)}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str) -> Histogram:
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(name, Histogram(name, NAMED_BUCKETS.get(name, BUCKETS)))
+    return hist
+
+
+def observe(name: str, seconds: float, **labels):
+    if METRICS_ENABLED:
+        histogram(name).observe(seconds, labels)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time the enclosed block into histogram ``name``"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+
+def render() -> str:
+    with _registry_lock:
+        hists = sorted(_histograms.values(), key=lambda h: h.name)
+    return "\n".join(line for h in hists for line in h.render()) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread (for processes without the API)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,137 @@
+"""Deterministic nutrition targets for meal-plan requests.
+
+Computes Mifflin-St Jeor BMR, TDEE and daily energy/macro targets directly
+from MealPlanRequest fields, so the crew no longer spends an LLM round trip
+on arithmetic. ``compute_targets_batch`` works on whole arrays of profiles
+at once; ``compute_targets`` is the single-request wrapper used by the crew.
+"""
+import re
+
+import numpy as np
+
+# Mifflin-St Jeor sex constant; unknown sex uses the midpoint
+SEX_CONSTANTS = {"male": 5.0, "female": -161.0}
+UNKNOWN_SEX_CONSTANT = -78.0
+
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+}
+DEFAULT_ACTIVITY = "moderate"
+
+# Goal classes, caloric adjustment of TDEE and protein in g per kg of body weight.
+# Stems match the start of a word; an explicit maintain stem, or both lose
+# and gain (recomposition), means maintain. Hints are whole words and only
+# count when no stem matched.
+GOAL_KEYWORDS = {
+    "maintain": ("maintain", "mainten", "manten", "recomp"),
+    "lose": ("lose", "losing", "loss", "cut", "shed", "slim", "dimagr", "perder"),
+    "gain": ("gain", "bulk", "build", "ingrass"),
+}
+GOAL_HINTS = {
+    "lose": ("fat", "lean"),
+    "gain": ("muscle", "muscles", "mass", "massa"),
+}
+GOAL_ADJUSTMENT = {"lose": -0.30, "maintain": 0.0, "gain": 0.30}
+PROTEIN_G_PER_KG = {"lose": 2.2, "maintain": 1.6, "gain": 2.0}
+PROTEIN_RANGE_G_PER_KG = (1.6, 2.2)
+
+FAT_ENERGY_SHARE = 0.25
+FIBER_G_PER_1000_KCAL = 14.0
+KCAL_PER_G = {"carbs": 4.0, "protein": 4.0, "fat": 9.0}
+
+
+def _goal_classes(words: list, keywords: dict, match) -> set:
+    return {
+        goal_class for goal_class, stems in keywords.items()
+        if any(match(word, stem) for word in words for stem in stems)
+    }
+
+
+def classify_goal(goal: str) -> str:
+    words = re.findall(r"\w+", (goal or "").casefold())
+    found = _goal_classes(words, GOAL_KEYWORDS, str.startswith)
+    if not found:
+        found = _goal_classes(words, GOAL_HINTS, str.__eq__)
+    if len(found) != 1:
+        return "maintain"
+    return found.pop()
+
+
+def _lookup(values, table: dict, default: float) -> np.ndarray:
+    return np.array(
+        [table.get((v or "").strip().casefold().replace(" ", "_"), default) for v in values],
+        dtype=float,
+    )
+
+
+def compute_targets_batch(ages, weights, heights, goals, sexes=None, activity_levels=None) -> dict:
+    """Compute daily targets for many profiles in one vectorized pass.
+
+    Every argument is a sequence of equal length; ``sexes`` and
+    ``activity_levels`` may be omitted or contain None. Returns a dict of
+    float arrays (kcal and grams per day) plus the goal classes.
+    """
+    age = np.asarray(ages, dtype=float)
+    weight = np.asarray(weights, dtype=float)
+    height = np.asarray(heights, dtype=float)
+    n = age.shape[0]
+    sexes = sexes if sexes is not None else [None] * n
+    activity_levels = activity_levels if activity_levels is not None else [None] * n
+
+    goal_classes = [classify_goal(g) for g in goals]
+    sex_constant = _lookup(sexes, SEX_CONSTANTS, UNKNOWN_SEX_CONSTANT)
+    activity = _lookup(activity_levels, ACTIVITY_FACTORS, ACTIVITY_FACTORS[DEFAULT_ACTIVITY])
+    adjustment = np.array([GOAL_ADJUSTMENT[g] for g in goal_classes])
+    protein_per_kg = np.array([PROTEIN_G_PER_KG[g] for g in goal_classes])
+
+    bmr = 10.0 * weight + 6.25 * height - 5.0 * age + sex_constant
+    tdee = bmr * activity
+    energy = tdee * (1.0 + adjustment)
+
+    protein = protein_per_kg * weight
+    fat = energy * FAT_ENERGY_SHARE / KCAL_PER_G["fat"]
+    carbs = np.maximum(
+        energy - protein * KCAL_PER_G["protein"] - fat * KCAL_PER_G["fat"], 0.0
+    ) / KCAL_PER_G["carbs"]
+
+    return {
+        "goal": goal_classes,
+        "bmr": bmr,
+        "tdee": tdee,
+        "energy": energy,
+        "protein": protein,
+        "protein_min": PROTEIN_RANGE_G_PER_KG[0] * weight,
+        "protein_max": PROTEIN_RANGE_G_PER_KG[1] * weight,
+        "carbs": carbs,
+        "fat": fat,
+        "fiber": energy / 1000.0 * FIBER_G_PER_1000_KCAL,
+    }
+
+
+def compute_targets(params: dict) -> dict:
+    """Targets for a single MealPlanRequest payload, as plain rounded floats"""
+    batch = compute_targets_batch(
+        [params["age"]], [params["weight"]], [params["height"]], [params.get("goal", "")],
+        [params.get("sex")], [params.get("activity_level")],
+    )
+    return {
+        key: value[0] if key == "goal" else round(float(value[0]), 1)
+        for key, value in batch.items()
+    }
+
+
+def format_targets(targets: dict) -> str:
+    """Compact text block handed to the crew as precomputed context"""
+    return (
+        f"Goal class: {targets['goal']}\n"
+        f"BMR: {targets['bmr']:.0f} kcal, TDEE: {targets['tdee']:.0f} kcal\n"
+        f"Daily energy target: {targets['energy']:.0f} kcal\n"
+        f"Protein: {targets['protein']:.0f} g "
+        f"(range {targets['protein_min']:.0f}-{targets['protein_max']:.0f} g)\n"
+        f"Carbs: {targets['carbs']:.0f} g, Fat: {targets['fat']:.0f} g, "
+        f"Fiber: {targets['fiber']:.0f} g"
+    )
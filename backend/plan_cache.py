@@ -0,0 +1,151 @@
+"""Content-addressed cache of generated meal plans.
+
+Requests are canonicalized (numeric fields bucketed, strings folded,
+preference dicts and lists sorted) and hashed, so payloads that differ only
+in key order, casing or insignificant precision share one cached plan.
+Entries expire after ``PLAN_CACHE_TTL`` seconds and the least recently used
+ones are evicted beyond ``PLAN_CACHE_MAX_ENTRIES`` / ``PLAN_CACHE_MAX_BYTES``.
+Evicting an entry never deletes the stored plan, which users' plans still
+reference.
+
+Functions take a connection first so they run through ``db.run``.
+"""
+import hashlib
+import json
+import os
+import time
+
+import plan_store
+
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600)))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "10000"))
+PLAN_CACHE_MAX_BYTES = int(os.getenv("PLAN_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Bucket sizes for numeric request fields; other numbers are rounded to 2 places
+NUMERIC_BUCKETS = {
+    "age": 1,
+    "weight": float(os.getenv("PLAN_CACHE_WEIGHT_BUCKET", "1")),
+    "height": 1,
+}
+
+
+def _bucket(value: float, size: float) -> float:
+    return round(round(value / size) * size, 3)
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(k).strip().casefold(): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+# Internal fields derived from the request (batch leaders carry their
+# group's targets); plans are shared whether or not they were precomputed
+DERIVED_FIELDS = ("precomputed_targets",)
+
+
+def canonicalize(params: dict) -> str:
+    """Canonical JSON form of a MealPlanRequest payload"""
+    canonical = {}
+    for key, value in params.items():
+        if key in DERIVED_FIELDS:
+            continue
+        if key in NUMERIC_BUCKETS and isinstance(value, (int, float)):
+            canonical[key] = _bucket(value, NUMERIC_BUCKETS[key])
+        else:
+            canonical[key] = _normalize(value)
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+def request_key(params: dict) -> str:
+    return hashlib.sha256(canonicalize(params).encode("utf-8")).hexdigest()
+
+
+def _bump(conn, counter: str):
+    conn.execute(
+        "UPDATE plan_cache_stats SET value = value + 1 WHERE name = ?", (counter,)
+    )
+
+
+def lookup(conn, key: str, record_miss: bool = True):
+    """Return the cached plan reference for ``key``, or None on a miss.
+
+    Workers re-check requests the API already counted as a miss and pass
+    ``record_miss=False`` so each request is counted once.
+    """
+    now = time.time()
+    row = conn.execute(
+        "SELECT file_path, created_at FROM plan_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row and now - row[1] <= PLAN_CACHE_TTL and plan_store.exists(conn, row[0]):
+        conn.execute(
+            "UPDATE plan_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?",
+            (now, key),
+        )
+        _bump(conn, "hits")
+        return row[0]
+    if row:
+        conn.execute("DELETE FROM plan_cache WHERE key = ?", (key,))
+    if record_miss:
+        _bump(conn, "misses")
+    return None
+
+
+def store(conn, key: str, file_path: str):
+    now = time.time()
+    size = plan_store.size(conn, file_path)
+    conn.execute("""
+        INSERT OR REPLACE INTO plan_cache (key, file_path, size, created_at, last_used_at, hits)
+        VALUES (?, ?, ?, ?, ?, 0)
+    """, (key, file_path, size, now, now))
+    evict(conn)
+
+
+def evict(conn) -> int:
+    """Drop expired entries, then least recently used ones over the limits"""
+    removed = conn.execute(
+        "DELETE FROM plan_cache WHERE created_at < ?", (time.time() - PLAN_CACHE_TTL,)
+    ).rowcount
+
+    count, total = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM plan_cache"
+    ).fetchone()
+    if count <= PLAN_CACHE_MAX_ENTRIES and total <= PLAN_CACHE_MAX_BYTES:
+        return removed
+
+    victims = []
+    for key, size in conn.execute(
+        "SELECT key, size FROM plan_cache ORDER BY last_used_at"
+    ):
+        if count <= PLAN_CACHE_MAX_ENTRIES and total <= PLAN_CACHE_MAX_BYTES:
+            break
+        victims.append((key,))
+        count -= 1
+        total -= size
+    conn.executemany("DELETE FROM plan_cache WHERE key = ?", victims)
+    return removed + len(victims)
+
+
+def stats(conn) -> dict:
+    counters = dict(conn.execute("SELECT name, value FROM plan_cache_stats"))
+    entries, total = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM plan_cache"
+    ).fetchone()
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return {
+        "entries": entries,
+        "bytes": total,
+        "hits": counters.get("hits", 0),
+        "misses": counters.get("misses", 0),
+        "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+        "max_entries": PLAN_CACHE_MAX_ENTRIES,
+        "max_bytes": PLAN_CACHE_MAX_BYTES,
+        "ttl": PLAN_CACHE_TTL,
+    }
@@ -0,0 +1,97 @@
+"""Partial meal-plan output of tasks that are still generating.
+
+While the meal-plan stage streams tokens, the worker appends each day's new
+text to ``task_output`` every ``STREAM_FLUSH_INTERVAL`` seconds. The API
+forwards those rows over a task's event stream and serves the assembled
+draft, so readers see content seconds into a generation and the text
+written before a crash survives it. Rows carry the attempt that produced
+them; a retry starts a new draft. They are removed when the task completes
+(the stored plan supersedes them) or is compacted away.
+"""
+import os
+import threading
+import time
+
+import db
+
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.5"))
+
+
+def append(conn, task_id: str, attempt: int, chunks: list):
+    """Store ``(day, text)`` chunks of one attempt, in order"""
+    now = time.time()
+    conn.executemany("""
+        INSERT INTO task_output (task_id, attempt, day, text, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(task_id, attempt, day, text, now) for day, text in chunks])
+
+
+def since(conn, task_id: str, after_id: int) -> list:
+    """``(id, attempt, day, text)`` rows added after ``after_id``"""
+    return conn.execute("""
+        SELECT id, attempt, day, text FROM task_output
+        WHERE task_id = ? AND id > ?
+        ORDER BY id
+    """, (task_id, after_id)).fetchall()
+
+
+def assemble(conn, task_id: str):
+    """The latest attempt's draft as ``(attempt, {day: text})``, or None"""
+    row = conn.execute(
+        "SELECT MAX(attempt) FROM task_output WHERE task_id = ?", (task_id,)
+    ).fetchone()
+    if row[0] is None:
+        return None
+    days = {}
+    for day, text in conn.execute("""
+        SELECT day, text FROM task_output
+        WHERE task_id = ? AND attempt = ?
+        ORDER BY id
+    """, (task_id, row[0])):
+        days[day] = days.get(day, "") + text
+    return row[0], dict(sorted(days.items()))
+
+
+def clear(conn, task_id: str):
+    conn.execute("DELETE FROM task_output WHERE task_id = ?", (task_id,))
+
+
+class DraftWriter:
+    """``on_delta`` callback for the crew: buffers streamed text per day.
+
+    Pending text is written once ``interval`` seconds have passed since the
+    last write, and when a day reports completion (``text`` is None).
+    Picklable for the process executor: a copy starts with empty buffers.
+    """
+
+    def __init__(self, task_id: str, attempt: int, interval: float = STREAM_FLUSH_INTERVAL):
+        self.task_id = task_id
+        self.attempt = attempt
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._written_at = time.monotonic()
+
+    def __getstate__(self):
+        return {"task_id": self.task_id, "attempt": self.attempt, "interval": self.interval}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def __call__(self, day: int, text):
+        # Held while writing so one day's chunks are stored in order
+        with self._lock:
+            if text:
+                self._pending[day] = self._pending.get(day, "") + text
+            if text is not None and time.monotonic() - self._written_at < self.interval:
+                return
+            chunks = [(d, t) for d, t in sorted(self._pending.items()) if t]
+            self._pending = {}
+            self._written_at = time.monotonic()
+            if chunks:
+                with db.get_pool().connection() as conn:
+                    append(conn, self.task_id, self.attempt, chunks)
@@ -0,0 +1,234 @@
+"""Structured view of stored meal plans, with nutrition totals.
+
+Plan documents carry the solved ingredients of each day as a markdown table
+under ``### Ingredients`` (written by ``format_ingredients``), ahead of the
+recipe text. When a plan is stored, ``index`` parses the document once:
+days, the meals of each day, ingredients linked to ``foods`` rows by
+(name, portion), servings and macros, and meal, day and week totals
+computed from the food table at that moment. The result is kept per day in
+``plan_days`` (with a ``plan_summaries`` row per plan), keyed by the plan
+reference, so one day or one meal is served without reading the document.
+
+Plans stored before this existed, or generated without an ingredient
+plan, are indexed on first request; their days have text but no meals and
+``None`` totals.
+
+Functions take a connection first so they run through ``db.run``.
+"""
+import json
+import re
+import time
+
+import plan_store
+from food_matrix import KCAL_PER_G, MACROS
+
+INGREDIENTS_HEADING = "### Ingredients"
+VALIDATION_HEADING = "# Validation"
+_TABLE_HEADER = ("| Meal | Food | Portion | Servings |", "| --- | --- | --- | --- |")
+
+_DAY = re.compile(r"^## Day (\d+)\s*$")
+_HEADING = re.compile(r"^\s*(#{1,6}\s+(.+?)|\*\*(.+?)\*\*:?)\s*$")
+_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+_HEADING_MARK = re.compile(r"^(#{1,6})(?=\s)", re.MULTILINE)
+
+
+def demote_headings(text: str) -> str:
+    """Push markdown headings of generated text below the document's ``## Day`` level"""
+    return _HEADING_MARK.sub(lambda m: "#" * min(len(m.group(1)) + 2, 6), text)
+
+
+def _cell(text: str) -> str:
+    return text.replace("|", "\\|")
+
+
+def format_ingredients(day: dict) -> str:
+    """Markdown table of one solved day (see meal_solver.solve_week)"""
+    rows = [
+        f"| {_cell(meal['slot'])} | {_cell(item['name'])} | {_cell(item['portion'])} "
+        f"| {item['servings']:g} |"
+        for meal in day["meals"] for item in meal["items"]
+    ]
+    return "\n".join([INGREDIENTS_HEADING, "", *_TABLE_HEADER, *rows])
+
+
+def _parse_row(line: str):
+    cells = [c.strip().replace("\\|", "|") for c in _CELL_SPLIT.split(line.strip()[1:-1])]
+    if len(cells) != 4:
+        return None
+    try:
+        return cells[0], cells[1], cells[2], float(cells[3])
+    except ValueError:
+        return None  # header or separator row
+
+
+def parse(content: str) -> dict:
+    """``{day: {"text", "report", "ingredients"}}`` of a plan document"""
+    days = {}
+    section = "plan"
+    parts = None
+    in_table = False
+    for line in content.splitlines():
+        # Only the markers merge_plan writes start sections; other headings are text
+        if line.strip() == VALIDATION_HEADING:
+            section = "report"
+            parts = None
+            continue
+        match = _DAY.match(line)
+        if match:
+            parts = days.setdefault(int(match.group(1)), {
+                "plan": [], "report": [], "ingredients": []
+            })
+            in_table = False
+            continue
+        if parts is None:
+            continue
+        if section == "plan" and line.strip() == INGREDIENTS_HEADING:
+            in_table = True
+            continue
+        if in_table:
+            if line.startswith("|"):
+                row = _parse_row(line)
+                if row:
+                    parts["ingredients"].append(row)
+                continue
+            if not line.strip() and not parts["ingredients"]:
+                continue  # blank line before the table
+            in_table = False
+        parts[section].append(line)
+    return {
+        day: {
+            "text": "\n".join(parts["plan"]).strip(),
+            "report": "\n".join(parts["report"]).strip(),
+            "ingredients": parts["ingredients"],
+        }
+        for day, parts in sorted(days.items())
+    }
+
+
+def _totals(items: list):
+    linked = [i for i in items if i["food_id"] is not None]
+    if not linked:
+        return None
+    totals = {m: round(sum(i[m] for i in linked), 1) for m in MACROS}
+    totals["energy"] = round(sum(i["energy"] for i in linked), 0)
+    return totals
+
+
+def _meal_text(text: str, slot: str):
+    """The section of a day's recipe text whose heading names ``slot``"""
+    sections, heading, lines = [], None, []
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            sections.append((heading, lines))
+            heading, lines = (match.group(2) or match.group(3)), [line]
+        else:
+            lines.append(line)
+    sections.append((heading, lines))
+    for heading, lines in sections:
+        if heading and slot.casefold() in heading.casefold():
+            return "\n".join(lines).strip()
+    return None
+
+
+def _food(conn, cache: dict, name: str, portion: str):
+    key = (name, portion)
+    if key not in cache:
+        cache[key] = conn.execute(
+            "SELECT id, carbs, protein, fat FROM foods WHERE name = ? AND portion = ?",
+            key,
+        ).fetchone()
+    return cache[key]
+
+
+def build(conn, content: str) -> list:
+    """Structured days of a plan document, with totals from the foods table"""
+    foods = {}
+    days = []
+    for number, parsed in parse(content).items():
+        meals = {}
+        for slot, name, portion, servings in parsed["ingredients"]:
+            row = _food(conn, foods, name, portion)
+            item = {"food_id": row[0] if row else None, "name": name,
+                    "portion": portion, "servings": servings}
+            if row:
+                macros = [servings * (v or 0.0) for v in row[1:]]
+                item.update({m: round(v, 1) for m, v in zip(MACROS, macros)})
+                item["energy"] = round(float(KCAL_PER_G @ macros), 0)
+            meals.setdefault(slot, []).append(item)
+        days.append({
+            "day": number,
+            "meals": [
+                {"slot": slot, "items": items, "totals": _totals(items),
+                 "text": _meal_text(parsed["text"], slot)}
+                for slot, items in meals.items()
+            ],
+            "totals": _totals([i for items in meals.values() for i in items]),
+            "text": parsed["text"],
+            "report": parsed["report"],
+        })
+    return days
+
+
+def index(conn, ref: str, content: str):
+    """Parse a stored plan and record its structure (once per reference)"""
+    if conn.execute("SELECT 1 FROM plan_summaries WHERE ref = ?", (ref,)).fetchone():
+        return
+    days = build(conn, content)
+    conn.executemany("""
+        INSERT OR IGNORE INTO plan_days (ref, day, carbs, protein, fat, energy, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (ref, d["day"], *((d["totals"] or {}).get(k) for k in (*MACROS, "energy")),
+         json.dumps(d))
+        for d in days
+    ])
+    conn.execute(
+        "INSERT OR IGNORE INTO plan_summaries (ref, days, created_at) VALUES (?, ?, ?)",
+        (ref, len(days), time.time()),
+    )
+
+
+def ensure(conn, ref: str):
+    """Index a plan stored before structured plans existed"""
+    if not conn.execute("SELECT 1 FROM plan_summaries WHERE ref = ?", (ref,)).fetchone():
+        index(conn, ref, plan_store.read(conn, ref))
+
+
+def summary(conn, ref: str) -> dict:
+    """Per-day and week totals of a plan"""
+    ensure(conn, ref)
+    days = [
+        {"day": row[0], "totals": dict(zip((*MACROS, "energy"), row[1:])) if row[4] is not None
+         else None}
+        for row in conn.execute(
+            "SELECT day, carbs, protein, fat, energy FROM plan_days WHERE ref = ? ORDER BY day",
+            (ref,),
+        )
+    ]
+    counted = [d["totals"] for d in days if d["totals"]]
+    week = None
+    if counted:
+        week = {k: round(sum(t[k] for t in counted), 1) for k in (*MACROS, "energy")}
+    return {
+        "days": days,
+        "totals": week,
+        "daily_average": {k: round(v / len(counted), 1) for k, v in week.items()} if week else None,
+    }
+
+
+def get_day(conn, ref: str, day: int):
+    """One day of a plan, or None if the plan has no such day"""
+    ensure(conn, ref)
+    row = conn.execute(
+        "SELECT data FROM plan_days WHERE ref = ? AND day = ?", (ref, day)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def find_meal(day: dict, slot: str):
+    """The meal of a day with the given slot name (case-insensitive)"""
+    for meal in day["meals"]:
+        if meal["slot"].casefold() == slot.strip().casefold():
+            return meal
+    return None
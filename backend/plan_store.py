@@ -0,0 +1,200 @@
+"""Storage backend for generated meal-plan documents.
+
+Plans are referenced from ``meal_plans.file_path`` by an opaque reference:
+
+* ``blob:<sha256>`` - zlib-compressed, content-addressed blob in the
+  ``plan_blobs`` table. Identical plans are stored once.
+* anything else - a loose markdown file path, as written before the blob
+  store existed (and by ``FilePlanStore``).
+
+Reads dispatch on the reference, so old rows keep working whichever backend
+new plans are written to (``PLAN_STORE=sqlite|files``). Migrate existing
+files into blobs with:
+
+    python plan_store.py migrate [--delete-files]
+"""
+import argparse
+import hashlib
+import os
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+BLOB_PREFIX = "blob:"
+PLAN_STORE = os.getenv("PLAN_STORE", "sqlite")
+MEAL_PLANS_DIR = "data/meal_plans"
+COMPRESSION_LEVEL = 6
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _inflate(data: bytes):
+    inflater = zlib.decompressobj()
+    for start in range(0, len(data), READ_CHUNK_SIZE):
+        chunk = inflater.decompress(data[start:start + READ_CHUNK_SIZE])
+        if chunk:
+            yield chunk
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+
+def _read_file(path: str):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class BlobPlanStore:
+    """Compressed, deduplicated plan bodies in SQLite"""
+
+    def put(self, conn, content: str) -> str:
+        raw = content.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        conn.execute("""
+            INSERT OR IGNORE INTO plan_blobs (digest, size, data, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (digest, len(raw), zlib.compress(raw, COMPRESSION_LEVEL), time.time()))
+        return BLOB_PREFIX + digest
+
+    def _compressed(self, conn, ref: str):
+        row = conn.execute(
+            "SELECT data FROM plan_blobs WHERE digest = ?", (ref[len(BLOB_PREFIX):],)
+        ).fetchone()
+        if not row:
+            raise FileNotFoundError(ref)
+        return row[0]
+
+    def open_chunks(self, conn, ref: str):
+        # The compressed blob is fetched now, while the connection is held;
+        # text is inflated lazily as the caller iterates
+        return _inflate(self._compressed(conn, ref))
+
+    def exists(self, conn, ref: str) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM plan_blobs WHERE digest = ?", (ref[len(BLOB_PREFIX):],)
+        ).fetchone() is not None
+
+    def size(self, conn, ref: str) -> int:
+        row = conn.execute(
+            "SELECT size FROM plan_blobs WHERE digest = ?", (ref[len(BLOB_PREFIX):],)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def delete(self, conn, ref: str):
+        conn.execute("DELETE FROM plan_blobs WHERE digest = ?", (ref[len(BLOB_PREFIX):],))
+
+
+class FilePlanStore:
+    """One markdown file per plan (the original layout)"""
+
+    def put(self, conn, content: str) -> str:
+        os.makedirs(MEAL_PLANS_DIR, exist_ok=True)
+        filename = f"{uuid.uuid4()}-{datetime.now().strftime('%Y%m%d%H%M%S')}.md"
+        filepath = os.path.join(MEAL_PLANS_DIR, filename)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return filepath
+
+    def open_chunks(self, conn, ref: str):
+        if not os.path.exists(ref):
+            raise FileNotFoundError(ref)
+        return _read_file(ref)
+
+    def exists(self, conn, ref: str) -> bool:
+        return os.path.exists(ref)
+
+    def size(self, conn, ref: str) -> int:
+        return os.path.getsize(ref) if os.path.exists(ref) else 0
+
+    def delete(self, conn, ref: str):
+        if os.path.exists(ref):
+            os.remove(ref)
+
+
+_blob_store = BlobPlanStore()
+_file_store = FilePlanStore()
+
+
+def store_for(ref: str):
+    return _blob_store if ref.startswith(BLOB_PREFIX) else _file_store
+
+
+def save(conn, content: str) -> str:
+    """Store a plan with the configured backend and return its reference"""
+    store = _file_store if PLAN_STORE == "files" else _blob_store
+    return store.put(conn, content)
+
+
+def open_chunks(conn, ref: str):
+    """Return an iterator of the plan's UTF-8 byte chunks.
+
+    Raises FileNotFoundError up front; the iterator itself does not use
+    ``conn``, so it can be consumed after the connection is released.
+    """
+    return store_for(ref).open_chunks(conn, ref)
+
+
+def read(conn, ref: str) -> str:
+    return b"".join(open_chunks(conn, ref)).decode("utf-8")
+
+
+def exists(conn, ref: str) -> bool:
+    return store_for(ref).exists(conn, ref)
+
+
+def size(conn, ref: str) -> int:
+    return store_for(ref).size(conn, ref)
+
+
+def delete(conn, ref: str):
+    store_for(ref).delete(conn, ref)
+
+
+def migrate(conn, delete_files: bool = False) -> dict:
+    """Move loose plan files referenced by meal_plans into the blob store.
+
+    Each file counts once: ``migrated`` when its content became a new blob,
+    ``deduplicated`` when an identical blob already existed, ``missing``
+    when the file is gone.
+    """
+    stats = {"migrated": 0, "missing": 0, "deduplicated": 0}
+    paths = [row[0] for row in conn.execute(
+        "SELECT DISTINCT file_path FROM meal_plans WHERE file_path NOT LIKE 'blob:%'"
+    )]
+    for path in paths:
+        if not os.path.exists(path):
+            stats["missing"] += 1
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        ref = BLOB_PREFIX + hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if _blob_store.exists(conn, ref):
+            stats["deduplicated"] += 1
+        else:
+            _blob_store.put(conn, content)
+            stats["migrated"] += 1
+        conn.execute("UPDATE meal_plans SET file_path = ? WHERE file_path = ?", (ref, path))
+        conn.execute("UPDATE plan_cache SET file_path = ? WHERE file_path = ?", (ref, path))
+        conn.commit()
+        if delete_files:
+            os.remove(path)
+    return stats
+
+
+if __name__ == "__main__":
+    import db
+
+    parser = argparse.ArgumentParser(description="Meal-plan storage maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = sub.add_parser("migrate", help="move plan files into the blob store")
+    migrate_parser.add_argument("--delete-files", action="store_true",
+                                help="remove each file once its blob is committed")
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_pool().connection() as conn:
+        print(migrate(conn, delete_files=args.delete_files))
@@ -0,0 +1,144 @@
+"""Compact, token-budgeted inputs for the crew task prompts.
+
+The same profile and preference values are interpolated into the analysis
+prompt and into every day's meal-plan and validation prompt, so their size
+is paid fifteen times per plan. ``compact_inputs`` rewrites them once into a
+canonical form: numbers without trailing zeros, whitespace-collapsed text,
+and preferences resolved against the ``foods`` table, deduplicated, grouped
+by the table's categories and tagged with food ids (``#14 Pollo (Chicken
+Breast)``). Names not found in the table are listed as unlisted.
+
+``fit`` then enforces a per-task token budget: when the rendered prompt is
+over budget, the variable fields in ``SHRINK_ORDER`` are truncated at line
+or list-item boundaries until it fits, and prompt sizes are recorded in the
+``prompt_tokens`` histogram. Tokens are estimated from words and
+punctuation (no tokenizer download needed); expect roughly +-15% against
+real BPE counts.
+"""
+import re
+
+import metrics
+from food_matrix import preference_names
+
+# Fields shrunk, in order, when a prompt is over budget: LLM output first,
+# then user-supplied lists and text, the plan under validation last
+SHRINK_ORDER = ("analysis", "food_preferences", "goal", "day_plan")
+MIN_FIELD_TOKENS = 32
+TRUNCATION_MARK = " [...]"
+MAX_LOOKUP_PARAMS = 500  # names per IN (...) query
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def count_tokens(text: str) -> int:
+    """Estimated BPE token count: one per punctuation mark, one per 4 word chars"""
+    return sum(1 + (len(t) - 1) // 4 for t in _TOKEN.findall(text))
+
+
+def render(template: str, inputs: dict) -> str:
+    """Interpolate ``{key}`` placeholders the way task descriptions are"""
+    return _PLACEHOLDER.sub(
+        lambda m: str(inputs[m.group(1)]) if m.group(1) in inputs else m.group(0), template
+    )
+
+
+def _number(value):
+    return f"{value:g}" if isinstance(value, float) else value
+
+
+def _text(value) -> str:
+    return " ".join(str(value).split())
+
+
+def _resolve_foods(conn, names: list) -> dict:
+    """Map casefolded names to (id, name, category) rows of the foods table"""
+    found = {}
+    unique = sorted({n.strip().casefold() for n in names if n.strip()})
+    for start in range(0, len(unique), MAX_LOOKUP_PARAMS):
+        chunk = unique[start:start + MAX_LOOKUP_PARAMS]
+        marks = ",".join("?" * len(chunk))
+        for row in conn.execute(f"""
+            SELECT id, name, category FROM foods
+            WHERE name COLLATE NOCASE IN ({marks})
+            ORDER BY id
+        """, chunk):
+            found.setdefault(row[1].casefold(), row)
+    return found
+
+
+def compact_preferences(conn, food_preferences) -> str:
+    """Canonical preference listing, one category per line"""
+    names = preference_names(food_preferences)
+    found = _resolve_foods(conn, names)
+    groups = {}
+    unlisted = set()
+    for name in names:
+        row = found.get(name.strip().casefold())
+        if row is None:
+            if name.strip():
+                unlisted.add(_text(name))
+            continue
+        groups.setdefault(row[2] or "other", {})[row[0]] = row[1]
+    lines = [
+        f"{category}: " + ", ".join(f"#{i} {n}" for i, n in sorted(foods.items()))
+        for category, foods in sorted(groups.items())
+    ]
+    if unlisted:
+        lines.append("unlisted: " + ", ".join(sorted(unlisted, key=str.casefold)))
+    return "\n".join(lines) or "none given"
+
+
+def compact_inputs(conn, user_inputs: dict) -> dict:
+    """Profile and preferences in their compact canonical form"""
+    compact = {
+        key: _number(value) if isinstance(value, (int, float)) else value
+        for key, value in user_inputs.items()
+    }
+    if "goal" in compact:
+        compact["goal"] = _text(compact["goal"])
+    compact["food_preferences"] = compact_preferences(conn, user_inputs.get("food_preferences"))
+    return compact
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to about ``max_tokens`` at a line or list-item boundary"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max(max_tokens - count_tokens(TRUNCATION_MARK), 0)
+    lo, hi = 0, len(text)
+    while lo < hi:  # longest prefix within budget
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    boundary = max(cut.rfind("\n"), cut.rfind(", "))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary]
+    return cut.rstrip(" ,") + TRUNCATION_MARK
+
+
+def fit(task: str, template: str, inputs: dict, budget: int) -> dict:
+    """Inputs whose rendered prompt fits ``budget`` tokens, shrinking long fields"""
+    used = set(_PLACEHOLDER.findall(template))
+    tokens = count_tokens(render(template, inputs))
+    fitted = dict(inputs)
+    for key in SHRINK_ORDER:
+        if tokens <= budget:
+            break
+        if key not in used or key not in fitted:
+            continue
+        value = str(fitted[key])
+        size = count_tokens(value)
+        target = max(size - (tokens - budget), MIN_FIELD_TOKENS)
+        if target < size:
+            fitted[key] = truncate(value, target)
+            tokens = count_tokens(render(template, fitted))
+    if tokens > budget:
+        outcome = "over_budget"
+    else:
+        outcome = "truncated" if fitted != inputs else "fit"
+    metrics.observe("prompt_tokens", tokens, task=task, outcome=outcome)
+    return fitted
@@ -0,0 +1,193 @@
+"""Search behind the validator's SearchTool: cached, coalesced, offline-capable.
+
+``SEARCH_BACKEND`` picks where queries go:
+
+* ``local`` - nutrition lookups answered from the ``foods`` table, no network
+* ``serper`` - Google results via Serper (needs ``SERPER_API_KEY``)
+* ``auto`` (default) - local first, Serper when no food matches
+
+Results are cached for ``SEARCH_CACHE_TTL`` seconds under a normalized form
+of the query (case, punctuation and spacing folded), and concurrent
+identical queries share a single backend call.
+"""
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+import db
+import metrics
+from cache import TTLCache
+from food_matrix import load_food_matrix
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "10000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_LOCAL_RESULTS = 5
+
+# Query words that say what is asked rather than which food it is about
+GENERIC_TERMS = {
+    "nutrition", "nutritional", "facts", "fact", "value", "values", "calories",
+    "calorie", "kcal", "macros", "macro", "protein", "proteins", "carbs", "carb",
+    "carbohydrates", "fat", "fats", "fiber", "per", "100g", "gram", "grams",
+    "serving", "portion", "content", "how", "much", "many", "what", "the",
+    "and", "for", "with", "are", "does", "has", "have", "raw", "cooked",
+}
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(_WORD.findall(query.casefold()))
+
+
+def _tokens(text: str) -> list:
+    return _WORD.findall(text.casefold())
+
+
+class LocalFoodBackend:
+    """Answers nutrition lookups from the foods table via a token index"""
+
+    name = "local"
+
+    def __init__(self):
+        self._version = None
+        self._matrix = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self, conn):
+        row = conn.execute("SELECT version FROM table_versions WHERE name = 'foods'").fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            if version == self._version:
+                return
+            matrix = load_food_matrix(conn)
+            index = {}
+            for i, name in enumerate(matrix.names):
+                for token in set(_tokens(name)):
+                    index.setdefault(token, set()).add(i)
+            self._matrix, self._index, self._version = matrix, index, version
+
+    def search(self, query: str):
+        with db.get_pool().connection() as conn:
+            self._refresh(conn)
+        return self.lookup(query)
+
+    def lookup(self, query: str):
+        """Facts for the best-matching foods in the loaded index, or None"""
+        matrix, index = self._matrix, self._index
+        terms = [t for t in _tokens(query) if len(t) > 2 and t not in GENERIC_TERMS]
+        scores = Counter()
+        for term in terms:
+            for i in index.get(term, ()):
+                scores[i] += 1
+        if not scores:
+            return None
+        best = sorted(scores, key=lambda i: (-scores[i], matrix.names[i]))[:MAX_LOCAL_RESULTS]
+        kcal = matrix.kcal
+        lines = []
+        for i in best:
+            carbs, protein, fat = matrix.macros[i]
+            lines.append(
+                f"{matrix.names[i]}, per {matrix.portions[i]}: {carbs:g} g carbs, "
+                f"{protein:g} g protein, {fat:g} g fat, {kcal[i]:.0f} kcal"
+            )
+        return "Nutrition facts from the local food database:\n" + "\n".join(lines)
+
+
+class SerperBackend:
+    """Google search through Serper; the client is created on first use"""
+
+    name = "serper"
+
+    def __init__(self):
+        self._wrapper = None
+
+    def search(self, query: str):
+        if self._wrapper is None:
+            from langchain_community.utilities import GoogleSerperAPIWrapper
+            self._wrapper = GoogleSerperAPIWrapper()
+        return self._wrapper.run(query)
+
+
+BACKENDS = {
+    "local": (LocalFoodBackend,),
+    "serper": (SerperBackend,),
+    "auto": (LocalFoodBackend, SerperBackend),
+}
+
+
+class SearchService:
+    """Tries backends in order, caching and coalescing by normalized query"""
+
+    def __init__(self, backends: list, cache: TTLCache):
+        self.backends = backends
+        self.cache = cache
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def search(self, query: str) -> str:
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._query(query)
+            self.cache.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # Failures are shared with waiters but never cached
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _query(self, query: str) -> str:
+        for backend in self.backends:
+            with metrics.span("search_backend_duration_seconds", backend=backend.name):
+                result = backend.search(query)
+            if result is not None:
+                return result
+        return f"No results found for: {query}"
+
+    def stats(self) -> dict:
+        return {
+            "backends": [b.name for b in self.backends],
+            "coalesced": self.coalesced,
+            **self.cache.stats(),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> SearchService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SearchService(
+                [backend() for backend in BACKENDS[SEARCH_BACKEND]],
+                TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL),
+            )
+    return _service
+
+
+def search(query: str) -> str:
+    return get_service().search(query)
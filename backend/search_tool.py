@@ -0,0 +1,18 @@
+"""Search tool for the crew agents (see search.py for backends and caching)."""
+from crewai.tools import BaseTool
+
+import metrics
+import search
+
+
+class SearchTool(BaseTool):
+    name: str = "Search"
+    description: str = "Useful for looking up nutrition facts of foods (macros per portion) and other current information."
+
+    def _run(self, query: str) -> str:
+        """Execute the search query and return results"""
+        try:
+            with metrics.span("tool_call_duration_seconds", tool=self.name):
+                return search.search(query)
+        except Exception as e:
+            return f"Error performing search: {str(e)}"
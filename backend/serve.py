@@ -0,0 +1,70 @@
+"""Production entry point: the API in several uvicorn worker processes.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 5000
+
+Workers share the database, the session keys and (with
+``SESSION_STORE=sqlite``) the sessions, so a client may hit any of them.
+The schema and the session key file are set up here once, before the
+workers start. The startup food load and the compaction loop also run
+here, once, in a background thread, and are switched off in the workers,
+which would otherwise each run them on the same database. Each worker
+runs ``EMBEDDED_WORKERS`` queue workers of its own; to size generation
+separately, set it to 0 and start worker.py processes instead. Metrics are
+per process.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+import uvicorn
+
+import compaction
+import db
+import food_loader
+import sessions
+
+logger = logging.getLogger(__name__)
+
+
+def _background_jobs():
+    """The app's startup food load and compaction loop, for all workers"""
+    if food_loader.FOOD_LOAD_ON_STARTUP:
+        try:
+            with db.get_pool().connection() as conn:
+                for result in food_loader.load_all(conn):
+                    logger.info(f"Food data load: {result}")
+        except Exception as e:
+            logger.error(f"Food data load failed: {str(e)}")
+    while compaction.COMPACTION_INTERVAL > 0:
+        time.sleep(compaction.COMPACTION_INTERVAL)
+        try:
+            with db.get_pool().connection() as conn:
+                logger.info(f"Compaction removed {compaction.compact(conn)}")
+        except Exception as e:
+            logger.error(f"Compaction failed: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diet planner API server")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="API worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db.init_db()
+    sessions.KeyRing(sessions.SESSION_SECRET_KEYS).keys()
+    if args.workers > 1:
+        # Read by app.py in the worker processes, which inherit the environment
+        os.environ["FOOD_LOAD_ON_STARTUP"] = "0"
+        os.environ["COMPACTION_INTERVAL"] = "0"
+        threading.Thread(target=_background_jobs, name="background-jobs", daemon=True).start()
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Session cookies that survive restarts and work across worker processes.
+
+Cookies are signed with keys that every process shares:
+
+* ``SESSION_SECRET_KEYS`` (comma-separated, newest first) when set, else
+* the key file ``SESSION_KEY_FILE``, one key per line, newest first. The
+  first process to start creates it with a random key; processes re-read it
+  when it changes, so ``python sessions.py rotate`` takes effect without a
+  restart.
+
+New cookies are signed with the newest key and cookies signed with any of
+the others are still accepted, so rotation does not log anyone out. A key
+is dropped after ``SESSION_MAX_KEYS`` rotations; keep at least
+``SESSION_MAX_AGE`` between rotations and no live cookie depends on it.
+
+With ``SESSION_STORE=cookie`` (default) the session data is carried in the
+cookie itself, as with Starlette's SessionMiddleware. With
+``SESSION_STORE=sqlite`` the cookie only holds a signed random id and the
+data lives in the ``sessions`` table, so logging out revokes the session
+everywhere instead of just clearing the caller's cookie. A session gets a
+new id whenever it changes (e.g. at login). Expired rows are removed by
+compaction.
+"""
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from base64 import b64decode, b64encode
+
+import itsdangerous
+from itsdangerous.exc import BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.sessions import Session
+from starlette.requests import HTTPConnection
+
+import db
+
+# Configuration
+SESSION_SECRET_KEYS = [k.strip() for k in os.getenv("SESSION_SECRET_KEYS", "").split(",") if k.strip()]
+SESSION_KEY_FILE = os.getenv("SESSION_KEY_FILE", "data/session_keys")
+SESSION_MAX_KEYS = int(os.getenv("SESSION_MAX_KEYS", "3"))
+SESSION_STORE = os.getenv("SESSION_STORE", "cookie")  # cookie | sqlite
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", "3600"))
+KEY_RELOAD_INTERVAL = 5.0  # seconds between key file change checks
+
+
+def _new_key() -> str:
+    return secrets.token_hex(32)
+
+
+def _read_keys(path: str) -> list:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _write_keys(path: str, keys: list, replace: bool):
+    """Write a key file atomically; without ``replace`` an existing file wins"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write("".join(k + "\n" for k in keys))
+    if replace:
+        os.replace(tmp, path)
+        return
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass  # another process created it first
+    finally:
+        os.remove(tmp)
+
+
+def rotate(path: str = SESSION_KEY_FILE, max_keys: int = SESSION_MAX_KEYS) -> list:
+    """Put a new key in front of the key file, keeping ``max_keys`` keys"""
+    keys = _read_keys(path) if os.path.exists(path) else []
+    keys = [_new_key()] + keys[:max(max_keys - 1, 0)]
+    _write_keys(path, keys, replace=True)
+    return keys
+
+
+class KeyRing:
+    """Signing keys, newest first, from fixed keys or a key file"""
+
+    def __init__(self, keys=(), path: str = SESSION_KEY_FILE):
+        self.path = path
+        self._fixed = list(keys)
+        self._lock = threading.Lock()
+        self._keys = None
+        self._mtime = None
+        self._checked = 0.0
+        self._signer = None
+
+    def keys(self) -> list:
+        if self._fixed:
+            return self._fixed
+        now = time.monotonic()
+        if self._keys is None or now - self._checked >= KEY_RELOAD_INTERVAL:
+            with self._lock:
+                self._checked = now
+                self._load()
+        return self._keys
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            _write_keys(self.path, [_new_key()], replace=False)
+            mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime or self._keys is None:
+            keys = _read_keys(self.path)
+            if not keys:
+                raise RuntimeError(f"Session key file {self.path} has no keys")
+            self._keys = keys
+            self._mtime = mtime
+
+    def signer(self) -> itsdangerous.TimestampSigner:
+        """Signs with the newest key and verifies against all of them"""
+        keys = self.keys()
+        if self._signer is None or self._signer[0] is not keys:
+            # itsdangerous takes keys oldest first and signs with the last
+            self._signer = (keys, itsdangerous.TimestampSigner(list(reversed(keys))))
+        return self._signer[1]
+
+
+def load_session(conn, session_id: str):
+    row = conn.execute(
+        "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_session(conn, session_id: str, data: dict, expires_at: float):
+    conn.execute(
+        "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+        (session_id, json.dumps(data), expires_at),
+    )
+
+
+def delete_session(conn, session_id: str):
+    conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+def replace_session(conn, old_id, session_id, data: dict, expires_at: float):
+    if old_id:
+        delete_session(conn, old_id)
+    if session_id:
+        save_session(conn, session_id, data, expires_at)
+
+
+def purge_expired(conn) -> int:
+    return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class SessionMiddleware:
+    """Starlette's SessionMiddleware with rotating keys and an optional store"""
+
+    def __init__(self, app, keyring: KeyRing, store: str = SESSION_STORE,
+                 session_cookie: str = "session", max_age: int = SESSION_MAX_AGE,
+                 path: str = "/", same_site: str = "lax", https_only: bool = False):
+        if store not in ("cookie", "sqlite"):
+            raise ValueError(f"Unknown session store: {store}")
+        self.app = app
+        self.keyring = keyring
+        self.store = store
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+
+    async def _load(self, cookie: str):
+        """``(session id, data)`` for a cookie value; raises BadSignature"""
+        value = self.keyring.signer().unsign(cookie.encode("utf-8"), max_age=self.max_age)
+        if self.store == "cookie":
+            return None, json.loads(b64decode(value))
+        session_id = value.decode("utf-8")
+        data = await db.run(load_session, session_id)
+        if data is None:
+            raise BadSignature("Session expired or revoked")
+        return session_id, data
+
+    async def _persist(self, session_id, session: Session):
+        """Cookie value for a changed session (None once cleared)"""
+        if self.store == "cookie":
+            if not session:
+                return None
+            value = b64encode(json.dumps(session).encode("utf-8"))
+        else:
+            new_id = secrets.token_urlsafe(32) if session else None
+            await db.run(replace_session, session_id, new_id, dict(session),
+                         time.time() + self.max_age)
+            if new_id is None:
+                return None
+            value = new_id.encode("utf-8")
+        return self.keyring.signer().sign(value).decode("utf-8")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        session_id = None
+        initial_session_was_empty = True
+        scope["session"] = Session()
+        if self.session_cookie in connection.cookies:
+            try:
+                session_id, data = await self._load(connection.cookies[self.session_cookie])
+                scope["session"] = Session(data)
+                initial_session_was_empty = False
+            except (BadSignature, ValueError):
+                pass
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                headers = MutableHeaders(scope=message)
+                if session.accessed:
+                    headers.add_vary_header("Cookie")
+                if session.modified and (session or not initial_session_was_empty):
+                    value = await self._persist(session_id, session)
+                    if value is not None:
+                        headers.append("Set-Cookie", (
+                            f"{self.session_cookie}={value}; path={self.path}; "
+                            f"Max-Age={self.max_age}; {self.security_flags}"
+                        ))
+                    else:
+                        # The session has been cleared
+                        headers.append("Set-Cookie", (
+                            f"{self.session_cookie}=null; path={self.path}; "
+                            f"expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.security_flags}"
+                        ))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rotate"]:
+        sys.exit("usage: python sessions.py rotate")
+    if SESSION_SECRET_KEYS:
+        sys.exit("SESSION_SECRET_KEYS is set; rotate by prepending a key to it")
+    keys = rotate()
+    print(f"Rotated {SESSION_KEY_FILE}: {len(keys)} key(s), newest first")
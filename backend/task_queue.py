@@ -0,0 +1,358 @@
+"""Durable meal-plan task queue on top of the ``tasks`` table.
+
+A task moves pending -> running -> completed, or back to pending with a
+backoff delay when an attempt fails, until ``max_attempts`` is reached and
+it becomes failed. Follower tasks (batch members sharing another task's
+result) wait in 'waiting' and settle together with their leader. A running
+task is leased to one worker; the worker extends the lease with heartbeats,
+and a task whose lease expires (the worker crashed or was restarted) counts
+as a failed attempt: it is claimable again after the backoff delay, or
+fails once ``max_attempts`` is reached.
+
+Admission control bounds the queue: a user may have ``USER_MAX_ACTIVE``
+pending or running tasks and the server ``QUEUE_MAX_DEPTH`` pending ones;
+``admit`` raises ``QueueFull`` (with a Retry-After estimate) past either.
+Claims are fair across users: the next task goes to the user with the fewest
+running tasks (oldest task first among equals), skipping users at
+``USER_MAX_RUNNING``, and nothing is claimed while ``MAX_RUNNING`` tasks run.
+
+Every function takes a connection as its first argument so it can be used
+both from async handlers via ``db.run`` and from worker processes.
+"""
+import json
+import os
+import time
+
+VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", "120"))
+MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("TASK_RETRY_BASE_DELAY", "10"))
+RETRY_MAX_DELAY = 600.0
+LEASE_EXPIRED_ERROR = "Worker lease expired"
+# Admission: active (pending + running) tasks per user, pending tasks overall
+USER_MAX_ACTIVE = int(os.getenv("QUEUE_USER_MAX_ACTIVE", "5"))
+QUEUE_MAX_DEPTH = int(os.getenv("QUEUE_MAX_DEPTH", "200"))
+# Scheduling: running tasks per user and overall (0 means no limit)
+USER_MAX_RUNNING = int(os.getenv("QUEUE_USER_MAX_RUNNING", "2"))
+MAX_RUNNING = int(os.getenv("QUEUE_MAX_RUNNING", "0"))
+RETRY_AFTER_DEFAULT = 30.0  # seconds, until a task duration has been recorded
+RECENT_TASKS = 50  # completed tasks averaged for duration estimates
+
+# Pipeline stages a running task reports, in order
+STAGES = ("nutrition", "analysis", "meal_plan", "validation")
+
+
+class LeaseLost(Exception):
+    """The worker no longer owns the task it was processing."""
+
+
+class QueueFull(Exception):
+    """A task was refused by admission control.
+
+    ``scope`` is "user" or "server"; ``retry_after`` is the estimated
+    number of seconds until there is room.
+    """
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Queue full ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff after the given number of failed attempts"""
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def _recent_duration(conn):
+    """Mean run time of recently completed tasks, or None before the first"""
+    return conn.execute("""
+        SELECT AVG(total) FROM (
+            SELECT json_extract(timings, '$.total') AS total FROM tasks
+            WHERE status = 'completed'
+            ORDER BY updated_at DESC
+            LIMIT ?
+        )
+    """, (RECENT_TASKS,)).fetchone()[0]
+
+
+def _active_counts(conn, user_id: int):
+    """(pending tasks, running tasks, the user's pending or running tasks)"""
+    return conn.execute("""
+        SELECT COUNT(*) FILTER (WHERE status = 'pending'),
+               COUNT(*) FILTER (WHERE status = 'running'),
+               COUNT(*) FILTER (WHERE user_id = ?)
+        FROM tasks WHERE status IN ('pending', 'running')
+    """, (user_id,)).fetchone()
+
+
+def admit(conn, user_id: int, count: int = 1, per_user: bool = True):
+    """Check that ``count`` more tasks fit in the queue, or raise QueueFull.
+
+    Takes the database write lock, so admissions from any process are
+    serialized until the caller's enqueue commits.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    pending, running, user_active = _active_counts(conn, user_id)
+    if per_user and user_active + count > USER_MAX_ACTIVE:
+        scope, waits = "user", 1  # until one of the user's tasks finishes
+    elif pending + count > QUEUE_MAX_DEPTH:
+        # Pending tasks leave the queue at about ``running`` per task duration
+        scope, waits = "server", (pending + count - QUEUE_MAX_DEPTH) / max(running, 1)
+    else:
+        return
+    duration = _recent_duration(conn)
+    if duration is None:
+        retry_after = RETRY_AFTER_DEFAULT
+    else:
+        retry_after = min(max(duration * waits, 1.0), RETRY_MAX_DELAY)
+    raise QueueFull(scope, retry_after)
+
+
+def stats(conn, user_id: int = None) -> dict:
+    """Queue depth, limits and recent queue wait times"""
+    counts = dict(conn.execute(
+        "SELECT status, COUNT(*) FROM tasks WHERE status IN ('pending', 'running', 'waiting') "
+        "GROUP BY status"
+    ).fetchall())
+    oldest = conn.execute(
+        "SELECT MIN(available_at) FROM tasks WHERE status = 'pending' AND available_at <= ?",
+        (time.time(),),
+    ).fetchone()[0]
+    waits = sorted(row[0] for row in conn.execute("""
+        SELECT json_extract(timings, '$.queue_wait') AS wait FROM tasks
+        WHERE status = 'completed' AND wait IS NOT NULL
+        ORDER BY updated_at DESC
+        LIMIT ?
+    """, (RECENT_TASKS,)))
+    result = {
+        "pending": counts.get("pending", 0),
+        "running": counts.get("running", 0),
+        "waiting": counts.get("waiting", 0),
+        "oldest_pending_seconds": time.time() - oldest if oldest is not None else 0.0,
+        "queue_wait_seconds": {
+            "mean": sum(waits) / len(waits) if waits else None,
+            "p95": waits[int(0.95 * (len(waits) - 1))] if waits else None,
+        },
+        "limits": {
+            "user_max_active": USER_MAX_ACTIVE,
+            "queue_max_depth": QUEUE_MAX_DEPTH,
+            "user_max_running": USER_MAX_RUNNING,
+            "max_running": MAX_RUNNING,
+        },
+    }
+    if user_id is not None:
+        user_counts = dict(conn.execute("""
+            SELECT status, COUNT(*) FROM tasks
+            WHERE status IN ('pending', 'running') AND user_id = ?
+            GROUP BY status
+        """, (user_id,)).fetchall())
+        result["user"] = {
+            "pending": user_counts.get("pending", 0),
+            "running": user_counts.get("running", 0),
+        }
+    return result
+
+
+def enqueue(conn, task_id: str, user_id: int, params: dict, max_attempts: int = MAX_ATTEMPTS,
+            batch_id: str = None, batch_index: int = None):
+    conn.execute("""
+        INSERT INTO tasks (id, user_id, status, params, max_attempts, available_at, updated_at,
+                           batch_id, batch_index)
+        VALUES (?, ?, 'pending', ?, ?, ?, ?, ?, ?)
+    """, (task_id, user_id, json.dumps(params), max_attempts, time.time(), time.time(),
+          batch_id, batch_index))
+
+
+def enqueue_follower(conn, task_id: str, user_id: int, params: dict, leader_id: str,
+                     batch_id: str = None, batch_index: int = None):
+    """Record a task that shares the result of ``leader_id`` instead of running.
+
+    Followers stay 'waiting' (never claimed) until the leader completes or
+    finally fails.
+    """
+    conn.execute("""
+        INSERT INTO tasks (id, user_id, status, params, max_attempts, available_at, updated_at,
+                           leader_id, batch_id, batch_index)
+        VALUES (?, ?, 'waiting', ?, 0, ?, ?, ?, ?, ?)
+    """, (task_id, user_id, json.dumps(params), time.time(), time.time(),
+          leader_id, batch_id, batch_index))
+
+
+def enqueue_completed(conn, task_id: str, user_id: int, params: dict, result: dict,
+                      batch_id: str = None, batch_index: int = None):
+    """Record a task that was satisfied immediately, without a worker"""
+    conn.execute("""
+        INSERT INTO tasks (id, user_id, status, result, params, max_attempts, available_at, updated_at,
+                           batch_id, batch_index)
+        VALUES (?, ?, 'completed', ?, ?, 0, ?, ?, ?, ?)
+    """, (task_id, user_id, json.dumps(result), json.dumps(params), time.time(), time.time(),
+          batch_id, batch_index))
+
+
+def _expire_leases(conn, now: float):
+    """Count tasks whose worker stopped heartbeating as failed attempts"""
+    for task_id, attempts, max_attempts in conn.execute("""
+        SELECT id, attempts, max_attempts FROM tasks
+        WHERE status = 'running' AND lease_expires_at < ?
+    """, (now,)).fetchall():
+        _settle_attempt(conn, task_id, attempts, max_attempts, LEASE_EXPIRED_ERROR, now)
+
+
+def claim(conn, worker_id: str, lease_seconds: float = VISIBILITY_TIMEOUT):
+    """Atomically lease the next runnable task to ``worker_id``.
+
+    Runnable means pending and past its backoff delay. Tasks whose lease
+    has expired are first settled like a failed attempt: retried after the
+    backoff delay, or failed (with their followers) at ``max_attempts``.
+    The task comes from the user with the fewest running tasks, oldest
+    first, within the running limits. Returns the task as a dict, or None
+    if nothing can be claimed.
+    """
+    now = time.time()
+    _expire_leases(conn, now)
+    row = conn.execute("""
+        UPDATE tasks
+        SET status = 'running',
+            attempts = attempts + 1,
+            lease_owner = ?,
+            lease_expires_at = ?,
+            heartbeat_at = ?,
+            stage = NULL,
+            stage_started_at = NULL,
+            timings = json_object('queue_wait', ? - available_at),
+            updated_at = ?
+        WHERE id = (
+            WITH busy AS (
+                SELECT user_id, COUNT(*) AS n FROM tasks
+                WHERE status = 'running' AND lease_expires_at >= ?
+                GROUP BY user_id
+            )
+            SELECT t.id FROM tasks t LEFT JOIN busy ON busy.user_id = t.user_id
+            WHERE t.status = 'pending' AND t.available_at <= ?
+              AND (? <= 0 OR COALESCE(busy.n, 0) < ?)
+              AND (? <= 0 OR (SELECT COALESCE(SUM(n), 0) FROM busy) < ?)
+            ORDER BY COALESCE(busy.n, 0), t.available_at
+            LIMIT 1
+        )
+        RETURNING id, user_id, params, attempts, max_attempts
+    """, (worker_id, now + lease_seconds, now, now, now, now,
+          now, USER_MAX_RUNNING, USER_MAX_RUNNING, MAX_RUNNING, MAX_RUNNING)).fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "params": json.loads(row[2]) if row[2] else {},
+        "attempts": row[3],
+        "max_attempts": row[4],
+    }
+
+
+def heartbeat(conn, task_id: str, worker_id: str, lease_seconds: float = VISIBILITY_TIMEOUT) -> bool:
+    """Extend the lease; returns False if the worker has lost the task"""
+    now = time.time()
+    cur = conn.execute("""
+        UPDATE tasks
+        SET lease_expires_at = ?, heartbeat_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'running'
+    """, (now + lease_seconds, now, task_id, worker_id))
+    return cur.rowcount > 0
+
+
+# Adds the time spent in the stage being left to the ``timings`` JSON
+_CLOSE_STAGE = """
+    CASE WHEN stage IS NULL THEN COALESCE(timings, '{}')
+         ELSE json_set(COALESCE(timings, '{}'), '$.' || stage, ? - stage_started_at)
+    END
+"""
+
+
+def set_stage(conn, task_id: str, worker_id: str, stage: str) -> bool:
+    """Record the pipeline stage a running task has reached"""
+    now = time.time()
+    cur = conn.execute(f"""
+        UPDATE tasks
+        SET stage = ?, stage_started_at = ?, timings = {_CLOSE_STAGE}, updated_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'running'
+    """, (stage, now, now, now, task_id, worker_id))
+    return cur.rowcount > 0
+
+
+def complete(conn, task_id: str, worker_id: str, result: dict,
+             timings: dict = None, stage_ended_at: float = None) -> dict:
+    """Mark the task completed and return its per-stage timings (seconds).
+
+    The current stage is closed at ``stage_ended_at`` (default now) and
+    ``timings`` is merged into the recorded ones.
+    """
+    now = time.time()
+    row = conn.execute(f"""
+        UPDATE tasks
+        SET status = 'completed',
+            result = ?,
+            error = NULL,
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            timings = json_patch({_CLOSE_STAGE}, ?),
+            updated_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'running'
+        RETURNING timings
+    """, (json.dumps(result), stage_ended_at or now, json.dumps(timings or {}), now,
+          task_id, worker_id)).fetchone()
+    if row is None:
+        raise LeaseLost(task_id)
+    return json.loads(row[0])
+
+
+def followers(conn, leader_id: str) -> list:
+    """(task id, user id) of the tasks waiting on ``leader_id``"""
+    return conn.execute(
+        "SELECT id, user_id FROM tasks WHERE leader_id = ? AND status = 'waiting'",
+        (leader_id,),
+    ).fetchall()
+
+
+def complete_follower(conn, task_id: str, result: dict):
+    conn.execute("""
+        UPDATE tasks
+        SET status = 'completed', result = ?, updated_at = ?
+        WHERE id = ? AND status = 'waiting'
+    """, (json.dumps(result), time.time(), task_id))
+
+
+def _settle_attempt(conn, task_id: str, attempts: int, max_attempts: int,
+                    error: str, now: float) -> str:
+    """Reschedule a task after a failed attempt, or fail it and its followers"""
+    new_status = "pending" if attempts < max_attempts else "failed"
+    conn.execute("""
+        UPDATE tasks
+        SET status = ?,
+            error = ?,
+            available_at = ?,
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            updated_at = ?
+        WHERE id = ?
+    """, (new_status, error, now + retry_delay(attempts), now, task_id))
+    if new_status == "failed":
+        conn.execute("""
+            UPDATE tasks
+            SET status = 'failed', error = ?, updated_at = ?
+            WHERE leader_id = ? AND status = 'waiting'
+        """, (error, now, task_id))
+    return new_status
+
+
+def fail(conn, task_id: str, worker_id: str, error: str) -> str:
+    """Record a failed attempt; reschedule with backoff or mark failed.
+
+    Returns the task's new status.
+    """
+    row = conn.execute("""
+        SELECT attempts, max_attempts FROM tasks
+        WHERE id = ? AND lease_owner = ? AND status = 'running'
+    """, (task_id, worker_id)).fetchone()
+    if not row:
+        raise LeaseLost(task_id)
+    return _settle_attempt(conn, task_id, row[0], row[1], error, time.time())
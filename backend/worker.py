@@ -0,0 +1,174 @@
+"""Meal-plan worker: claims tasks from the durable queue and runs the crew.
+
+Start as many processes as the box can handle, independently of the API:
+
+    python worker.py --concurrency 2
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import signal
+import socket
+import time
+
+import batches
+import db
+import metrics
+import plan_cache
+import plan_drafts
+import plan_model
+import plan_store
+import task_queue
+from agents import GENERATION_MAX_WORKERS, generate_meal_plan
+
+# Configuration
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+HEARTBEAT_INTERVAL = task_queue.VISIBILITY_TIMEOUT / 3
+
+logger = logging.getLogger(__name__)
+
+
+def save_meal_plan(conn, content: str) -> str:
+    """Store meal plan content and return its reference"""
+    try:
+        with metrics.span("plan_store_duration_seconds", operation="save"):
+            return plan_store.save(conn, content)
+    except IOError as e:
+        logger.error(f"Failed to save meal plan: {str(e)}")
+        raise
+
+
+def _record_completed_plan(conn, task_id: str, worker_id: str, user_id: int,
+                           file_path: str, cache_key: str = None,
+                           timings: dict = None, stage_ended_at: float = None):
+    """Complete the task (and its followers); returns the task's timings"""
+    plan_id = db.record_meal_plan(conn, user_id, file_path)
+    # Raises LeaseLost (rolling back the insert) if another worker took over
+    timings = task_queue.complete(conn, task_id, worker_id,
+                                  {"plan_id": plan_id, "file_path": file_path},
+                                  timings, stage_ended_at)
+    # Batch members grouped with this task get the same plan
+    batches.complete_followers(conn, task_id, file_path)
+    if cache_key:
+        plan_cache.store(conn, cache_key, file_path)
+    # The stored plan supersedes the streamed draft
+    plan_drafts.clear(conn, task_id)
+    return timings
+
+
+def _store_completed_plan(conn, task_id: str, worker_id: str, user_id: int,
+                          content: str, cache_key: str, started_at: float):
+    crew_ended_at = time.time()
+    file_path = save_meal_plan(conn, content)
+    plan_model.index(conn, file_path, content)
+    timings = {"save": time.time() - crew_ended_at, "total": time.time() - started_at}
+    return _record_completed_plan(conn, task_id, worker_id, user_id, file_path, cache_key,
+                                  timings, crew_ended_at)
+
+
+def _observe_timings(timings: dict):
+    for stage, seconds in timings.items():
+        metrics.observe("pipeline_stage_duration_seconds", seconds, stage=stage)
+
+
+def report_stage(task_id: str, worker_id: str, stage: str):
+    """Stage callback for the crew; runs on the generation pool"""
+    with db.get_pool().connection() as conn:
+        task_queue.set_stage(conn, task_id, worker_id, stage)
+
+
+async def _heartbeat(task_id: str, worker_id: str):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        if not await db.run(task_queue.heartbeat, task_id, worker_id):
+            logger.warning(f"Lost lease on task {task_id}")
+            return
+
+
+async def process_task(task: dict, worker_id: str):
+    started_at = time.time()
+    heartbeat = asyncio.create_task(_heartbeat(task["id"], worker_id))
+    try:
+        # An identical request may have finished while this one was queued
+        cache_key = plan_cache.request_key(task["params"])
+        file_path = await db.run(plan_cache.lookup, cache_key, False)
+        if file_path:
+            timings = await db.run(_record_completed_plan, task["id"], worker_id,
+                                   task["user_id"], file_path)
+            _observe_timings(timings)
+            return
+
+        result = await generate_meal_plan(
+            task["params"],
+            functools.partial(report_stage, task["id"], worker_id),
+            plan_drafts.DraftWriter(task["id"], task["attempts"]),
+        )
+        timings = await db.run(_store_completed_plan, task["id"], worker_id, task["user_id"],
+                               result, cache_key, started_at)
+        _observe_timings(timings)
+    except task_queue.LeaseLost:
+        logger.warning(f"Discarding result of task {task['id']}: lease lost")
+    except Exception as e:
+        logger.error(f"Task {task['id']} attempt {task['attempts']} failed: {str(e)}")
+        try:
+            status = await db.run(task_queue.fail, task["id"], worker_id, str(e))
+            logger.info(f"Task {task['id']} is now {status}")
+        except task_queue.LeaseLost:
+            pass
+    finally:
+        heartbeat.cancel()
+
+
+async def worker_loop(worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            task = await db.run(task_queue.claim, worker_id)
+        except Exception:
+            # e.g. "database is locked"; the next poll retries
+            logger.exception(f"Worker {worker_id} failed to claim a task")
+            task = None
+        if task is None:
+            try:
+                await asyncio.wait_for(stop.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process_task(task, worker_id)
+
+
+async def run_workers(concurrency: int, stop: asyncio.Event):
+    """Run ``concurrency`` claim loops; returns once ``stop`` is set"""
+    base = f"{socket.gethostname()}-{os.getpid()}"
+    await asyncio.gather(*(
+        worker_loop(f"{base}-{i}", stop) for i in range(concurrency)
+    ))
+
+
+async def _main(concurrency: int):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info(f"Worker {os.getpid()} started with concurrency {concurrency}")
+    await run_workers(concurrency, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Meal-plan queue worker")
+    parser.add_argument("--concurrency", type=int, default=GENERATION_MAX_WORKERS,
+                        help="tasks processed at once by this process")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve this process's /metrics on the given port")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db.init_db()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    asyncio.run(_main(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,29 +7,34 @@ export default function Dashboard() {
   const [plans, setPlans] = useState<{ id: string; date: string }[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  // Keyset cursor for the next (older) page, null when there is none
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const router = useRouter();
 
-  useEffect(() => {
-    const fetchPlans = async () => {
-      try {
-        const res = await fetch('/api/meal-plans', { credentials: 'include' });
-        if (res.status === 401) {
-          router.push('/login');
-          return;
-        }
-        if (res.ok) {
-          const data = await res.json();
-          setPlans(data);
-        } else {
-          setError('Failed to fetch meal plans.');
-        }
-      } catch (err) {
-        setError('An error occurred. Please try again.');
-      } finally {
-        setLoading(false);
+  const fetchPlans = async (before: string | null) => {
+    try {
+      const url = before ? `/api/meal-plans?before=${before}` : '/api/meal-plans';
+      const res = await fetch(url, { credentials: 'include' });
+      if (res.status === 401) {
+        router.push('/login');
+        return;
+      }
+      if (res.ok) {
+        const data = await res.json();
+        setPlans((prev) => (before ? [...prev, ...data] : data));
+        setNextCursor(res.headers.get('X-Next-Cursor'));
+      } else {
+        setError('Failed to fetch meal plans.');
       }
-    };
-    fetchPlans();
+    } catch (err) {
+      setError('An error occurred. Please try again.');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
+    fetchPlans(null);
   }, [router]);
 
   if (loading) {
@@ -59,6 +64,14 @@ export default function Dashboard() {
           ))}
         </ul>
       )}
+      {nextCursor && (
+        <button
+          className="mt-4 text-blue-500 hover:underline"
+          onClick={() => fetchPlans(nextCursor)}
+        >
+          Load older plans
+        </button>
+      )}
     </div>
   );
 }
\ No newline at end of file
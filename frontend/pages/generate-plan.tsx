@@ -55,6 +55,35 @@ export default function GeneratePlan() {
     fetchFoods();
   }, [fetchFoods]);
 
+  const [foodQuery, setFoodQuery] = useState('');
+  const [matches, setMatches] = useState<Set<string> | null>(null);
+
+  useEffect(() => {
+    const q = foodQuery.trim();
+    if (!q) {
+      setMatches(null);
+      return;
+    }
+    // Server-side ranked, typo-tolerant search; debounced per keystroke
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(`/api/foods/search?q=${encodeURIComponent(q)}&limit=50`, {
+          signal: controller.signal
+        });
+        if (!res.ok) return;
+        const data: FoodItem[] = await res.json();
+        setMatches(new Set(data.map(f => f.name)));
+      } catch {
+        // Aborted by a newer query
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [foodQuery]);
+
   const handleFoodToggle = (category: string, food: string) => {
     setSelectedFoods(prev => ({
       ...prev,
@@ -64,36 +93,47 @@ export default function GeneratePlan() {
     }));
   };
 
-  const checkTaskStatus = useCallback(async (taskId: string) => {
-    try {
-      const res = await fetch(`/api/tasks/${taskId}`);
-      if (!res.ok) throw new Error('Status check failed');
-      
-      const data = await res.json();
-      
+  const [stage, setStage] = useState<string | null>(null);
+  const [draft, setDraft] = useState<{ [day: number]: string }>({});
+
+  useEffect(() => {
+    if (!taskId || !loading) return;
+
+    // Task progress is pushed by the server instead of polled
+    const events = new EventSource(`/api/tasks/${taskId}/events`, { withCredentials: true });
+    // Plan text streams in per day while the meal plan stage runs
+    events.addEventListener('delta', (e) => {
+      const { day, text } = JSON.parse((e as MessageEvent).data);
+      setDraft(prev => ({ ...prev, [day]: (prev[day] || '') + text }));
+    });
+    events.addEventListener('reset', () => setDraft({}));
+    events.addEventListener('status', (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      setStage(data.stage);
+
       if (data.status === 'completed') {
+        events.close();
         router.push(`/plan/${data.result.plan_id}`);
       } else if (data.status === 'failed') {
+        events.close();
         setError(data.error || 'Meal plan generation failed');
         setLoading(false);
       }
-    } catch (err) {
-      setError('Failed to check task status');
-      setLoading(false);
-    }
-  }, [router]);
-
-  useEffect(() => {
-    if (!taskId || !loading) return;
-
-    const interval = setInterval(() => checkTaskStatus(taskId), 2000);
-    return () => clearInterval(interval);
-  }, [taskId, loading, checkTaskStatus]);
+    });
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        setError('Failed to check task status');
+        setLoading(false);
+      }
+    };
+    return () => events.close();
+  }, [taskId, loading, router]);
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
     setError('');
+    setDraft({});
 
     try {
       const res = await fetch('/api/generate-meal-plan', {
@@ -109,8 +149,13 @@ export default function GeneratePlan() {
         })
       });
 
+      if (res.status === 429) {
+        const retryAfter = res.headers.get('Retry-After');
+        const { detail } = await res.json();
+        throw new Error(`${detail}. Try again in ${retryAfter ?? 'a few'} seconds.`);
+      }
       if (!res.ok) throw new Error('Failed to start generation');
-      
+
       const data = await res.json();
       setTaskId(data.task_id);
     } catch (err) {
@@ -177,7 +222,17 @@ export default function GeneratePlan() {
         </div>
 
         <Card className="p-6 bg-white rounded-xl shadow-sm">
-          {Object.entries(foods).map(([category, items]) => (
+          <input
+            type="search"
+            value={foodQuery}
+            onChange={(e) => setFoodQuery(e.target.value)}
+            className="w-full p-3 mb-6 border rounded-lg focus:ring-2 focus:ring-green-500 focus:border-transparent"
+            placeholder="Search foods, e.g. zucchina or chicken"
+          />
+          {Object.entries(foods).map(([category, allItems]) => {
+            const items = matches ? allItems.filter(f => matches.has(f.name)) : allItems;
+            if (items.length === 0) return null;
+            return (
             <div key={category} className="mb-8">
               <h3 className="text-lg font-medium text-gray-700 mb-4 capitalize">
                 {category.replace('_', ' ')}
@@ -199,7 +254,8 @@ export default function GeneratePlan() {
                 ))}
               </div>
             </div>
-          ))}
+            );
+          })}
         </Card>
 
         <div className="space-y-4">
@@ -211,7 +267,7 @@ export default function GeneratePlan() {
             {loading ? (
               <div className="flex items-center justify-center gap-2">
                 <Loader />
-                Generating Plan...
+                {stage ? `Generating Plan (${stage.replace('_', ' ')})...` : 'Generating Plan...'}
               </div>
             ) : (
               'Generate My Plan'
@@ -223,6 +279,17 @@ export default function GeneratePlan() {
               {error}
             </div>
           )}
+
+          {Object.keys(draft).length > 0 && (
+            <Card className="p-6 bg-white rounded-xl shadow-sm space-y-6">
+              {Object.entries(draft).map(([day, text]) => (
+                <div key={day}>
+                  <h3 className="text-lg font-medium text-gray-700 mb-2">Day {day}</h3>
+                  <pre className="whitespace-pre-wrap font-sans text-gray-700">{text}</pre>
+                </div>
+              ))}
+            </Card>
+          )}
         </div>
       </form>
     </div>
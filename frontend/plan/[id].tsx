@@ -3,8 +3,16 @@ import { useState, useEffect } from 'react';
 import { useRouter } from 'next/router';
 import ReactMarkdown from 'react-markdown';
 
+type Totals = { carbs: number; protein: number; fat: number; energy: number } | null;
+
+type PlanDays = {
+  days: { day: number; totals: Totals }[];
+  daily_average: Totals;
+};
+
 export default function Plan() {
   const [plan, setPlan] = useState('');
+  const [days, setDays] = useState<PlanDays | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const router = useRouter();
@@ -23,6 +31,9 @@ export default function Plan() {
         if (res.ok) {
           const data = await res.json();
           setPlan(data.plan);
+          // Totals are precomputed server-side; the plan renders without them
+          const daysRes = await fetch(`/api/meal-plans/${id}/days`, { credentials: 'include' });
+          if (daysRes.ok) setDays(await daysRes.json());
         } else {
           setError('Failed to fetch meal plan.');
         }
@@ -46,6 +57,30 @@ export default function Plan() {
   return (
     <div>
       <h1 className="text-3xl font-bold mb-6">Meal Plan</h1>
+      {days?.daily_average && (
+        <table className="mb-6 text-sm">
+          <thead>
+            <tr>
+              <th className="pr-4 text-left">Day</th>
+              <th className="pr-4 text-right">kcal</th>
+              <th className="pr-4 text-right">Carbs (g)</th>
+              <th className="pr-4 text-right">Protein (g)</th>
+              <th className="text-right">Fat (g)</th>
+            </tr>
+          </thead>
+          <tbody>
+            {[...days.days, { day: 'Average', totals: days.daily_average }].map(({ day, totals }) => (
+              <tr key={day}>
+                <td className="pr-4">{day}</td>
+                <td className="pr-4 text-right">{totals?.energy ?? '-'}</td>
+                <td className="pr-4 text-right">{totals?.carbs ?? '-'}</td>
+                <td className="pr-4 text-right">{totals?.protein ?? '-'}</td>
+                <td className="text-right">{totals?.fat ?? '-'}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      )}
       <div className="prose max-w-none">
         <ReactMarkdown>{plan}</ReactMarkdown>
       </div>
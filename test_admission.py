@@ -0,0 +1,103 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import task_queue
+
+
+class TestAdmission(unittest.TestCase):
+    """
+    Test cases for queue admission limits and fair task claiming.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        self.count = 0
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _enqueue(self, user_id, n=1):
+        with db.get_pool().connection() as conn:
+            for _ in range(n):
+                self.count += 1
+                task_queue.admit(conn, user_id)
+                task_queue.enqueue(conn, f"t{self.count}", user_id, {})
+
+    def _claim(self, worker="w"):
+        with db.get_pool().connection() as conn:
+            task = task_queue.claim(conn, worker)
+        return task and task["user_id"]
+
+    def test_per_user_and_global_limits(self):
+        """
+        Past a user's active limit or the queue depth, admission raises QueueFull.
+        """
+        with mock.patch.multiple(task_queue, USER_MAX_ACTIVE=2, QUEUE_MAX_DEPTH=3):
+            self._enqueue(1, 2)
+            with self.assertRaises(task_queue.QueueFull) as e:
+                self._enqueue(1)
+            self.assertEqual(e.exception.scope, "user")
+            self.assertEqual(e.exception.retry_after, task_queue.RETRY_AFTER_DEFAULT)
+
+            self._enqueue(2)
+            with self.assertRaises(task_queue.QueueFull) as e:
+                self._enqueue(3)
+            self.assertEqual(e.exception.scope, "server")
+
+        with db.get_pool().connection() as conn:
+            stats = task_queue.stats(conn, 1)
+        self.assertEqual((stats["pending"], stats["user"]["pending"]), (3, 2))
+
+    def test_retry_after_uses_recent_durations(self):
+        """
+        Retry-After follows the run time of recently completed tasks.
+        """
+        self._enqueue(1)
+        self.assertEqual(self._claim(), 1)
+        with db.get_pool().connection() as conn:
+            task_queue.complete(conn, "t1", "w", {}, {"total": 40.0})
+        with mock.patch.object(task_queue, "USER_MAX_ACTIVE", 1):
+            self._enqueue(1)
+            with self.assertRaises(task_queue.QueueFull) as e:
+                self._enqueue(1)
+        self.assertEqual(e.exception.retry_after, 40.0)
+
+    def test_claims_alternate_between_users(self):
+        """
+        A user with a backlog does not hold back another user's task.
+        """
+        with mock.patch.object(task_queue, "USER_MAX_ACTIVE", 10):
+            self._enqueue(1, 4)
+            self._enqueue(2)
+        with mock.patch.object(task_queue, "USER_MAX_RUNNING", 2):
+            self.assertEqual([self._claim() for _ in range(4)], [1, 2, 1, None])
+        with db.get_pool().connection() as conn:
+            waits = [json.loads(r[0])["queue_wait"] for r in conn.execute(
+                "SELECT timings FROM tasks WHERE status = 'running'"
+            )]
+        self.assertEqual(len(waits), 3)
+
+    def test_global_running_limit(self):
+        """
+        Nothing is claimed while MAX_RUNNING tasks are running.
+        """
+        with mock.patch.object(task_queue, "USER_MAX_ACTIVE", 10):
+            self._enqueue(1, 3)
+        with mock.patch.multiple(task_queue, MAX_RUNNING=2, USER_MAX_RUNNING=0):
+            self.assertEqual([self._claim() for _ in range(3)], [1, 1, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND)
+
+import db
+import plan_model
+
+CONFIG = """\
+ai_model: {provider: openai, model_name: gpt-4o-mini, temperature: 0.2}
+storage: {meal_plans_dir: data/meal_plans}
+"""
+
+# agents.py reads config.yaml from the working directory on import
+_config_dir = tempfile.TemporaryDirectory()
+with open(os.path.join(_config_dir.name, "config.yaml"), "w") as f:
+    f.write(CONFIG)
+_cwd = os.getcwd()
+os.chdir(_config_dir.name)
+try:
+    import agents
+finally:
+    os.chdir(_cwd)
+
+USER_INPUTS = {
+    "age": 30, "weight": 80.0, "height": 180, "goal": "lose weight",
+    "food_preferences": {}, "sex": None, "activity_level": None,
+}
+
+
+def tearDownModule():
+    _config_dir.cleanup()
+
+
+class StubCrew:
+    """Template crew whose copies answer with ``respond(inputs)``"""
+
+    def __init__(self, respond):
+        self.tasks = [SimpleNamespace(description="Day {day}")]
+        self.respond = respond
+
+    def copy(self):
+        return self
+
+    def kickoff(self, inputs):
+        return SimpleNamespace(raw=self.respond(inputs))
+
+
+class TestDayGeneration(unittest.TestCase):
+    """
+    Test cases for generating and validating the days of a plan concurrently.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _day(self, prefix, fail_day=None):
+        def respond(inputs):
+            day = inputs["day"]
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            try:
+                # Later days finish first
+                time.sleep((8 - day) * 0.01)
+                if day == fail_day:
+                    raise RuntimeError(f"day {day} failed")
+                return f"{prefix} {day}"
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return respond
+
+    def _crews(self, fail_day=None):
+        return {
+            "analysis": StubCrew(lambda inputs: "analysis"),
+            "meal_plan": StubCrew(self._day("Plan for day", fail_day)),
+            "validation": StubCrew(self._day("PASS day")),
+        }
+
+    def test_days_merged_in_order(self):
+        """
+        Days finishing out of order are merged, and reported, in day order.
+        """
+        stages, deltas = [], []
+        with mock.patch.object(agents, "get_crews", return_value=self._crews()):
+            plan = agents.run_crew(USER_INPUTS, stages.append,
+                                   lambda day, text: deltas.append((day, text)))
+
+        parsed = plan_model.parse(plan)
+        self.assertEqual(list(parsed), list(range(1, 8)))
+        self.assertEqual([d["text"] for d in parsed.values()],
+                         [f"Plan for day {day}" for day in range(1, 8)])
+        self.assertEqual([d["report"] for d in parsed.values()],
+                         [f"PASS day {day}" for day in range(1, 8)])
+        self.assertEqual(stages, ["nutrition", "analysis", "meal_plan", "validation"])
+        self.assertEqual(sorted(deltas, key=lambda d: (d[0], d[1] is None)),
+                         [d for day in range(1, 8)
+                          for d in ((day, f"Plan for day {day}"), (day, None))])
+        self.assertGreater(self.max_running, 1)
+
+    def test_failing_day_propagates(self):
+        """
+        An error in any one day fails the whole plan.
+        """
+        with mock.patch.object(agents, "get_crews", return_value=self._crews(fail_day=3)):
+            with self.assertRaisesRegex(RuntimeError, "day 3 failed"):
+                agents.run_crew(USER_INPUTS)
+
+    def test_crew_runs_capped_across_plans(self):
+        """
+        Concurrent plans share the process-wide cap on day runs.
+        """
+        errors = []
+
+        def generate():
+            try:
+                agents.run_crew(USER_INPUTS)
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(agents, "get_crews", return_value=self._crews()), \
+                mock.patch.object(agents, "_crew_run_slots", threading.BoundedSemaphore(3)):
+            threads = [threading.Thread(target=generate) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.max_running, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
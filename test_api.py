@@ -0,0 +1,393 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+os.environ.setdefault("SESSION_SECRET_KEYS", "test-session-key")
+
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+import app
+import db
+import food_cache
+import plan_drafts
+import security
+import task_queue
+
+PASSWORD = "correct horse"
+
+
+class ApiTestCase(unittest.TestCase):
+    """
+    Base fixture: a fresh database and a client, without the startup hooks.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        app.user_cache.clear()
+        food_cache._catalog = None
+        # Minimum bcrypt cost keeps logins fast
+        self.fast_hash = mock.patch.object(
+            security, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+        self.fast_hash.start()
+        self.client = TestClient(app.app)
+
+    def tearDown(self):
+        self.client.close()
+        food_cache._catalog = None
+        self.fast_hash.stop()
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _call(self, fn, *args):
+        with db.get_pool().connection() as conn:
+            return fn(conn, *args)
+
+    def _login(self, username="alice", client=None) -> int:
+        client = client or self.client
+        client.post("/api/register", json={"username": username, "password": PASSWORD})
+        response = client.post("/api/login", json={"username": username, "password": PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        return self._call(lambda conn: conn.execute(
+            "SELECT id FROM users WHERE username = ?", (username,)
+        ).fetchone()[0])
+
+
+class TestMealPlanListing(ApiTestCase):
+    """
+    Test cases for the keyset-paginated plan history.
+    """
+
+    def _plan(self, user_id, date):
+        return self._call(lambda conn: conn.execute(
+            "INSERT INTO meal_plans (user_id, date, file_path) VALUES (?, ?, 'blob:x')",
+            (user_id, date),
+        ).lastrowid)
+
+    def _page(self, **params):
+        response = self.client.get("/api/meal-plans", params=params)
+        self.assertEqual(response.status_code, 200)
+        return [p["id"] for p in response.json()], response.headers.get("X-Next-Cursor")
+
+    def test_pages_newest_first(self):
+        """
+        Plans come newest first, ties by id, with a cursor while more remain.
+        """
+        user_id = self._login()
+        ids = [self._plan(user_id, date) for date in (
+            "2024-01-01 08:00:00", "2024-01-03 08:00:00", "2024-01-02 08:00:00",
+            "2024-01-03 08:00:00", "2024-01-03 08:00:00",
+        )]
+        expected = [ids[4], ids[3], ids[1], ids[2], ids[0]]
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = self._page(limit=2, **({"before": cursor} if cursor else {}))
+            seen += page
+            if cursor is None:
+                break
+            self.assertEqual(cursor, str(page[-1]))
+        self.assertEqual(seen, expected)
+
+        response = self.client.get("/api/meal-plans", params={"limit": 2})
+        self.assertIn(f"before={expected[1]}", response.headers["Link"])
+        self.assertEqual(self._page(), (expected, None))
+
+    def test_foreign_and_unknown_cursors(self):
+        """
+        A cursor naming another user's plan, or no plan, yields an empty page.
+        """
+        other = self._login("bob")
+        foreign = self._plan(other, "2030-01-01 00:00:00")
+        user_id = self._login()
+        self._plan(user_id, "2024-01-01 00:00:00")
+
+        self.assertEqual(len(self._page()[0]), 1)
+        self.assertEqual(self._page(before=foreign), ([], None))
+        self.assertEqual(self._page(before=foreign + 100), ([], None))
+        for limit in (0, app.MEAL_PLANS_MAX_PAGE_SIZE + 1):
+            self.assertEqual(self.client.get("/api/meal-plans", params={"limit": limit})
+                             .status_code, 422)
+
+
+FOODS = [
+    ("Pollo (Chicken Breast)", "100g", "proteins"),
+    ("Mela (Apple)", "1 medium", "fruits"),
+    ("Tacchino (Turkey Breast)", "100g", "proteins"),
+    ("Pera (Pear)", "1 medium", "Fruits"),
+    ("Salmone (Salmon)", "100g", "proteins"),
+]
+
+
+class TestFoodDb(ApiTestCase):
+    """
+    Test cases for the cached food listing: ETags, gzip, filters and paging.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self._call(lambda conn: conn.executemany(
+            "INSERT INTO foods (name, portion, category, carbs, protein, fat) "
+            "VALUES (?, ?, ?, 1, 2, 3)", FOODS
+        ))
+
+    def _get(self, headers=None, **params):
+        return self.client.get("/api/food-db", params=params, headers=headers or {})
+
+    def _page(self, **params):
+        response = self._get(**params)
+        self.assertEqual(response.status_code, 200)
+        return [f["id"] for f in response.json()], response.headers.get("X-Next-Cursor")
+
+    def test_etag_not_modified(self):
+        """
+        Repeating a request with its ETag returns 304 with an empty body.
+        """
+        for params in ({}, {"category": "proteins", "limit": 2}):
+            response = self._get(**params)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers["ETag"]
+            for tag in (etag, f'"other", {etag}', "*"):
+                again = self._get(headers={"If-None-Match": tag}, **params)
+                self.assertEqual((again.status_code, again.content), (304, b""))
+                self.assertEqual(again.headers["ETag"], etag)
+            self.assertEqual(self._get(headers={"If-None-Match": '"other"'}, **params)
+                             .status_code, 200)
+        self.assertNotEqual(self._get().headers["ETag"],
+                            self._get(category="proteins").headers["ETag"])
+
+    def test_precompressed_body(self):
+        """
+        Clients accepting gzip get the catalog's precompressed full listing.
+        """
+        with self.client.stream("GET", "/api/food-db",
+                                headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(raw, food_cache._catalog.gzip_body)
+        foods = [(f["name"], f["portion"], f["category"]) for f in
+                 json.loads(gzip.decompress(raw))]
+        self.assertEqual(foods, FOODS)
+
+        response = self._get(headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.content, food_cache._catalog.body)
+
+    def test_filters(self):
+        """
+        Category matches case-insensitively; q matches name substrings.
+        """
+        self.assertEqual(self._page(category="FRUITS"), ([2, 4], None))
+        self.assertEqual(self._page(q="breast"), ([1, 3], None))
+        self.assertEqual(self._page(category="proteins", q="SALM"), ([5], None))
+        self.assertEqual(self._page(category="dairy"), ([], None))
+
+    def test_keyset_paging(self):
+        """
+        Pages continue after the cursor; the cursor is only sent when more rows follow.
+        """
+        self.assertEqual(self._page(limit=2), ([1, 2], "2"))
+        self.assertEqual(self._page(limit=2, after=2), ([3, 4], "4"))
+        self.assertEqual(self._page(limit=2, after=4), ([5], None))
+        self.assertEqual(self._page(limit=5), ([1, 2, 3, 4, 5], None))
+        self.assertEqual(self._page(category="proteins", limit=1, after=1), ([3], "3"))
+        self.assertEqual(self._page(after=3), ([4, 5], None))
+        self.assertIn("after=2", self._get(limit=2).headers["Link"])
+
+    def test_invalidated_on_change(self):
+        """
+        Changing foods moves the ETag on, so a stale ETag gets the new listing.
+        """
+        etag = self._get().headers["ETag"]
+        self._call(lambda conn: conn.execute(
+            "INSERT INTO foods (name, portion, category, carbs, protein, fat) "
+            "VALUES ('Riso (Rice)', '100g', 'carbs', 28, 2.7, 0.3)"
+        ))
+        response = self._get(headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json()[-1]["name"], "Riso (Rice)")
+
+        self._call(lambda conn: conn.execute("DELETE FROM foods WHERE name LIKE 'Mela%'"))
+        self.assertEqual(self._page(category="fruits"), ([4], None))
+
+
+class TestAuthentication(ApiTestCase):
+    """
+    Test cases for the session user cache and off-loop password hashing.
+    """
+
+    def _user_queries(self, fetch_one):
+        return [c for c in fetch_one.call_args_list if "FROM users" in c.args[0]]
+
+    def test_user_served_from_cache(self):
+        """
+        Authenticated requests after login do not query the users table.
+        """
+        user_id = self._login()
+        with mock.patch.object(db, "fetch_one", wraps=db.fetch_one) as fetch_one:
+            for _ in range(2):
+                self.assertEqual(self.client.get("/api/queue/stats").status_code, 200)
+            self.assertEqual(self._user_queries(fetch_one), [])
+
+            # An evicted entry is loaded once, then cached again
+            app.user_cache.invalidate(user_id)
+            for _ in range(2):
+                self.assertEqual(self.client.get("/api/queue/stats").status_code, 200)
+            self.assertEqual(len(self._user_queries(fetch_one)), 1)
+        self.assertEqual(app.user_cache.get(user_id), {"id": user_id, "username": "alice"})
+
+    def test_logout_evicts(self):
+        """
+        Logging out drops the cached user and ends the session.
+        """
+        user_id = self._login()
+        self.assertIsNotNone(app.user_cache.get(user_id))
+        self.assertEqual(self.client.post("/api/logout").status_code, 200)
+        self.assertIsNone(app.user_cache.get(user_id))
+        self.assertEqual(self.client.get("/api/queue/stats").status_code, 401)
+
+    def test_password_hash_round_trip(self):
+        """
+        Async hashing and verification agree, and run on the bcrypt threads.
+        """
+        threads = []
+        real_hash = security.get_password_hash
+
+        def get_password_hash(password):
+            threads.append(threading.current_thread().name)
+            return real_hash(password)
+
+        async def round_trip():
+            with mock.patch.object(security, "get_password_hash", get_password_hash):
+                hashed = await security.get_password_hash_async(PASSWORD)
+            return (hashed,
+                    await security.verify_password_async(PASSWORD, hashed),
+                    await security.verify_password_async("wrong horse", hashed))
+
+        hashed, right, wrong = asyncio.run(round_trip())
+        self.assertNotEqual(hashed, PASSWORD)
+        self.assertEqual((right, wrong), (True, False))
+        self.assertTrue(threads[0].startswith("bcrypt"))
+
+
+def parse_events(text: str) -> list:
+    """``(id, event, data)`` of each event in an SSE body, comments skipped"""
+    events = []
+    for block in text.split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if not line.startswith(":")
+        )
+        if fields:
+            events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestTaskEvents(ApiTestCase):
+    """
+    Test cases for the task event stream.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = self._login()
+        self.poll = mock.patch.object(app, "TASK_EVENTS_POLL_INTERVAL", 0)
+        self.poll.start()
+
+    def tearDown(self):
+        self.poll.stop()
+        super().tearDown()
+
+    def _stream(self, steps=(), last_event_id=None):
+        """Events of one connection, applying one step to the task per poll"""
+        steps = list(steps)
+        real_since = plan_drafts.since
+
+        def since(conn, task_id, after_id):
+            if steps:
+                steps.pop(0)(conn)
+            return real_since(conn, task_id, after_id)
+
+        headers = {"Last-Event-ID": str(last_event_id)} if last_event_id else {}
+        with mock.patch.object(plan_drafts, "since", since):
+            response = self.client.get("/api/tasks/t1/events", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(steps, [])
+        return parse_events(response.text)
+
+    def _states(self, events):
+        return [(e[2]["status"], e[2]["stage"]) for e in events if e[1] == "status"]
+
+    def _enqueue(self, max_attempts=3):
+        self._call(task_queue.enqueue, "t1", self.user_id, {}, max_attempts)
+
+    def test_stages_to_completed(self):
+        """
+        Status and stage changes arrive in order, with plan text, until completion.
+        """
+        self._enqueue()
+        events = self._stream([
+            lambda conn: None,
+            lambda conn: task_queue.claim(conn, "w1"),
+            lambda conn: task_queue.set_stage(conn, "t1", "w1", "nutrition"),
+            lambda conn: None,  # no change, no event
+            lambda conn: (task_queue.set_stage(conn, "t1", "w1", "meal_plan"),
+                          plan_drafts.append(conn, "t1", 1, [(1, "Pasta"), (2, "Risotto")])),
+            lambda conn: task_queue.set_stage(conn, "t1", "w1", "validation"),
+            lambda conn: task_queue.complete(conn, "t1", "w1", {"plan_id": 7}),
+        ])
+        self.assertEqual([e[1] for e in events], ["status"] * 3 + ["delta"] * 2 + ["status"] * 3)
+        self.assertEqual(self._states(events), [
+            ("pending", None), ("running", None), ("running", "nutrition"),
+            ("running", "meal_plan"), ("running", "validation"), ("completed", "validation"),
+        ])
+        self.assertEqual([e[2] for e in events if e[1] == "delta"],
+                         [{"day": 1, "text": "Pasta"}, {"day": 2, "text": "Risotto"}])
+        self.assertEqual((events[2][2]["stage_index"], events[2][2]["stage_count"]), (1, 4))
+        self.assertEqual(events[-1][2]["result"], {"plan_id": 7})
+
+        # Reconnecting resumes after the last delivered text
+        first, last = [int(e[0]) for e in events if e[1] == "delta"]
+        self.assertEqual(self._stream(last_event_id=first)[:-1],
+                         [(str(last), "delta", {"day": 2, "text": "Risotto"})])
+        resumed = self._stream(last_event_id=last)
+        self.assertEqual([e[1] for e in resumed], ["status"])
+        self.assertEqual(self._states(resumed), [("completed", "validation")])
+
+    def test_stages_to_failed(self):
+        """
+        The stream ends with the failed status and its error.
+        """
+        self._enqueue(max_attempts=1)
+        events = self._stream([
+            lambda conn: task_queue.claim(conn, "w1"),
+            lambda conn: task_queue.set_stage(conn, "t1", "w1", "analysis"),
+            lambda conn: task_queue.fail(conn, "t1", "w1", "LLM unavailable"),
+        ])
+        self.assertEqual(self._states(events), [
+            ("running", None), ("running", "analysis"), ("failed", "analysis"),
+        ])
+        self.assertEqual(events[-1][2]["error"], "LLM unavailable")
+
+    def test_other_users_task(self):
+        """
+        Streams of another user's task are not found.
+        """
+        self._enqueue()
+        self._login("bob")
+        self.assertEqual(self.client.get("/api/tasks/t1/events").status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import batches
+import db
+import plan_cache
+import plan_store
+import task_queue
+
+
+def profile(**overrides):
+    params = {
+        "age": 30, "weight": 70.0, "height": 175, "goal": "lose weight",
+        "food_preferences": {"proteins": ["Pollo (Chicken Breast)"]},
+        "sex": None, "activity_level": None,
+    }
+    params.update(overrides)
+    return params
+
+
+class TestBatches(unittest.TestCase):
+    """
+    Test cases for grouped batch generation and follower settlement.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _call(self, fn, *args):
+        with db.get_pool().connection() as conn:
+            return fn(conn, *args)
+
+    def _tasks(self):
+        return self._call(lambda conn: conn.execute(
+            "SELECT id, status, leader_id FROM tasks ORDER BY batch_index"
+        ).fetchall())
+
+    def test_one_leader_per_group(self):
+        """
+        Members with equal group keys share one leader; others get their own.
+        """
+        requests = [
+            profile(),
+            profile(weight=70.2),  # same targets after rounding
+            profile(food_preferences={"fruits": ["Mela (Apple)"]}),
+        ]
+        result = self._call(batches.create_batch, "b1", 1, requests)
+        self.assertEqual((result["size"], result["groups"], result["cached_groups"]), (3, 2, 0))
+
+        ids = result["task_ids"]
+        self.assertEqual(self._tasks(), [
+            (ids[0], "pending", None),
+            (ids[1], "waiting", ids[0]),
+            (ids[2], "pending", None),
+        ])
+
+    def test_followers_complete_with_leader_plan(self):
+        """
+        Completing the leader hands its plan to every follower.
+        """
+        ids = self._call(batches.create_batch, "b1", 1, [profile(), profile(), profile()])["task_ids"]
+        task = self._call(task_queue.claim, "w1")
+        self.assertEqual(task["id"], ids[0])
+        self.assertIn("precomputed_targets", task["params"])
+
+        def finish(conn):
+            ref = plan_store.save(conn, "# Plan\n")
+            task_queue.complete(conn, ids[0], "w1", {"file_path": ref})
+            batches.complete_followers(conn, ids[0], ref)
+            return ref
+
+        ref = self._call(finish)
+        batch = self._call(batches.get_batch, "b1", 1)
+        self.assertTrue(batch["done"])
+        self.assertEqual(batch["counts"], {"completed": 3})
+        self.assertEqual({item["result"]["file_path"] for item in batch["items"][1:]}, {ref})
+        plans = self._call(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM meal_plans WHERE file_path = ?", (ref,)
+        ).fetchone()[0])
+        self.assertEqual(plans, 2)
+
+    def test_followers_fail_with_leader(self):
+        """
+        Followers fail once the leader has used up its attempts.
+        """
+        ids = self._call(batches.create_batch, "b1", 1, [profile(), profile()])["task_ids"]
+        for _ in range(task_queue.MAX_ATTEMPTS):
+            self._call(lambda conn: conn.execute(
+                "UPDATE tasks SET available_at = ? WHERE id = ?", (time.time() - 1, ids[0])
+            ))
+            self.assertEqual(self._call(task_queue.claim, "w1")["id"], ids[0])
+            status = self._call(task_queue.fail, ids[0], "w1", "boom")
+        self.assertEqual(status, "failed")
+        self.assertEqual([t[1] for t in self._tasks()], ["failed", "failed"])
+
+    def test_shares_cache_with_single_requests(self):
+        """
+        A group whose profile was already generated singly completes from the cache.
+        """
+        def cache_single(conn):
+            ref = plan_store.save(conn, "# Cached plan\n")
+            plan_cache.store(conn, plan_cache.request_key(profile()), ref)
+            return ref
+
+        ref = self._call(cache_single)
+        result = self._call(batches.create_batch, "b1", 1, [profile(), profile()])
+        self.assertEqual(result["cached_groups"], 1)
+        batch = self._call(batches.get_batch, "b1", 1)
+        self.assertEqual([item["result"]["file_path"] for item in batch["items"]], [ref, ref])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import compaction
+import db
+import plan_model
+import plan_store
+
+DAY = 86400
+OLD = time.time() - 31 * DAY
+RECENT = time.time() - DAY
+
+
+class TestCompaction(unittest.TestCase):
+    """
+    Test cases for task retention and orphaned plan cleanup.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        self.patched = mock.patch.multiple(
+            compaction, TASK_RETENTION_DAYS=30, TASK_ARCHIVE=False)
+        self.patched.start()
+        self.plans_dir = mock.patch.object(
+            plan_store, "MEAL_PLANS_DIR", os.path.join(self.tmp.name, "meal_plans"))
+        self.plans_dir.start()
+
+    def tearDown(self):
+        self.plans_dir.stop()
+        self.patched.stop()
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _call(self, fn, *args, **kwargs):
+        with db.get_pool().connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def _ids(self, sql):
+        return self._call(lambda conn: sorted(r[0] for r in conn.execute(sql)))
+
+    def _task(self, task_id, status, updated_at, created_at=None, batch_id=None):
+        self._call(lambda conn: conn.execute("""
+            INSERT INTO tasks (id, user_id, status, params, error, updated_at, created_at, batch_id)
+            VALUES (?, 1, ?, '{}', 'boom', ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        """, (task_id, status, updated_at, created_at, batch_id)))
+        self._call(lambda conn: conn.execute("""
+            INSERT INTO task_output (task_id, attempt, day, text, created_at)
+            VALUES (?, 1, 1, 'draft', ?)
+        """, (task_id, time.time())))
+
+    def _tasks(self):
+        self._task("old", "completed", OLD)
+        self._task("old-failed", "failed", OLD, batch_id="b1")
+        self._task("recent", "completed", RECENT, batch_id="b2")
+        self._task("old-pending", "pending", OLD)
+        self._task("legacy-old", "completed", None, created_at="2000-01-01 00:00:00")
+        self._task("legacy-recent", "completed", None)
+        self._call(lambda conn: conn.executemany(
+            "INSERT INTO batches (id, user_id, size, groups) VALUES (?, 1, 1, 1)",
+            [("b1",), ("b2",)],
+        ))
+
+    def _plans(self):
+        """Referenced and orphaned blobs, files and plan structures; returns the refs"""
+        refs = {}
+        for name in ("kept", "cached", "orphan", "fresh"):
+            refs[name] = self._call(plan_store.save, f"# Plan {name}\n\n## Day 1\n\nPasta.\n")
+        for name in ("kept-file", "orphan-file", "fresh-file"):
+            refs[name] = plan_store.FilePlanStore().put(None, f"# Plan {name}\n")
+        for name in ("kept", "orphan", "kept-file", "orphan-file"):
+            self._call(lambda conn: plan_model.ensure(conn, refs[name]))
+
+        self._call(db.record_meal_plan, 1, refs["kept"])
+        self._call(db.record_meal_plan, 1, refs["kept-file"])
+        self._call(lambda conn: conn.execute("""
+            INSERT INTO plan_cache (key, file_path, size, created_at, last_used_at)
+            VALUES ('k', ?, 1, 0, 0)
+        """, (refs["cached"],)))
+        # Everything but the fresh plans is past the grace period
+        self._call(lambda conn: conn.execute(
+            "UPDATE plan_blobs SET created_at = ? WHERE digest != ?",
+            (OLD, refs["fresh"][len(plan_store.BLOB_PREFIX):]),
+        ))
+        for name in ("kept-file", "orphan-file"):
+            os.utime(refs[name], (OLD, OLD))
+        return refs
+
+    def test_retention_cutoff(self):
+        """
+        Finished tasks past the cutoff go with their drafts, by created_at when updated_at is NULL.
+        """
+        self._tasks()
+        with mock.patch.object(compaction, "COMPACTION_BATCH_SIZE", 1):
+            removed = self._call(compaction.compact)
+        self.assertEqual((removed["tasks"], removed["batches"]), (3, 1))
+        kept = ["legacy-recent", "old-pending", "recent"]
+        self.assertEqual(self._ids("SELECT id FROM tasks"), kept)
+        self.assertEqual(self._ids("SELECT DISTINCT task_id FROM task_output"), kept)
+        self.assertEqual(self._ids("SELECT id FROM batches"), ["b2"])
+        self.assertEqual(self._ids("SELECT id FROM tasks_archive"), [])
+
+    def test_archive(self):
+        """
+        With TASK_ARCHIVE a slim copy of each purged task is kept.
+        """
+        self._tasks()
+        with mock.patch.object(compaction, "TASK_ARCHIVE", True):
+            self.assertEqual(self._call(compaction.compact)["tasks"], 3)
+        self.assertEqual(self._ids("SELECT id FROM tasks_archive"),
+                         ["legacy-old", "old", "old-failed"])
+        self.assertEqual(self._call(lambda conn: conn.execute(
+            "SELECT user_id, status, error, batch_id FROM tasks_archive WHERE id = 'old-failed'"
+        ).fetchone()), (1, "failed", "boom", "b1"))
+        self.assertEqual(self._ids("SELECT id FROM tasks"), ["legacy-recent", "old-pending", "recent"])
+
+    def test_orphaned_plans(self):
+        """
+        Unreferenced blobs, files and structures past the grace period are removed.
+        """
+        refs = self._plans()
+        self._call(lambda conn: conn.execute(
+            "INSERT INTO sessions (id, data, expires_at) VALUES ('s1', '{}', 0), ('s2', '{}', ?)",
+            (time.time() + 60,),
+        ))
+        removed = self._call(compaction.compact)
+        self.assertEqual(removed, {"tasks": 0, "batches": 0, "sessions": 1, "plan_blobs": 1,
+                                   "plan_files": 1, "plan_structures": 2})
+
+        for name in ("kept", "cached", "fresh", "kept-file", "fresh-file"):
+            self.assertTrue(self._call(plan_store.exists, refs[name]), name)
+        for name in ("orphan", "orphan-file"):
+            self.assertFalse(self._call(plan_store.exists, refs[name]), name)
+        self.assertEqual(self._ids("SELECT ref FROM plan_summaries"),
+                         sorted([refs["kept"], refs["kept-file"]]))
+        self.assertEqual(self._ids("SELECT DISTINCT ref FROM plan_days"), [refs["kept"]])
+        self.assertEqual(self._ids("SELECT id FROM sessions"), ["s2"])
+
+    def test_dry_run(self):
+        """
+        A dry run counts what a real run removes and touches nothing.
+        """
+        self._tasks()
+        refs = self._plans()
+
+        def snapshot(conn):
+            return {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("tasks", "task_output", "batches", "tasks_archive",
+                              "plan_blobs", "plan_summaries", "plan_days")
+            }
+
+        before = self._call(snapshot)
+        with mock.patch.object(compaction, "TASK_ARCHIVE", True):
+            counted = self._call(compaction.compact, dry_run=True)
+        self.assertEqual(self._call(snapshot), before)
+        self.assertTrue(all(os.path.exists(refs[n]) for n in ("kept-file", "orphan-file")))
+
+        removed = self._call(compaction.compact)
+        # Batches only empty once their tasks are gone, so a dry run cannot count them
+        self.assertEqual({**removed, "batches": 0}, counted)
+        self.assertEqual((counted["tasks"], counted["plan_blobs"], counted["plan_files"]), (3, 1, 1))
+        self.assertNotEqual(self._call(snapshot), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
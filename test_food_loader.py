@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import food_loader
+
+FOODS = {
+    "proteins": [
+        {"name": "Chicken Breast", "portion": "100g", "carbs": 0, "protein": 31, "fat": 3.6},
+        {"name": "Egg", "portion": "1 large", "carbs": 0.6, "protein": 6.3, "fat": 5.3},
+    ],
+    "fruits": [
+        {"name": "Apple", "portion": "1 medium", "carbs": 25, "protein": 0.5, "fat": 0.3},
+    ],
+}
+
+
+class TestFoodLoader(unittest.TestCase):
+    """
+    Test cases for streaming, upserting and checksum-skipping food loads.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE foods (name TEXT, portion TEXT, carbs REAL, protein REAL,
+                                fat REAL, category TEXT)
+        """)
+        self.conn.execute("CREATE UNIQUE INDEX idx_foods_name_portion ON foods (name, portion)")
+        self.conn.execute("""
+            CREATE TABLE data_sources (path TEXT PRIMARY KEY, sha256 TEXT, rows INTEGER,
+                                       loaded_at REAL)
+        """)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def _write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def _foods(self):
+        return self.conn.execute(
+            "SELECT name, portion, category, carbs, protein, fat FROM foods ORDER BY name"
+        ).fetchall()
+
+    def test_streams_json_across_chunks(self):
+        """
+        Category-keyed and array JSON parse the same with tiny read chunks.
+        """
+        nested = self._write("foods.json", json.dumps(FOODS, indent=2))
+        flat = self._write("flat.json", json.dumps([
+            dict(food, category=category) for category, items in FOODS.items() for food in items
+        ]))
+        with mock.patch.object(food_loader, "READ_CHUNK_SIZE", 7):
+            rows = list(food_loader.iter_foods(nested))
+            self.assertEqual(rows, list(food_loader.iter_foods(flat)))
+        self.assertEqual(len(rows), 3)
+        self.assertIn(("Apple", "1 medium", "fruits", 25.0, 0.5, 0.3), rows)
+
+    def test_reload_is_idempotent(self):
+        """
+        Loading the same file twice leaves one row per food and skips the rerun.
+        """
+        path = self._write("foods.json", json.dumps(FOODS))
+        first = food_loader.load(self.conn, path)
+        self.assertEqual((first["rows"], first["upserted"]), (3, 3))
+        self.assertTrue(food_loader.load(self.conn, path)["skipped"])
+        forced = food_loader.load(self.conn, path, force=True)
+        self.assertEqual((forced["rows"], forced["upserted"]), (3, 0))
+        self.assertEqual(len(self._foods()), 3)
+
+    def test_changed_source_upserts(self):
+        """
+        A changed file updates existing foods and adds new ones.
+        """
+        path = self._write("foods.csv", "name,portion,carbs,protein,fat\nApple,1 medium,25,0.5,0.3\n")
+        food_loader.load(self.conn, path)
+        self._write("foods.csv", (
+            "name,portion,carbs,protein,fat,category\n"
+            "Apple,1 medium,19,0.5,0.3,fruits\n"
+            "Pear,1 medium,27,0.6,0.2,fruits\n"
+        ))
+        result = food_loader.load(self.conn, path)
+        self.assertEqual((result["rows"], result["upserted"]), (2, 2))
+        self.assertEqual(self._foods(), [
+            ("Apple", "1 medium", "fruits", 19.0, 0.5, 0.3),
+            ("Pear", "1 medium", "fruits", 27.0, 0.6, 0.2),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import food_search
+
+FOODS = [
+    ("Zucchina (Zucchini)", "1 medium", "vegetables"),
+    ("Tacchino (Turkey Breast)", "100g", "proteins"),
+    ("Pollo (Chicken Breast)", "100g", "proteins"),
+    ("Polenta", "100g", "carbs"),
+    ("Mela (Apple)", "1 medium", "fruits"),
+]
+
+
+class TestFoodSearch(unittest.TestCase):
+    """
+    Test cases for prefix, substring and typo-tolerant food search.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE foods (id INTEGER PRIMARY KEY, name TEXT, portion TEXT, carbs REAL,
+                                protein REAL, fat REAL, category TEXT)
+        """)
+        self.conn.execute("CREATE INDEX idx_foods_name_nocase ON foods (name COLLATE NOCASE)")
+        db._ensure_food_search_index(self.conn.cursor())
+        self.conn.executemany(
+            "INSERT INTO foods (name, portion, carbs, protein, fat, category) "
+            "VALUES (?, ?, 1, 1, 1, ?)",
+            FOODS,
+        )
+
+    def _names(self, query, **kwargs):
+        return [f["name"] for f in food_search.search(self.conn, query, **kwargs)]
+
+    def test_italian_and_english_names(self):
+        """
+        Either language finds the food, case-insensitively.
+        """
+        self.assertEqual(self._names("zucchina"), ["Zucchina (Zucchini)"])
+        self.assertEqual(self._names("ZUCCHINI"), ["Zucchina (Zucchini)"])
+        self.assertEqual(self._names("chicken"), ["Pollo (Chicken Breast)"])
+
+    def test_prefix_ranks_first(self):
+        """
+        Names starting with the query come before other substring matches.
+        """
+        self.assertEqual(self._names("po")[:2], ["Polenta", "Pollo (Chicken Breast)"])
+        self.assertEqual(self._names("breast"), ["Pollo (Chicken Breast)", "Tacchino (Turkey Breast)"])
+
+    def test_typos(self):
+        """
+        Misspelled queries fall back to trigram similarity.
+        """
+        self.assertEqual(self._names("zuchini"), ["Zucchina (Zucchini)"])
+        self.assertEqual(self._names("polo")[0], "Pollo (Chicken Breast)")
+        self.assertEqual(self._names("xyzzy"), [])
+
+    def test_category_and_limit(self):
+        """
+        Category matches and filters apply, and results are limited.
+        """
+        self.assertEqual(self._names("fruit"), ["Mela (Apple)"])
+        self.assertEqual(self._names("breast", category="proteins", limit=1), ["Pollo (Chicken Breast)"])
+
+    def test_index_follows_updates(self):
+        """
+        Triggers keep the index in sync with renamed and deleted foods.
+        """
+        self.conn.execute("UPDATE foods SET name = 'Zucca (Pumpkin)' WHERE name LIKE 'Zucchina%'")
+        self.conn.execute("DELETE FROM foods WHERE name = 'Polenta'")
+        self.assertEqual(self._names("pumpkin"), ["Zucca (Pumpkin)"])
+        self.assertEqual(self._names("polenta"), [])
+
+
+class TestFoodIds(unittest.TestCase):
+    """
+    Test cases for migrating foods tables created without an id column.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "test.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""
+            CREATE TABLE foods (name TEXT NOT NULL, portion TEXT NOT NULL, carbs REAL NOT NULL,
+                                protein REAL NOT NULL, fat REAL NOT NULL, category TEXT)
+        """)
+        conn.execute("""
+            CREATE VIRTUAL TABLE foods_fts USING fts5(
+                name, category, content='foods', content_rowid='rowid', tokenize='trigram'
+            )
+        """)
+        conn.executemany("INSERT INTO foods VALUES (?, ?, 1, 1, 1, ?)", FOODS)
+        conn.execute("DELETE FROM foods WHERE name = 'Tacchino (Turkey Breast)'")
+        conn.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+        conn.commit()
+        conn.close()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(path, 2)
+        db.init_db()
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def test_rowids_kept_as_ids(self):
+        """
+        Existing rows keep their rowid as id, and ids are not reused after the migration.
+        """
+        with db.get_pool().connection() as conn:
+            ids = dict(conn.execute("SELECT name, id FROM foods"))
+            self.assertEqual(ids, {name: i for i, (name, _, _) in enumerate(FOODS, 1)
+                                   if not name.startswith("Tacchino")})
+            self.assertEqual([f["id"] for f in food_search.search(conn, "polenta")], [4])
+            conn.execute("DELETE FROM foods WHERE name = 'Mela (Apple)'")
+            new_id = conn.execute(
+                "INSERT INTO foods (name, portion, carbs, protein, fat, category) "
+                "VALUES ('Pera (Pear)', '1 medium', 1, 1, 1, 'fruits')"
+            ).lastrowid
+            self.assertEqual(new_id, 6)
+            self.assertEqual([f["id"] for f in food_search.search(conn, "pera")], [6])
+
+        db.init_db()
+        with db.get_pool().connection() as conn:
+            self.assertEqual(conn.execute("SELECT id FROM foods WHERE name = 'Pera (Pear)'")
+                             .fetchone(), (6,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import itertools
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+from crewai import BaseLLM
+
+import llm_cache
+
+MESSAGES = [
+    {"role": "system", "content": "You are a nutritionist."},
+    {"role": "user", "content": "Plan breakfast for day 1."},
+]
+
+
+class FakeLLM(BaseLLM):
+    """Counts calls and answers with the number of the call"""
+
+    calls: int = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        self.calls += 1
+        return f"Final Answer: response {self.calls}"
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+
+class TestLLMCache(unittest.TestCase):
+    """
+    Test cases for the LLM response cache and the CachedLLM wrapper.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = llm_cache.ResponseStore(os.path.join(self.tmp.name, "llm_cache.db"))
+        self.patched_store = mock.patch.object(llm_cache, "_store", self.store)
+        self.patched_store.start()
+
+    def tearDown(self):
+        self.patched_store.stop()
+        self.store._conn().close()
+        self.tmp.cleanup()
+
+    def _wrap(self, temperature=0.0, **kwargs):
+        inner = FakeLLM(model="fake", temperature=temperature)
+        return inner, llm_cache.CachedLLM.wrap(inner, **kwargs)
+
+    def _keys(self):
+        return [row[0] for row in self.store._conn().execute(
+            "SELECT key FROM llm_cache ORDER BY last_used_at"
+        )]
+
+    def test_key_stability(self):
+        """
+        Equivalent message lists share a key; anything that changes the completion does not.
+        """
+        key = llm_cache.prompt_key("fake", 0.0, MESSAGES)
+        reordered = [{"content": m["content"], "role": m["role"]} for m in MESSAGES]
+        self.assertEqual(llm_cache.prompt_key("fake", 0.0, reordered), key)
+        self.assertEqual(llm_cache.prompt_key("fake", 0.0, [dict(m) for m in MESSAGES]), key)
+
+        changed = [MESSAGES[0], {"role": "user", "content": "Plan lunch for day 1."}]
+        for other in (
+            llm_cache.prompt_key("fake", 0.0, changed),
+            llm_cache.prompt_key("fake", 0.0, MESSAGES[::-1]),
+            llm_cache.prompt_key("fake", 0.7, MESSAGES),
+            llm_cache.prompt_key("other", 0.0, MESSAGES),
+        ):
+            self.assertNotEqual(other, key)
+
+    def test_hit_skips_wrapped_llm(self):
+        """
+        A repeated prompt is answered from the store without calling the wrapped LLM.
+        """
+        inner, llm = self._wrap()
+        first = llm.call(MESSAGES)
+        second = llm.call([dict(m) for m in MESSAGES])
+        self.assertEqual((first, second, inner.calls), ("Final Answer: response 1",) * 2 + (1,))
+        self.assertEqual(llm.call(MESSAGES[:1]), "Final Answer: response 2")
+        stats = self.store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 2, 2))
+
+        # Another wrapper over the same file (a new process or worker) hits too
+        inner, llm = self._wrap()
+        self.assertEqual(llm.call(MESSAGES), "Final Answer: response 1")
+        self.assertEqual(inner.calls, 0)
+
+    def test_bypass(self):
+        """
+        Sampled completions skip the store when configured; tool calls always do.
+        """
+        inner, llm = self._wrap(temperature=0.7)
+        with mock.patch.object(llm_cache, "LLM_CACHE_SKIP_NONZERO_TEMPERATURE", True):
+            llm.call(MESSAGES)
+            llm.call(MESSAGES)
+        self.assertEqual(inner.calls, 2)
+        self.assertEqual(self.store.stats()["bypassed"], 2)
+        self.assertEqual(self._keys(), [])
+
+        with mock.patch.object(llm_cache, "LLM_CACHE_SKIP_NONZERO_TEMPERATURE", False):
+            llm.call(MESSAGES)
+            llm.call(MESSAGES)
+        self.assertEqual(inner.calls, 3)
+
+        inner, llm = self._wrap()
+        llm.call(MESSAGES, tools=[{"name": "search"}])
+        llm.call(MESSAGES, tools=[{"name": "search"}])
+        self.assertEqual(inner.calls, 2)
+
+        inner, llm = self._wrap(cache_enabled=False)
+        llm.call(MESSAGES)
+        llm.call(MESSAGES)
+        self.assertEqual(inner.calls, 2)
+
+    def test_evicts_least_recently_used(self):
+        """
+        Beyond the entry or byte limit the least recently used entries are removed.
+        """
+        clock = itertools.count(1000)
+        with mock.patch.object(llm_cache.time, "time", side_effect=lambda: next(clock)):
+            for key in ("a", "b", "c"):
+                self.store.put(key, "fake", "x" * 10)
+            self.assertEqual(self.store.get("a"), "x" * 10)  # now the most recent
+            self.assertEqual(self._keys(), ["b", "c", "a"])
+
+            with mock.patch.object(llm_cache, "LLM_CACHE_MAX_ENTRIES", 2):
+                self.store.evict()
+            self.assertEqual(self._keys(), ["c", "a"])
+
+            with mock.patch.object(llm_cache, "LLM_CACHE_MAX_BYTES", 15):
+                self.store.evict()
+            self.assertEqual(self._keys(), ["a"])
+
+            with mock.patch.object(llm_cache, "LLM_CACHE_MAX_ENTRIES", 1), \
+                    mock.patch.object(llm_cache, "EVICT_EVERY", 1):
+                self.store.put("d", "fake", "y")
+            self.assertEqual(self._keys(), ["d"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import meal_solver
+from food_matrix import FoodMatrix
+
+
+class TestMealSolver(unittest.TestCase):
+    """
+    Test cases for the macro-target meal composition solver.
+    Uses the bundled food_database.json.
+    """
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__), "food_database.json")) as f:
+            foods = json.load(f)
+        self.matrix = FoodMatrix.from_rows(
+            (food["name"], food["portion"], food["carbs"], food["protein"], food["fat"])
+            for data in foods.values()
+            for food in data
+        )
+        self.targets = {"carbs": 220.0, "protein": 140.0, "fat": 65.0}
+
+    def test_week_hits_targets(self):
+        """
+        Every day lands within the validator's ±5% macro tolerance.
+        """
+        solution = meal_solver.solve_week(self.matrix, self.targets)
+        self.assertEqual(len(solution["days"]), meal_solver.DAYS)
+        for day in solution["days"]:
+            self.assertEqual(len(day["meals"]), len(meal_solver.MEAL_SLOTS))
+            for macro, deviation in day["deviation"].items():
+                self.assertLessEqual(abs(deviation), 0.05, (day["day"], macro))
+
+    def test_uses_only_allowed_foods(self):
+        """
+        Restricting the matrix restricts the ingredients in the plan.
+        """
+        allowed = ["Pollo (Chicken Breast)", "Riso Integrale (Brown Rice)",
+                   "Mela (Apple)", "Mandorle (Almonds)"]
+        solution = meal_solver.solve_week(self.matrix.subset(allowed), self.targets)
+        used = {item["name"] for day in solution["days"]
+                for meal in day["meals"] for item in meal["items"]}
+        self.assertTrue(used <= set(allowed))
+
+    def test_no_foods(self):
+        """
+        An empty selection yields no solution rather than an error.
+        """
+        self.assertIsNone(meal_solver.solve_week(self.matrix.subset([]), self.targets))
+
+
+if __name__ == '__main__':
+    unittest.main()
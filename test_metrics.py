@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test cases for the timing histograms behind /metrics.
+    """
+
+    def setUp(self):
+        self.hist = metrics.Histogram("test_duration_seconds", buckets=(0.1, 1.0))
+
+    def test_cumulative_buckets(self):
+        """
+        Bucket counts are cumulative and +Inf equals the sample count.
+        """
+        for value in (0.05, 0.5, 5.0):
+            self.hist.observe(value, {"route": "/x"})
+        lines = self.hist.render()
+        self.assertIn('test_duration_seconds_bucket{route="/x",le="0.1"} 1', lines)
+        self.assertIn('test_duration_seconds_bucket{route="/x",le="1"} 2', lines)
+        self.assertIn('test_duration_seconds_bucket{route="/x",le="+Inf"} 3', lines)
+        self.assertIn('test_duration_seconds_sum{route="/x"} 5.550000', lines)
+        self.assertIn('test_duration_seconds_count{route="/x"} 3', lines)
+
+    def test_label_escaping(self):
+        """
+        Label values are escaped per the text exposition format.
+        """
+        self.hist.observe(0.2, {"route": 'a"b\\c'})
+        self.assertIn('test_duration_seconds_count{route="a\\"b\\\\c"} 1', self.hist.render())
+
+    def test_span_records_outcome(self):
+        """
+        A span that raises is recorded with outcome="error".
+        """
+        with self.assertRaises(ValueError):
+            with metrics.span("test_span_seconds", step="x"):
+                raise ValueError()
+        with metrics.span("test_span_seconds", step="x"):
+            pass
+        text = metrics.render()
+        self.assertIn('test_span_seconds_count{outcome="error",step="x"} 1', text)
+        self.assertIn('test_span_seconds_count{outcome="ok",step="x"} 1', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
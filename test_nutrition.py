@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import nutrition
+
+
+class TestNutritionTargets(unittest.TestCase):
+    """
+    Test cases for the deterministic BMR/TDEE/macro engine.
+    """
+
+    def test_mifflin_st_jeor(self):
+        """
+        Known profile matches the hand-computed Mifflin-St Jeor values.
+        """
+        targets = nutrition.compute_targets({
+            "age": 30, "weight": 80.0, "height": 180, "goal": "maintain",
+            "sex": "male", "activity_level": "sedentary",
+        })
+        self.assertEqual(targets["bmr"], 1780.0)
+        self.assertEqual(targets["tdee"], 2136.0)
+        self.assertEqual(targets["energy"], 2136.0)
+        self.assertEqual(targets["protein"], 128.0)
+
+    def test_macros_add_up_to_energy(self):
+        """
+        Carbs, protein and fat targets account for the full energy target.
+        """
+        targets = nutrition.compute_targets({
+            "age": 45, "weight": 70.0, "height": 165, "goal": "lose weight",
+        })
+        self.assertEqual(targets["goal"], "lose")
+        kcal = targets["carbs"] * 4 + targets["protein"] * 4 + targets["fat"] * 9
+        self.assertAlmostEqual(kcal, targets["energy"], delta=2)
+
+    def test_batch_matches_single(self):
+        """
+        The vectorized path returns the same values as per-profile calls.
+        """
+        profiles = [
+            {"age": 25, "weight": 60.0, "height": 170, "goal": "gain muscle", "sex": "female"},
+            {"age": 52, "weight": 95.5, "height": 182, "goal": "lose fat", "activity_level": "active"},
+        ]
+        batch = nutrition.compute_targets_batch(
+            [p["age"] for p in profiles],
+            [p["weight"] for p in profiles],
+            [p["height"] for p in profiles],
+            [p["goal"] for p in profiles],
+            [p.get("sex") for p in profiles],
+            [p.get("activity_level") for p in profiles],
+        )
+        for i, profile in enumerate(profiles):
+            single = nutrition.compute_targets(profile)
+            self.assertAlmostEqual(single["energy"], batch["energy"][i], places=0)
+            self.assertEqual(single["goal"], batch["goal"][i])
+
+    def test_goal_classification(self):
+        """
+        Goals match whole words; maintain and recomposition phrases are not cuts.
+        """
+        cases = {
+            "maintain lean muscle": "maintain",
+            "lose fat, gain muscle": "maintain",
+            "fatigue, want to gain weight": "gain",
+            "losing weight before summer": "lose",
+            "dimagrire": "lose",
+            "get lean": "lose",
+            "build muscle mass": "gain",
+            "more muscles": "gain",
+            "stay healthy": "maintain",
+            "": "maintain",
+        }
+        for goal, expected in cases.items():
+            with self.subTest(goal=goal):
+                self.assertEqual(nutrition.classify_goal(goal), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import plan_cache
+
+
+class TestPlanCacheKey(unittest.TestCase):
+    """
+    Test cases for meal-plan request canonicalization.
+    Equivalent payloads must share one cache key.
+    """
+
+    def setUp(self):
+        self.request = {
+            "age": 30,
+            "weight": 80.2,
+            "height": 180,
+            "goal": "lose weight",
+            "food_preferences": {
+                "fruits": ["Mela (Apple)", "Pera (Pear)"],
+                "proteins": ["Pollo (Chicken Breast)"],
+            },
+        }
+
+    def test_key_ignores_order_case_and_precision(self):
+        """
+        Reordered preferences, casing and small weight changes hit the same key.
+        """
+        variant = {
+            "food_preferences": {
+                "proteins": ["pollo (chicken breast)"],
+                "fruits": ["Pera (Pear)", "Mela  (Apple)"],
+            },
+            "goal": "Lose Weight ",
+            "height": 180,
+            "weight": 79.9,
+            "age": 30,
+        }
+        self.assertEqual(plan_cache.request_key(self.request), plan_cache.request_key(variant))
+
+    def test_key_changes_with_constraints(self):
+        """
+        Different goals or food lists must not share a cached plan.
+        """
+        other_goal = dict(self.request, goal="gain muscle")
+        other_foods = dict(self.request, food_preferences={"fruits": ["Mela (Apple)"]})
+        key = plan_cache.request_key(self.request)
+        self.assertNotEqual(key, plan_cache.request_key(other_goal))
+        self.assertNotEqual(key, plan_cache.request_key(other_foods))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import functools
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import llm_stream
+import plan_drafts
+
+
+class TestDraftWriter(unittest.TestCase):
+    """
+    Test cases for incremental persistence of streamed plan text.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _draft(self, task_id="t1"):
+        with db.get_pool().connection() as conn:
+            return plan_drafts.assemble(conn, task_id)
+
+    def test_buffers_until_interval_or_day_end(self):
+        """
+        Text is held back within the interval and written when a day ends.
+        """
+        writer = plan_drafts.DraftWriter("t1", 1, interval=60)
+        writer(1, "- Breakfast: ")
+        writer(2, "- Lunch: ")
+        self.assertIsNone(self._draft())
+        writer(1, "Mela (Apple)")
+        writer(1, None)
+        self.assertEqual(self._draft(), (1, {1: "- Breakfast: Mela (Apple)", 2: "- Lunch: "}))
+
+    def test_latest_attempt_wins(self):
+        """
+        A retry's draft replaces the text of the crashed attempt.
+        """
+        first = plan_drafts.DraftWriter("t1", 1, interval=0)
+        first(1, "partial")
+        second = pickle.loads(pickle.dumps(plan_drafts.DraftWriter("t1", 2, interval=0)))
+        second(1, "fresh")
+        self.assertEqual(self._draft(), (2, {1: "fresh"}))
+        with db.get_pool().connection() as conn:
+            self.assertEqual([r[1:] for r in plan_drafts.since(conn, "t1", 0)],
+                             [(1, 1, "partial"), (2, 1, "fresh")])
+            plan_drafts.clear(conn, "t1")
+        self.assertIsNone(self._draft())
+
+    def test_chunk_events_reach_day_writer(self):
+        """
+        crewai chunk events emitted in a day's thread reach that day's draft only.
+        """
+        from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+
+        llm_stream.install()
+        writer = plan_drafts.DraftWriter("t1", 1, interval=60)
+        barrier = threading.Barrier(2)
+
+        def emit(chunk):
+            crewai_event_bus.emit(self, event=LLMStreamChunkEvent(chunk=chunk, call_id="c"))
+
+        def generate(day):
+            with llm_stream.capture(functools.partial(writer, day)):
+                emit("Thought: I now can give a great answer\nFinal Answer: ")
+                barrier.wait()  # both days streaming at once
+                emit(f"Day {day} pasta")
+                barrier.wait()
+            writer(day, None)
+
+        emit("Final Answer: outside any capture")
+        threads = [threading.Thread(target=generate, args=(day,)) for day in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self._draft(), (1, {1: "Day 1 pasta", 2: "Day 2 pasta"}))
+
+
+class TestAnswerSink(unittest.TestCase):
+    """
+    Test cases for forwarding only the final answer of a ReAct completion.
+    """
+
+    def test_forwards_text_after_final_answer(self):
+        """
+        Thoughts are dropped, even when the marker spans chunks.
+        """
+        received = []
+        sink = llm_stream.AnswerSink(received.append)
+        for chunk in ["Thought: I now can give", " a great answer\nFinal An", "swer:", " ## Pranzo", "\n- Pasta"]:
+            sink.feed(chunk)
+        self.assertEqual("".join(received), "## Pranzo\n- Pasta")
+        self.assertTrue(sink.emitted)
+
+    def test_nothing_without_final_answer(self):
+        """
+        Intermediate tool-use steps are never forwarded.
+        """
+        received = []
+        sink = llm_stream.AnswerSink(received.append)
+        sink.feed("Thought: look this up\nAction: Search")
+        self.assertEqual(received, [])
+        self.assertFalse(sink.emitted)
+
+
+if __name__ == '__main__':
+    unittest.main()
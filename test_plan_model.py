@@ -0,0 +1,148 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import plan_model
+import plan_store
+
+SOLVED_DAY = {
+    "day": 1,
+    "meals": [
+        {"slot": "Breakfast", "items": [
+            {"name": "Yogurt | Greek", "portion": "170g", "servings": 1.0},
+            {"name": "Mela (Apple)", "portion": "1 medium", "servings": 0.5},
+        ]},
+        {"slot": "Lunch", "items": [
+            {"name": "Pollo (Chicken Breast)", "portion": "100g", "servings": 1.5},
+            {"name": "Unknown Food", "portion": "1 cup", "servings": 2.0},
+        ]},
+    ],
+}
+
+RECIPES = """### Breakfast (5 min)
+Yogurt bowl with sliced apple.
+
+### Lunch
+Grilled chicken, 20 minutes."""
+
+
+def document(days=1, text=RECIPES, report="PASS"):
+    parts = ["# 7-Day Quick Prep Italian Meal Plan", "## Daily targets", "Energy: 2000 kcal"]
+    for day in range(1, days + 1):
+        parts += [f"## Day {day}", plan_model.format_ingredients(SOLVED_DAY), text]
+    parts.append(plan_model.VALIDATION_HEADING)
+    for day in range(1, days + 1):
+        parts += [f"## Day {day}", report]
+    return "\n\n".join(parts) + "\n"
+
+
+class TestPlanModel(unittest.TestCase):
+    """
+    Test cases for parsing stored plans into days, meals and totals.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        with db.get_pool().connection() as conn:
+            conn.executemany(
+                "INSERT INTO foods (name, portion, carbs, protein, fat, category) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    ("Yogurt | Greek", "170g", 6, 17, 0.7, "dairy"),
+                    ("Mela (Apple)", "1 medium", 25, 0.5, 0.3, "fruits"),
+                    ("Pollo (Chicken Breast)", "100g", 0, 31, 3.6, "proteins"),
+                ],
+            )
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def test_parse_round_trip(self):
+        """
+        Ingredient tables are read back separately from the recipe and report text.
+        """
+        parsed = plan_model.parse(document(days=2))
+        self.assertEqual(list(parsed), [1, 2])
+        self.assertEqual(parsed[1]["ingredients"][0], ("Breakfast", "Yogurt | Greek", "170g", 1.0))
+        self.assertEqual(len(parsed[2]["ingredients"]), 4)
+        self.assertEqual(parsed[1]["text"], RECIPES)
+        self.assertEqual(parsed[1]["report"], "PASS")
+
+    def test_headings_in_generated_text(self):
+        """
+        Headings written by the LLM neither end a day nor start the validation section.
+        """
+        text = "# Day 1 Menu\n\n## Breakfast\nOats.\n\n## Day 2\nPasta."
+        report = "# Validation Report\n\n## Day 1\nPASS"
+        demoted = plan_model.demote_headings(text)
+        self.assertEqual(demoted, "### Day 1 Menu\n\n#### Breakfast\nOats.\n\n#### Day 2\nPasta.")
+        self.assertEqual(plan_model.demote_headings("#hashtag\n###### Deep"),
+                         "#hashtag\n###### Deep")
+
+        parsed = plan_model.parse(document(days=2, text=demoted,
+                                           report=plan_model.demote_headings(report)))
+        self.assertEqual(list(parsed), [1, 2])
+        self.assertEqual(parsed[2]["text"], demoted)
+        self.assertEqual(parsed[2]["report"], "### Validation Report\n\n#### Day 1\nPASS")
+        self.assertEqual(len(parsed[2]["ingredients"]), 4)
+
+        # h1 headings in plans stored before text was demoted are text too
+        parsed = plan_model.parse(document(days=2, text="# Day 1 Menu\nPasta.",
+                                           report="# Validation Report\nPASS"))
+        self.assertEqual(parsed[1]["text"], "# Day 1 Menu\nPasta.")
+        self.assertEqual(parsed[2]["report"], "# Validation Report\nPASS")
+
+    def test_totals_from_linked_foods(self):
+        """
+        Items are linked to foods rows and summed per meal and day; unknown foods are skipped.
+        """
+        with db.get_pool().connection() as conn:
+            day = plan_model.build(conn, document())[0]
+        breakfast, lunch = day["meals"]
+        self.assertEqual(breakfast["totals"], {"carbs": 18.5, "protein": 17.2, "fat": 0.8,
+                                               "energy": 150})
+        self.assertTrue(breakfast["text"].startswith("### Breakfast"))
+        self.assertIsNone(lunch["items"][1]["food_id"])
+        self.assertEqual(lunch["totals"]["protein"], 46.5)
+        self.assertEqual(day["totals"]["protein"], 63.7)
+
+    def test_index_once_and_summarize(self):
+        """
+        Stored plans are indexed once; summaries add up the days.
+        """
+        with db.get_pool().connection() as conn:
+            ref = plan_store.save(conn, document(days=3))
+            plan_model.index(conn, ref, document(days=3))
+            plan_model.index(conn, ref, document(days=3))
+            summary = plan_model.summary(conn, ref)
+            lunch = plan_model.find_meal(plan_model.get_day(conn, ref, 2), "lunch")
+        self.assertEqual([d["day"] for d in summary["days"]], [1, 2, 3])
+        self.assertEqual(summary["totals"]["protein"], 191.1)
+        self.assertEqual(summary["daily_average"]["protein"], 63.7)
+        self.assertEqual(lunch["slot"], "Lunch")
+
+    def test_legacy_plan_indexed_on_demand(self):
+        """
+        A plan without ingredient tables is indexed on first read, without totals.
+        """
+        legacy = "# Plan\n\n## Day 1\n\nPasta.\n\n## Day 2\n\nRisotto.\n"
+        with db.get_pool().connection() as conn:
+            ref = plan_store.save(conn, legacy)
+            summary = plan_model.summary(conn, ref)
+            day = plan_model.get_day(conn, ref, 2)
+        self.assertEqual(summary["days"], [{"day": 1, "totals": None}, {"day": 2, "totals": None}])
+        self.assertIsNone(summary["totals"])
+        self.assertEqual((day["text"], day["meals"]), ("Risotto.", []))
+
+
+if __name__ == '__main__':
+    unittest.main()
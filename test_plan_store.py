@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import plan_store
+
+PLAN = "# 7-Day Plan\n\n## Day 1\n\nRisotto ai funghi.\n" * 200
+
+
+class TestPlanStore(unittest.TestCase):
+    """
+    Test cases for the blob plan store, legacy file references and migration.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+        self.plans_dir = mock.patch.object(
+            plan_store, "MEAL_PLANS_DIR", os.path.join(self.tmp.name, "meal_plans"))
+        self.plans_dir.start()
+
+    def tearDown(self):
+        self.plans_dir.stop()
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _call(self, fn, *args, **kwargs):
+        with db.get_pool().connection() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def _file_plan(self, content):
+        return plan_store.FilePlanStore().put(None, content)
+
+    def test_identical_content_stored_once(self):
+        """
+        Saving the same plan twice returns one blob reference and one row.
+        """
+        first = self._call(plan_store.save, PLAN)
+        second = self._call(plan_store.save, PLAN)
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(plan_store.BLOB_PREFIX))
+        rows = self._call(lambda conn: conn.execute("SELECT COUNT(*) FROM plan_blobs").fetchone()[0])
+        self.assertEqual(rows, 1)
+        self.assertEqual(self._call(plan_store.size, first), len(PLAN.encode("utf-8")))
+
+    def test_round_trip(self):
+        """
+        Stored plans read back whole and chunked, even after the connection is released.
+        """
+        ref = self._call(plan_store.save, PLAN)
+        self.assertEqual(self._call(plan_store.read, ref), PLAN)
+        with mock.patch.object(plan_store, "READ_CHUNK_SIZE", 64):
+            chunks = self._call(plan_store.open_chunks, ref)
+            self.assertEqual(b"".join(chunks).decode("utf-8"), PLAN)
+        with self.assertRaises(FileNotFoundError):
+            self._call(plan_store.open_chunks, plan_store.BLOB_PREFIX + "0" * 64)
+
+    def test_legacy_file_references(self):
+        """
+        References that are not blobs are read from the plan file.
+        """
+        path = self._file_plan(PLAN)
+        self.assertIs(plan_store.store_for(path), plan_store._file_store)
+        self.assertTrue(self._call(plan_store.exists, path))
+        self.assertEqual(self._call(plan_store.read, path), PLAN)
+        os.remove(path)
+        self.assertFalse(self._call(plan_store.exists, path))
+        with self.assertRaises(FileNotFoundError):
+            self._call(plan_store.read, path)
+
+    def test_migrate_is_idempotent(self):
+        """
+        Migration moves each file once, counting duplicates separately.
+        """
+        existing = self._call(plan_store.save, PLAN)
+        paths = [self._file_plan(PLAN), self._file_plan("# Other plan\n")]
+        for path in paths + [os.path.join(self.tmp.name, "gone.md")]:
+            self._call(db.record_meal_plan, 1, path)
+
+        stats = self._call(plan_store.migrate, delete_files=True)
+        self.assertEqual(stats, {"migrated": 1, "deduplicated": 1, "missing": 1})
+        refs = self._call(lambda conn: [r[0] for r in conn.execute(
+            "SELECT file_path FROM meal_plans ORDER BY id"
+        )])
+        self.assertEqual(refs[0], existing)
+        self.assertEqual(self._call(plan_store.read, refs[1]), "# Other plan\n")
+        self.assertFalse(any(os.path.exists(p) for p in paths))
+
+        self.assertEqual(self._call(plan_store.migrate),
+                         {"migrated": 0, "deduplicated": 0, "missing": 1})
+        self.assertEqual(self._call(lambda conn: [r[0] for r in conn.execute(
+            "SELECT file_path FROM meal_plans ORDER BY id"
+        )]), refs)
+
+
+if __name__ == '__main__':
+    unittest.main()
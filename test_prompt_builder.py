@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import prompt_builder
+
+TEMPLATE = """Plan day {day}:
+    - Use ONLY: {food_preferences}
+    - Respect this analysis:
+    {analysis}"""
+
+
+class TestPromptBuilder(unittest.TestCase):
+    """
+    Test cases for compact prompt inputs and per-task token budgets.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            "CREATE TABLE foods (id INTEGER PRIMARY KEY, name TEXT, portion TEXT, category TEXT)"
+        )
+        self.conn.executemany("INSERT INTO foods (name, portion, category) VALUES (?, '100g', ?)", [
+            ("Pomodoro (Tomato)", "vegetables"),
+            ("Pollo (Chicken Breast)", "proteins"),
+            ("Zucchina (Zucchini)", "vegetables"),
+        ])
+
+    def test_compact_preferences(self):
+        """
+        Preferences are deduplicated, grouped by table category and tagged with ids.
+        """
+        text = prompt_builder.compact_preferences(self.conn, {
+            "veg": ["zucchina (zucchini)", "Pomodoro (Tomato)"],
+            "meat": ["Pollo (Chicken Breast)", "POLLO (CHICKEN BREAST)"],
+            "other": ["  Dragon   fruit "],
+        })
+        self.assertEqual(text, "\n".join([
+            "proteins: #2 Pollo (Chicken Breast)",
+            "vegetables: #1 Pomodoro (Tomato), #3 Zucchina (Zucchini)",
+            "unlisted: Dragon fruit",
+        ]))
+        self.assertEqual(prompt_builder.compact_preferences(self.conn, {}), "none given")
+
+    def test_compact_inputs(self):
+        """
+        Numbers lose trailing zeros and free text is whitespace-collapsed.
+        """
+        inputs = prompt_builder.compact_inputs(self.conn, {
+            "weight": 80.0, "height": 180, "goal": " lose \n weight ", "food_preferences": None,
+        })
+        self.assertEqual(inputs["weight"], "80")
+        self.assertEqual(inputs["height"], 180)
+        self.assertEqual(inputs["goal"], "lose weight")
+
+    def test_fit_truncates_within_budget(self):
+        """
+        Over-budget prompts shrink the analysis first, at a boundary, and fit.
+        """
+        inputs = {
+            "day": 1,
+            "food_preferences": "vegetables: #1 Pomodoro (Tomato)",
+            "analysis": "\n".join(f"- point {i} about timing and portions" for i in range(200)),
+        }
+        fitted = prompt_builder.fit("meal_plan", TEMPLATE, inputs, 300)
+        tokens = prompt_builder.count_tokens(prompt_builder.render(TEMPLATE, fitted))
+        self.assertLessEqual(tokens, 300)
+        self.assertEqual(fitted["food_preferences"], inputs["food_preferences"])
+        self.assertTrue(fitted["analysis"].endswith("portions" + prompt_builder.TRUNCATION_MARK))
+
+    def test_fit_leaves_small_prompts(self):
+        """
+        Prompts within budget are passed through unchanged.
+        """
+        inputs = {"day": 1, "food_preferences": "none given", "analysis": "short"}
+        self.assertEqual(prompt_builder.fit("meal_plan", TEMPLATE, inputs, 300), inputs)
+
+
+if __name__ == '__main__':
+    unittest.main()
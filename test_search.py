@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import search
+from cache import TTLCache
+
+
+class SlowBackend:
+    name = "slow"
+
+    def __init__(self, answer="result"):
+        self.answer = answer
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        time.sleep(0.2)
+        return self.answer
+
+
+class TestSearchService(unittest.TestCase):
+    """
+    Test cases for search caching, query normalization and coalescing.
+    """
+
+    def setUp(self):
+        self.backend = SlowBackend()
+        self.service = search.SearchService([self.backend], TTLCache(maxsize=100, ttl=60))
+
+    def test_normalized_queries_share_cache(self):
+        """
+        Queries differing in case, punctuation and spacing hit one cache entry.
+        """
+        self.service.search("Chicken breast protein?")
+        self.service.search("  chicken BREAST, protein ")
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_concurrent_queries_coalesce(self):
+        """
+        Identical queries in flight at once make a single backend call.
+        """
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.service.search("apple kcal")))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(results, ["result"] * 8)
+
+    def test_falls_through_backends(self):
+        """
+        A backend answering None hands the query to the next one.
+        """
+        service = search.SearchService([SlowBackend(None), self.backend], TTLCache(10, 60))
+        self.assertEqual(service.search("anything"), "result")
+
+
+class TestLocalFoodBackend(unittest.TestCase):
+    """
+    Test cases for offline nutrition lookups from the foods table.
+    """
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            "CREATE TABLE foods (name TEXT, portion TEXT, carbs REAL, protein REAL, fat REAL)"
+        )
+        self.conn.execute("CREATE TABLE table_versions (name TEXT PRIMARY KEY, version INTEGER)")
+        self.conn.executemany("INSERT INTO foods VALUES (?, ?, ?, ?, ?)", [
+            ("Pollo (Chicken Breast)", "100g", 0, 31, 3.6),
+            ("Mela (Apple)", "1 medium", 25, 0.5, 0.3),
+        ])
+        self.backend = search.LocalFoodBackend()
+        self.backend._refresh(self.conn)
+
+    def test_matches_food_names(self):
+        """
+        Nutrition questions are answered from matching foods.
+        """
+        answer = self.backend.lookup("How much protein in chicken breast per 100g?")
+        self.assertIn("Pollo (Chicken Breast), per 100g", answer)
+        self.assertIn("31 g protein", answer)
+        self.assertNotIn("Mela", answer)
+
+    def test_no_match(self):
+        """
+        Queries about unknown foods return None so other backends can answer.
+        """
+        self.assertIsNone(self.backend.lookup("protein in tofu"))
+
+
+if __name__ == '__main__':
+    unittest.main()
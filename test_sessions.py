@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import db
+import sessions
+
+
+def make_app(keyring, store="cookie"):
+    app = FastAPI()
+    app.add_middleware(sessions.SessionMiddleware, keyring=keyring, store=store,
+                       session_cookie="session_cookie", max_age=3600)
+
+    @app.post("/login/{user_id}")
+    def login(user_id: int, request: Request):
+        request.session["user_id"] = user_id
+        return {}
+
+    @app.post("/logout")
+    def logout(request: Request):
+        request.session.pop("user_id", None)
+        return {}
+
+    @app.get("/me")
+    def me(request: Request):
+        return {"user_id": request.session.get("user_id")}
+
+    return app
+
+
+class TestSessions(unittest.TestCase):
+    """
+    Test cases for shared session keys, rotation and the SQLite session store.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.key_file = os.path.join(self.tmp.name, "keys", "session_keys")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _keyring(self):
+        return sessions.KeyRing(path=self.key_file)
+
+    def test_sessions_survive_restart(self):
+        """
+        A new process reading the same key file accepts existing cookies.
+        """
+        first = TestClient(make_app(self._keyring()))
+        first.post("/login/7")
+        cookie = first.cookies["session_cookie"]
+        self.assertEqual(oct(os.stat(self.key_file).st_mode & 0o777), "0o600")
+
+        second = TestClient(make_app(self._keyring()))
+        second.cookies.set("session_cookie", cookie)
+        self.assertEqual(second.get("/me").json(), {"user_id": 7})
+
+    def test_rotation_keeps_recent_keys(self):
+        """
+        Cookies signed with a rotated-out key work until it leaves the ring.
+        """
+        client = TestClient(make_app(self._keyring()))
+        client.post("/login/3")
+        cookie = client.cookies["session_cookie"]
+        with mock.patch.object(sessions, "KEY_RELOAD_INTERVAL", 0):
+            sessions.rotate(self.key_file, max_keys=2)
+            fresh = TestClient(make_app(self._keyring()))
+            fresh.cookies.set("session_cookie", cookie)
+            self.assertEqual(fresh.get("/me").json(), {"user_id": 3})
+
+            sessions.rotate(self.key_file, max_keys=2)
+            retired = TestClient(make_app(self._keyring()))
+            retired.cookies.set("session_cookie", cookie)
+            self.assertEqual(retired.get("/me").json(), {"user_id": None})
+
+    def test_store_revokes_on_logout(self):
+        """
+        With the SQLite store, logging out invalidates copies of the cookie.
+        """
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.execute("CREATE TABLE sessions (id TEXT PRIMARY KEY, data TEXT, expires_at REAL)")
+
+        async def run(fn, *args):
+            return fn(conn, *args)
+
+        with mock.patch.object(db, "run", run):
+            app = make_app(sessions.KeyRing(["k1"]), store="sqlite")
+            client, copy = TestClient(app), TestClient(app)
+            client.post("/login/5")
+            self.assertEqual(conn.execute("SELECT data FROM sessions").fetchall(),
+                             [('{"user_id": 5}',)])
+            copy.cookies.set("session_cookie", client.cookies["session_cookie"])
+            self.assertEqual(copy.get("/me").json(), {"user_id": 5})
+
+            client.post("/logout")
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0], 0)
+            self.assertEqual(copy.get("/me").json(), {"user_id": None})
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+# Seconds a fresh interpreter may spend importing each module
+IMPORT_TIME_BUDGET = {
+    "agents": float(os.getenv("AGENTS_IMPORT_BUDGET", "1.0")),
+    "worker": float(os.getenv("WORKER_IMPORT_BUDGET", "1.0")),
+    "app": float(os.getenv("APP_IMPORT_BUDGET", "1.5")),
+}
+HEAVY_MODULES = ("crewai", "langchain_community", "litellm")
+
+CONFIG = """\
+ai_model: {provider: openai, model_name: gpt-4o-mini, temperature: 0.2}
+storage: {meal_plans_dir: data/meal_plans}
+"""
+
+PROBE = """\
+import json, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import %s
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test cases for import-time cost of the backend entry points.
+    Each module is imported in a fresh interpreter without API keys.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, "config.yaml"), "w") as f:
+            f.write(CONFIG)
+        self.env = {
+            k: v for k, v in os.environ.items()
+            if k not in ("SERPER_API_KEY", "OPENAI_API_KEY")
+        }
+        self.env["DIET_PLANNER_DB"] = os.path.join(self.tmp.name, "test.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _probe(self, module: str) -> dict:
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE % (BACKEND, module, HEAVY_MODULES)],
+            cwd=self.tmp.name, env=self.env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    def test_no_crew_on_import(self):
+        """
+        Importing the API, worker or agents module does not load crewai or langchain.
+        """
+        for module in IMPORT_TIME_BUDGET:
+            with self.subTest(module=module):
+                self.assertEqual(self._probe(module)["loaded"], [])
+
+    def test_import_time_budget(self):
+        """
+        Each entry point imports within its time budget.
+        """
+        for module, budget in IMPORT_TIME_BUDGET.items():
+            with self.subTest(module=module):
+                self.assertLess(self._probe(module)["seconds"], budget)
+
+
+if __name__ == '__main__':
+    unittest.main()
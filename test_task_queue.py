@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "backend"))
+
+import db
+import task_queue
+
+
+class TestTaskLeases(unittest.TestCase):
+    """
+    Test cases for task leases, heartbeats, retries and lease expiry.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def _call(self, fn, *args):
+        with db.get_pool().connection() as conn:
+            return fn(conn, *args)
+
+    def _row(self, task_id="t1"):
+        return self._call(lambda conn: conn.execute("""
+            SELECT status, attempts, lease_owner, lease_expires_at, available_at, error
+            FROM tasks WHERE id = ?
+        """, (task_id,)).fetchone())
+
+    def _expire_lease(self, task_id="t1"):
+        self._call(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, task_id)
+        ))
+
+    def _make_available(self, task_id="t1"):
+        self._call(lambda conn: conn.execute(
+            "UPDATE tasks SET available_at = ? WHERE id = ?", (time.time() - 1, task_id)
+        ))
+
+    def test_claim_and_heartbeat_extend_lease(self):
+        """
+        Claiming leases the task to the worker; heartbeats push the lease out.
+        """
+        self._call(task_queue.enqueue, "t1", 1, {"age": 30})
+        task = self._call(task_queue.claim, "w1", 10)
+        self.assertEqual((task["id"], task["attempts"], task["params"]), ("t1", 1, {"age": 30}))
+        status, _, owner, expires, _, _ = self._row()
+        self.assertEqual((status, owner), ("running", "w1"))
+        self.assertAlmostEqual(expires, time.time() + 10, delta=2)
+
+        self.assertTrue(self._call(task_queue.heartbeat, "t1", "w1", 100))
+        self.assertAlmostEqual(self._row()[3], time.time() + 100, delta=2)
+        self.assertFalse(self._call(task_queue.heartbeat, "t1", "w2", 100))
+        self.assertIsNone(self._call(task_queue.claim, "w2"))
+
+    def test_wrong_owner_loses_lease(self):
+        """
+        Only the lease owner can complete or fail a task.
+        """
+        self._call(task_queue.enqueue, "t1", 1, {})
+        self._call(task_queue.claim, "w1")
+        with self.assertRaises(task_queue.LeaseLost):
+            self._call(task_queue.complete, "t1", "w2", {})
+        with self.assertRaises(task_queue.LeaseLost):
+            self._call(task_queue.fail, "t1", "w2", "boom")
+        self._call(task_queue.complete, "t1", "w1", {"plan_id": 1})
+        self.assertEqual(self._row()[0], "completed")
+
+    def test_fail_backs_off_then_fails(self):
+        """
+        Failed attempts are retried after the backoff delay until max_attempts.
+        """
+        self._call(task_queue.enqueue, "t1", 1, {}, 2)
+        self._call(lambda conn: task_queue.enqueue_follower(conn, "f1", 2, {}, "t1"))
+        self._call(task_queue.claim, "w1")
+        before = time.time()
+        self.assertEqual(self._call(task_queue.fail, "t1", "w1", "boom"), "pending")
+        status, _, owner, _, available_at, error = self._row()
+        self.assertEqual((status, owner, error), ("pending", None, "boom"))
+        self.assertGreaterEqual(available_at, before + task_queue.retry_delay(1))
+        self.assertIsNone(self._call(task_queue.claim, "w1"))
+
+        self._make_available()
+        self.assertEqual(self._call(task_queue.claim, "w1")["attempts"], 2)
+        self.assertEqual(self._call(task_queue.fail, "t1", "w1", "boom"), "failed")
+        self.assertEqual(self._row("f1")[0], "failed")
+
+    def test_expired_lease_is_retried_with_backoff(self):
+        """
+        A task whose worker stopped heartbeating is reclaimed after the backoff delay.
+        """
+        self._call(task_queue.enqueue, "t1", 1, {})
+        self._call(task_queue.claim, "w1")
+        self._expire_lease()
+        self.assertIsNone(self._call(task_queue.claim, "w2"))
+        status, attempts, owner, _, _, error = self._row()
+        self.assertEqual((status, attempts, owner), ("pending", 1, None))
+        self.assertEqual(error, task_queue.LEASE_EXPIRED_ERROR)
+
+        self._make_available()
+        task = self._call(task_queue.claim, "w2")
+        self.assertEqual((task["id"], task["attempts"]), ("t1", 2))
+        with self.assertRaises(task_queue.LeaseLost):
+            self._call(task_queue.complete, "t1", "w1", {})
+        timings = self._call(lambda conn: conn.execute(
+            "SELECT timings FROM tasks WHERE id = 't1'"
+        ).fetchone()[0])
+        self.assertLess(json.loads(timings)["queue_wait"], 5)
+
+    def test_expired_lease_at_max_attempts_fails(self):
+        """
+        A task that used up its attempts is failed, with its followers, not reclaimed.
+        """
+        self._call(task_queue.enqueue, "t1", 1, {}, 1)
+        self._call(lambda conn: task_queue.enqueue_follower(conn, "f1", 2, {}, "t1"))
+        self._call(task_queue.claim, "w1")
+        self._expire_lease()
+        with mock.patch.object(task_queue, "retry_delay", return_value=0):
+            self.assertIsNone(self._call(task_queue.claim, "w2"))
+        self.assertEqual(self._row()[0], "failed")
+        self.assertEqual(self._row("f1")[:1] + self._row("f1")[5:],
+                         ("failed", task_queue.LEASE_EXPIRED_ERROR))
+
+
+if __name__ == '__main__':
+    unittest.main()
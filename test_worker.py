@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import db
+import task_queue
+
+CONFIG = """\
+ai_model: {provider: openai, model_name: gpt-4o-mini, temperature: 0.2}
+storage: {meal_plans_dir: data/meal_plans}
+"""
+
+# worker.py imports agents.py, which reads config.yaml from the working directory
+_config_dir = tempfile.TemporaryDirectory()
+with open(os.path.join(_config_dir.name, "config.yaml"), "w") as f:
+    f.write(CONFIG)
+_cwd = os.getcwd()
+os.chdir(_config_dir.name)
+try:
+    import worker
+finally:
+    os.chdir(_cwd)
+
+
+def tearDownModule():
+    _config_dir.cleanup()
+
+
+class TestWorkerLoop(unittest.TestCase):
+    """
+    Test cases for the worker claim loop.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved_pool = db._pool
+        db._pool = db.ConnectionPool(os.path.join(self.tmp.name, "test.db"), 2)
+        db.init_db()
+
+    def tearDown(self):
+        db._pool.close()
+        db._pool = self.saved_pool
+        self.tmp.cleanup()
+
+    def test_claim_error_does_not_stop_loop(self):
+        """
+        A failed claim is logged and retried on the next poll.
+        """
+        task = {"id": "t1", "user_id": 1, "attempts": 1, "params": {}}
+        claims = [sqlite3.OperationalError("database is locked"), None, task]
+
+        def claim(conn, worker_id):
+            result = claims.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async def run():
+            stop = asyncio.Event()
+            processed = []
+
+            async def process_task(task, worker_id):
+                processed.append((task["id"], worker_id))
+                stop.set()
+
+            with mock.patch.object(task_queue, "claim", claim), \
+                    mock.patch.object(worker, "process_task", process_task), \
+                    mock.patch.object(worker, "POLL_INTERVAL", 0.01):
+                await asyncio.wait_for(worker.worker_loop("w1", stop), 5)
+            return processed
+
+        with self.assertLogs("worker", "ERROR") as logs:
+            processed = asyncio.run(run())
+        self.assertEqual(processed, [("t1", "w1")])
+        self.assertEqual(claims, [])
+        self.assertIn("database is locked", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()